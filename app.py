@@ -3,17 +3,48 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify, render_template, send_from_directory, send_file
+from flask import Flask, request, jsonify, render_template, send_from_directory, send_file, Response, stream_with_context
 import os
-from werkzeug.utils import secure_filename
-from modules.ocr_module import run_ocr
-from modules.prompt_builder import build_prompt
-from modules.openai_module import extract_json_from_md
-from modules.pdf_generator import generate_pdf_from_json
+from werkzeug.utils import secure_filename, safe_join
+from modules import ocr_module, async_core
+from modules.ocr_module import OCR_MARKDOWN
+from modules.prompt_registry import PromptRegistry, PROFILES, VERSIONS
+from modules.prompt_compactor import compact_markdown, count_tokens
+from modules.openai_module import stream_chat_completion, MODEL
+from modules import openai_module
+from modules.prompt_builder import COI_SCHEMA, MONEY_FIELDS, validate_record
+from modules.json_patch import apply_json_patch, apply_merge_patch, merge_diff, PatchError, JSON_PATCH
+from modules.sectioned_extraction import aextract_sectioned, extract_sectioned, parse_json_reply
+from modules.json_stream import ObjectStreamParser
+from modules.pdf_export import PdfExporter, EXPORT_FORMATS, iter_file, pdf_cache_key, render_pdf, warm_renderer
+from modules.document_store import open_document_store, migrate_json_db, reconcile_with_directory, FILTER_FIELDS
+from modules.storage import atomic_write, file_lock, PeriodicTask
+from modules.search_index import SearchIndex
+from modules.coverage_facts import coverage_facts, days_until, parse_money
+from modules import clients
+from modules.job_queue import JobQueue, QueueFull, DONE, FAILED
+from modules.rate_limiter import UpstreamUnavailable, lane, BULK
+from modules import rate_limiter
+from modules import metrics
+from modules.metrics import StageTimer, span
+from modules.extraction_cache import ExtractionCache, OCR_TIER, JSON_TIER, PDF_TIER, sha256_hex, json_key
+import contextvars
+import functools
+import hashlib
+import io
 import json
-from datetime import datetime
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+metrics.configure_logging()
 
 # --- CONFIG ---
 UPLOAD_FOLDER = "uploads"
@@ -23,25 +54,371 @@ if not os.path.exists(UPLOAD_FOLDER):
 OUTPUT_JSON_DIR = "extracted_json"
 os.makedirs(OUTPUT_JSON_DIR, exist_ok=True)
 
-DOCUMENTS_DB = os.path.join(app.root_path, 'documents.json')
+# Document metadata store. documents.json is the legacy store and is imported once on first start.
+DOCUMENTS_DB = os.getenv("DOCUMENTS_DB", os.path.join(app.root_path, 'documents.json'))
+DOCUMENT_STORE = os.getenv("DOCUMENT_STORE", "sqlite:///" + os.path.join(app.root_path, 'documents.db'))
+MAX_PAGE_SIZE = 500
 
-# --- DB HELPER FUNCTIONS ---
-def read_documents_db():
-    if not os.path.exists(DOCUMENTS_DB):
-        with open(DOCUMENTS_DB, 'w') as f:
-            json.dump([], f)
-        return []
-    with open(DOCUMENTS_DB, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
+# Full-text index of extracted fields and OCR text for /search
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", os.path.join(app.root_path, 'search.db'))
+
+# WAL checkpoints keep crash recovery short; snapshots are what a corrupt store is restored from (0 disables)
+STORE_CHECKPOINT_SECONDS = int(os.getenv("STORE_CHECKPOINT_SECONDS", "300"))
+STORE_SNAPSHOT_SECONDS = int(os.getenv("STORE_SNAPSHOT_SECONDS", "3600"))
+store_maintenance = [
+    PeriodicTask("store-checkpoint", STORE_CHECKPOINT_SECONDS, lambda: get_document_store().checkpoint()),
+    PeriodicTask("store-snapshot", STORE_SNAPSHOT_SECONDS, lambda: get_document_store().snapshot()),
+]
+
+# Set when a preforking server imports the app once in its parent (gunicorn --preload). Threads do
+# not survive fork(), so background tasks then start in each worker from post_fork() instead.
+APP_PRELOAD = os.getenv("APP_PRELOAD", "").lower() in ('1', 'true', 'yes', 'on')
+
+# Background extraction jobs. Set JOB_JOURNAL to an empty string to disable the on-disk journal.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+JOB_JOURNAL = os.getenv("JOB_JOURNAL", os.path.join(app.root_path, 'jobs.journal'))
+
+# Content-addressed cache for OCR markdown, extracted JSON and rendered PDFs
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(app.root_path, 'cache'))
+CACHE_MAX_MB = int(os.getenv("CACHE_MAX_MB", "500"))
+CACHE_MAX_AGE_DAYS = int(os.getenv("CACHE_MAX_AGE_DAYS", "30"))
+
+# Versioned extraction prompts built from field_questions/*.txt (reloaded when the files change)
+QUESTIONS_DIR = os.path.join(app.root_path, 'field_questions')
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "v1")
+prompt_registry = PromptRegistry(QUESTIONS_DIR)
+
+# "single": one call for the whole schema. "sectioned": concurrent calls per section group, merged.
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "single")
+EXTRACTION_MODES = ('single', 'sectioned')
+
+# "sync": each upload job, OCR chunk and model call holds a pool thread. "async": upload jobs run end to end
+# as coroutines on the async core's event loop (modules/async_core.py), up to ASYNC_JOB_CONCURRENCY at once,
+# holding no thread while they wait on Vision or OpenAI. Routes that extract in the request (/upload_batch,
+# /upload_stream) call the core through blocking wrappers.
+EXTRACTION_ENGINE = os.getenv("EXTRACTION_ENGINE", "sync")
+EXTRACTION_ENGINES = ('sync', 'async')
+ASYNC_JOB_CONCURRENCY = int(os.getenv("ASYNC_JOB_CONCURRENCY", "200"))
+if EXTRACTION_ENGINE == "async":
+    run_ocr, chat_completion = async_core.run_ocr, async_core.chat_completion
+else:
+    run_ocr, chat_completion = ocr_module.run_ocr, openai_module.chat_completion
+
+# Token budget for the OCR markdown sent to the model; 0 disables compaction
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "5000"))
+
+# Files of one /upload_batch request processed concurrently
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Worker processes rendering PDFs for /export (default: one per CPU)
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "0")) or None
+# Documents in one merged /export?format=pdf, which is built in memory; ZIP exports stream and have no cap
+EXPORT_MAX_MERGED = int(os.getenv("EXPORT_MAX_MERGED", "200"))
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+# Stores, index and cache are opened on first use (or by warm()), not at import: opening them
+# migrates, reconciles and scans files, which every importing process would otherwise pay for.
+_document_store = None
+_search_index = None
+_extraction_cache = None
+_pdf_exporter = None
+_state_lock = threading.RLock()
+
+# Lock files for extracted JSON, so saves and patches never interleave, even across worker processes
+LOCK_DIR = os.path.join(OUTPUT_JSON_DIR, '.locks')
+
+# --- EXTRACTION PIPELINE ---
+METADATA_FIELDS = ('custom_name', 'external_id', 'tenant_code', 'property_no', 'action')
+
+def ocr_document(pdf_content, use_cache=True):
+    """OCR a PDF through the extraction cache; returns `(pdf_hash, markdown)`."""
+    pdf_hash, ocr_key, markdown = cached_ocr(pdf_content, use_cache)
+    if markdown is None:
+        markdown = run_ocr(pdf_content)
+        get_extraction_cache().put(OCR_TIER, ocr_key, markdown)
+    return pdf_hash, markdown
+
+def cached_ocr(pdf_content, use_cache):
+    """`(pdf_hash, ocr_key, markdown)` of a PDF, the markdown None unless it is cached (and use_cache)."""
+    pdf_hash = sha256_hex(pdf_content)
+    ocr_key = f"{pdf_hash}.{OCR_MARKDOWN}"
+    return pdf_hash, ocr_key, get_extraction_cache().get(OCR_TIER, ocr_key) if use_cache else None
+
+def json_cache_key(pdf_hash, prompt, mode):
+    return json_key(pdf_hash, prompt, f"{MODEL}:{PROMPT_TOKEN_BUDGET}:{mode}")
+
+def cached_extraction(pdf_hash, profile, mode, use_cache):
+    """`(prompt, cache_key, json_output)` for a document, json_output None unless it is cached (and use_cache)."""
+    prompt = prompt_registry.get(PROMPT_VERSION, profile).text
+    cache_key = json_cache_key(pdf_hash, prompt, mode)
+    return prompt, cache_key, get_extraction_cache().get(JSON_TIER, cache_key) if use_cache else None
+
+def section_prompt(sections):
+    return prompt_registry.for_sections(PROMPT_VERSION, sections).text
+
+def sectioned_output(record, report, cache_key):
+    """`(json_output, cache_key)` of a sectioned extraction; the key is None when a group failed."""
+    # Failed groups left their sections empty; don't cache that, so the next upload retries them
+    if any(entry['error'] for entry in report.values()):
+        cache_key = None
+    return json.dumps(record, indent=4), cache_key
+
+def extract_document(pdf_content, stage, use_cache=True, profile='full', mode=None):
+    """
+    OCR a PDF and extract its JSON, going through the extraction cache.
+    `stage(name)` is a context manager used to time each step, e.g. `Job.stage` or `StageTimer.stage`;
+    `profile` picks the schema subset for the document type (see PROFILES) and
+    `mode` one of EXTRACTION_MODES (default EXTRACTION_MODE). Returns
+    `(json_output, markdown, cache_key)`, the markdown being the full OCR
+    text and `cache_key` the JSON cache entry to fill once the reply has been
+    validated (None when it came from the cache). Pass it to save_extraction.
+    """
+    mode = mode or EXTRACTION_MODE
+    with stage('ocr'):
+        pdf_hash, markdown = ocr_document(pdf_content, use_cache)
+    user_input = markdown
+    with stage('prompt'):
+        prompt, cache_key, json_output = cached_extraction(pdf_hash, profile, mode, use_cache)
+    if json_output is not None:
+        return json_output, markdown, None
+    if PROMPT_TOKEN_BUDGET:
+        with stage('compact'):
+            user_input, _ = compact_markdown(user_input, prompt, PROMPT_TOKEN_BUDGET, model=MODEL)
+    with stage('extract'):
+        if mode == 'sectioned':
+            record, report = extract_sectioned(user_input, section_prompt, PROFILES[profile], complete=chat_completion)
+            json_output, cache_key = sectioned_output(record, report, cache_key)
+        else:
+            json_output, _ = chat_completion(prompt, user_input)
+    return json_output, markdown, cache_key
+
+async def extract_document_async(pdf_content, stage, use_cache=True, profile='full', mode=None):
+    """
+    extract_document on the async core: OCR and model calls are awaited on
+    its loop and the cache, compaction and other blocking steps run in its
+    executor, so a document in flight holds no thread while it waits.
+    """
+    core = async_core.get_core()
+    mode = mode or EXTRACTION_MODE
+    with stage('ocr'):
+        pdf_hash, ocr_key, markdown = await core.to_thread(cached_ocr, pdf_content, use_cache)
+        if markdown is None:
+            markdown = await core.ocr(pdf_content)
+            await core.to_thread(get_extraction_cache().put, OCR_TIER, ocr_key, markdown)
+    user_input = markdown
+    with stage('prompt'):
+        prompt, cache_key, json_output = await core.to_thread(cached_extraction, pdf_hash, profile, mode, use_cache)
+    if json_output is not None:
+        return json_output, markdown, None
+    if PROMPT_TOKEN_BUDGET:
+        with stage('compact'):
+            user_input, _ = await core.to_thread(compact_markdown, user_input, prompt, PROMPT_TOKEN_BUDGET, MODEL)
+    with stage('extract'):
+        if mode == 'sectioned':
+            record, report = await aextract_sectioned(user_input, section_prompt, core.complete, PROFILES[profile])
+            json_output, cache_key = sectioned_output(record, report, cache_key)
+        else:
+            json_output, _ = await core.complete(prompt, user_input)
+    return json_output, markdown, cache_key
+
+def save_extraction(filename, json_output, profile='full', ocr_text=None, cache_key=None):
+    """
+    Validate extracted JSON against the profile's schema, write and index it
+    for an uploaded file and return the output filename. Raises ValueError
+    when the model's reply is not a JSON object of the expected shape. A reply
+    that passes is cached under `cache_key`, so a bad one is never replayed.
+    """
+    try:
+        data = parse_json_reply(json_output)
+    except ValueError as e:
+        raise ValueError(f"❌ Extraction did not return valid JSON: {e}")
+    record, errors = validate_record(data, PROFILES[profile])
+    if errors:
+        raise ValueError("❌ Extracted JSON does not match the schema: " + "; ".join(errors))
+    if cache_key is not None:
+        get_extraction_cache().put(JSON_TIER, cache_key, json_output)
+
+    output_filename = f"{os.path.splitext(filename)[0]}.json"
+    with json_lock(output_filename):
+        write_json_file(output_filename, record)
+        index_document(output_filename, record, ocr_text or "")
+    return output_filename
+
+def json_lock(filename):
+    return file_lock(os.path.join(LOCK_DIR, f"{filename}.lock"))
+
+def json_version(json_bytes):
+    """Version (and ETag) of an extracted JSON file: a hash of its exact content."""
+    return sha256_hex(json_bytes)[:32]
+
+def write_json_file(filename, data):
+    """Replace an extracted JSON file atomically and durably; returns the new version. Hold json_lock."""
+    json_bytes = json.dumps(data, indent=4).encode('utf-8')
+    atomic_write(os.path.join(OUTPUT_JSON_DIR, filename), json_bytes)
+    return json_version(json_bytes)
+
+def index_document(filename, record, ocr_text=None):
+    """Update the search index and coverage facts of a JSON file just written. Hold json_lock."""
+    with span('index'):
+        get_search_index().update(filename, record, ocr_text)
+        get_document_store().set_coverage(filename, *coverage_facts(record))
+
+def process_upload(job):
+    """Job handler: OCR the stored upload, extract JSON and register the document."""
+    with metrics.trace(job.payload.get('trace_id')):
+        return _process_upload(job)
+
+def _process_upload(job):
+    payload = job.payload
+    with job.stage('read'):
+        pdf_content = read_file(payload['upload_path'])
+
+    profile = payload.get('profile', 'full')
+    json_output, markdown, cache_key = extract_document(
+        pdf_content, job.stage, use_cache=not payload.get('bypass_cache'), profile=profile, mode=payload.get('mode'))
+
+    with job.stage('write'):
+        output_filename = register_upload(payload, json_output, profile, markdown, cache_key)
+    return {'filename': output_filename}
 
-def write_documents_db(data):
-    with open(DOCUMENTS_DB, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+async def process_upload_async(job):
+    """process_upload as a coroutine on the async core (EXTRACTION_ENGINE=async)."""
+    with metrics.trace(job.payload.get('trace_id')):
+        core = async_core.get_core()
+        payload = job.payload
+        with job.stage('read'):
+            pdf_content = await core.to_thread(read_file, payload['upload_path'])
+
+        profile = payload.get('profile', 'full')
+        json_output, markdown, cache_key = await extract_document_async(
+            pdf_content, job.stage, use_cache=not payload.get('bypass_cache'), profile=profile,
+            mode=payload.get('mode'))
+
+        with job.stage('write'):
+            output_filename = await core.to_thread(register_upload, payload, json_output, profile, markdown, cache_key)
+        return {'filename': output_filename}
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def register_upload(payload, json_output, profile, markdown, cache_key):
+    """Save an upload job's extraction, add the document and remove the stored upload; returns the JSON filename."""
+    output_filename = save_extraction(payload['filename'], json_output, profile, markdown, cache_key)
+    get_document_store().add(dict(payload['metadata'], filename=output_filename, status='uploaded'))
+    os.remove(payload['upload_path'])
+    return output_filename
+
+def invalidate_pdf(filename):
+    """Drop the cached PDF rendered from a JSON file that is about to change or disappear."""
+    try:
+        with open(os.path.join(OUTPUT_JSON_DIR, filename), 'rb') as f:
+            get_extraction_cache().delete(PDF_TIER, pdf_cache_key(f.read()))
+    except FileNotFoundError:
+        pass
+
+def get_document_store():
+    """The document store; on first use the legacy JSON store is migrated and extracted_json/ reconciled."""
+    global _document_store
+    with _state_lock:
+        if _document_store is None:
+            store = open_document_store(DOCUMENT_STORE)
+            migrate_json_db(DOCUMENTS_DB, store)
+            # extracted_json/ is the source of truth; re-index it if the store drifted (crash, restored snapshot)
+            reconcile_with_directory(store, OUTPUT_JSON_DIR)
+            _document_store = store
+        return _document_store
+
+def get_search_index():
+    """The full-text index, synced with extracted_json/ on first use."""
+    global _search_index
+    with _state_lock:
+        if _search_index is None:
+            index = SearchIndex(SEARCH_INDEX)
+            index.sync(OUTPUT_JSON_DIR)
+            _search_index = index
+        return _search_index
+
+def get_extraction_cache():
+    global _extraction_cache
+    with _state_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache(CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024,
+                                                max_age=CACHE_MAX_AGE_DAYS * 24 * 3600)
+        return _extraction_cache
+
+def get_pdf_exporter():
+    global _pdf_exporter
+    with _state_lock:
+        if _pdf_exporter is None:
+            _pdf_exporter = PdfExporter(max_workers=EXPORT_WORKERS, cache=get_extraction_cache())
+        return _pdf_exporter
+
+def get_job_queue():
+    """Create the job queue on first use so the dev-server reloader parent never runs jobs."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            if EXTRACTION_ENGINE == "async":
+                _job_queue = JobQueue(process_upload_async, max_workers=ASYNC_JOB_CONCURRENCY,
+                                      max_pending=JOB_QUEUE_LIMIT, journal_path=JOB_JOURNAL or None,
+                                      runner=async_core.get_core())
+            else:
+                _job_queue = JobQueue(process_upload, max_workers=JOB_WORKERS,
+                                      max_pending=JOB_QUEUE_LIMIT, journal_path=JOB_JOURNAL or None)
+            _job_queue.recover()
+        return _job_queue
+
+def form_flag(name):
+    return request.form.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+def extraction_options():
+    """Read and validate the `profile` and `mode` form fields; returns `(profile, mode, error)`."""
+    profile = request.form.get('profile') or 'full'
+    mode = request.form.get('mode') or EXTRACTION_MODE
+    if profile not in PROFILES:
+        return profile, mode, f'Unknown profile: {profile}'
+    if mode not in EXTRACTION_MODES:
+        return profile, mode, f'Unknown extraction mode: {mode}'
+    return profile, mode, None
+
+def iter_batch_files(files):
+    """Yield `(filename, read)` for every PDF in the upload, expanding ZIP archives."""
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            archive = zipfile.ZipFile(file.stream)
+            for member in archive.infolist():
+                if not member.is_dir() and member.filename.lower().endswith('.pdf'):
+                    yield os.path.basename(member.filename), functools.partial(archive.read, member)
+        elif file.filename:
+            yield file.filename, file.read
+
+def process_batch_file(filename, pdf_content, metadata, use_cache, profile, mode):
+    """Extract one file of a batch. The document record is returned, not stored."""
+    timer = StageTimer()
+    # Batch work yields upstream capacity to interactive uploads
+    with lane(BULK):
+        json_output, markdown, cache_key = extract_document(pdf_content, timer.stage, use_cache=use_cache,
+                                                            profile=profile, mode=mode)
+    with timer.stage('write'):
+        output_filename = save_extraction(filename, json_output, profile, markdown, cache_key)
+    return dict(metadata, filename=output_filename, status='uploaded'), timer.timings
+
+def upstream_unavailable_response(error):
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = 503
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, int(round(error.retry_after))))
+    return response
 
 # --- ROUTES ---
+@app.errorhandler(UpstreamUnavailable)
+def handle_upstream_unavailable(error):
+    return upstream_unavailable_response(error)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -56,45 +433,444 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
+    profile, mode, error = extraction_options()
+    if error:
+        return jsonify({'error': error}), 400
+
     if file:
         try:
             filename = secure_filename(file.filename)
-            pdf_content = file.read()
-
-            user_input = run_ocr(pdf_content)
-            prompt = build_prompt()
-            json_output = extract_json_from_md(prompt, user_input)
-
-            output_filename = f"{os.path.splitext(filename)[0]}.json"
-            output_filepath = os.path.join(OUTPUT_JSON_DIR, output_filename)
-            with open(output_filepath, 'w', encoding='utf-8') as f:
-                f.write(json_output)
-
-            documents = read_documents_db()
-            new_doc = {
-                'filename': output_filename,
-                'custom_name': request.form.get('custom_name'),
-                'external_id': request.form.get('external_id'),
-                'tenant_code': request.form.get('tenant_code'),
-                'property_no': request.form.get('property_no'),
-                'action': request.form.get('action'),
-                'upload_date': datetime.utcnow().isoformat(),
-                'status': 'uploaded'
-            }
-            documents.append(new_doc)
-            write_documents_db(documents)
-
-            return jsonify({'message': 'File processed successfully', 'filename': output_filename})
+            upload_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.pdf")
+            # Durable before the job is journaled, so a recovered job never finds a torn upload
+            atomic_write(upload_path, file.read())
+
+            job = get_job_queue().submit({
+                'upload_path': upload_path,
+                'trace_id': metrics.current_trace_id(),
+                'filename': filename,
+                'bypass_cache': form_flag('bypass_cache'),
+                'profile': profile,
+                'mode': mode,
+                'metadata': dict(
+                    {field: request.form.get(field) for field in METADATA_FIELDS},
+                    upload_date=datetime.utcnow().isoformat(),
+                ),
+            })
 
+            return jsonify({'message': 'File queued for processing', 'job_id': job.id, 'status': job.status}), 202
+
+        except QueueFull as e:
+            os.remove(upload_path)
+            return jsonify({'error': str(e)}), 503
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
     return jsonify({'error': 'File processing failed'}), 500
 
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """
+    Process many PDFs (or ZIPs of PDFs) with at most BATCH_CONCURRENCY in flight.
+
+    Shared metadata comes from the usual form fields; `overrides` is a JSON object
+    mapping an uploaded filename to metadata for that file only. Progress is
+    streamed as NDJSON, or as server-sent events with `?format=sse`, and the
+    document store is written once when the batch ends.
+    """
+    files = request.files.getlist('files') or request.files.getlist('file')
+    if not files:
+        return jsonify({'error': 'No file part'}), 400
+    try:
+        overrides = json.loads(request.form.get('overrides') or '{}')
+    except json.JSONDecodeError:
+        overrides = None
+    if not isinstance(overrides, dict) or not all(isinstance(v, dict) for v in overrides.values()):
+        return jsonify({'error': 'overrides must be a JSON object mapping filenames to metadata objects'}), 400
+
+    shared = {field: request.form.get(field) for field in METADATA_FIELDS}
+    use_cache = not form_flag('bypass_cache')
+    profile, mode, error = extraction_options()
+    if error:
+        return jsonify({'error': error}), 400
+    sse = request.args.get('format') == 'sse'
+
+    def event(data):
+        line = json.dumps(data)
+        return f"data: {line}\n\n" if sse else line + "\n"
+
+    def generate():
+        documents, failed = [], 0
+        pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch")
+        in_flight = {}
+        pending_files = iter_batch_files(files)
+        try:
+            while True:
+                # Read files lazily so only BATCH_CONCURRENCY PDFs are held in memory at once
+                for name, read in pending_files:
+                    filename = secure_filename(name)
+                    metadata = dict(shared, upload_date=datetime.utcnow().isoformat())
+                    metadata.update({k: v for k, v in overrides.get(name, {}).items() if k in METADATA_FIELDS})
+                    in_flight[pool.submit(contextvars.copy_context().run, process_batch_file,
+                                          filename, read(), metadata, use_cache, profile, mode)] = name
+                    yield event({'file': name, 'status': 'running'})
+                    if len(in_flight) >= BATCH_CONCURRENCY:
+                        break
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = in_flight.pop(future)
+                    try:
+                        doc, timings = future.result()
+                        documents.append(doc)
+                        yield event({'file': name, 'status': 'done', 'filename': doc['filename'], 'timings': timings})
+                    except Exception as e:
+                        failed += 1
+                        yield event({'file': name, 'status': 'failed', 'error': str(e),
+                                     'retry_after': getattr(e, 'retry_after', None)})
+
+            yield event({'status': 'complete', 'processed': len(documents), 'failed': failed})
+        finally:
+            pool.shutdown(wait=True)
+            if documents:
+                get_document_store().add_many(documents)
+
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@app.route('/upload_stream', methods=['POST'])
+def upload_stream():
+    """
+    Extract one PDF in the request and stream the result as server-sent events.
+
+    The completion is parsed as it is generated and a `section` event is sent
+    for each top-level section as soon as it is complete, so the parties can be
+    reviewed while the coverage tables are still being written. The record is
+    then validated, saved and registered, and the stream ends with a `done`
+    event carrying the filename, or an `error` event.
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    profile, _, error = extraction_options()
+    if error:
+        return jsonify({'error': error}), 400
+
+    filename = secure_filename(file.filename)
+    pdf_content = file.read()
+    use_cache = not form_flag('bypass_cache')
+    metadata = dict({field: request.form.get(field) for field in METADATA_FIELDS},
+                    upload_date=datetime.utcnow().isoformat())
+
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        try:
+            pdf_hash, markdown = ocr_document(pdf_content, use_cache)
+            user_input = markdown
+            prompt = prompt_registry.get(PROMPT_VERSION, profile).text
+            # A streamed reply is the same single call, so it shares that mode's cache entries
+            cache_key = json_cache_key(pdf_hash, prompt, 'single')
+            json_output = get_extraction_cache().get(JSON_TIER, cache_key) if use_cache else None
+
+            if json_output is not None:
+                cache_key = None
+                for section, value in parse_json_reply(json_output).items():
+                    yield event('section', {'section': section, 'data': value})
+            else:
+                if PROMPT_TOKEN_BUDGET:
+                    user_input, _ = compact_markdown(user_input, prompt, PROMPT_TOKEN_BUDGET, model=MODEL)
+                parser, chunks = ObjectStreamParser(), []
+                for chunk in stream_chat_completion(prompt, user_input):
+                    chunks.append(chunk)
+                    if parser is None:
+                        continue
+                    try:
+                        completed = parser.feed(chunk)
+                    except ValueError:
+                        # Stop streaming sections; the full reply is still validated below
+                        logger.warning("Could not parse streamed reply for %s incrementally", filename)
+                        parser, completed = None, []
+                    for section, value in completed:
+                        yield event('section', {'section': section, 'data': value})
+                json_output = "".join(chunks)
+
+            output_filename = save_extraction(filename, json_output, profile, markdown, cache_key)
+            get_document_store().add(dict(metadata, filename=output_filename, status='uploaded'))
+            yield event('done', {'filename': output_filename})
+        except Exception as e:
+            yield event('error', {'error': str(e), 'retry_after': getattr(e, 'retry_after', None)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == FAILED:
+        if job.retry_after is not None:
+            # The upstream was throttling or down; POST /jobs/<id>/retry once it has recovered
+            error = UpstreamUnavailable(None, job.error, retry_after=job.retry_after)
+            return upstream_unavailable_response(error)
+        return jsonify({'status': job.status, 'error': job.error}), 500
+    if job.status != DONE:
+        return jsonify({'status': job.status}), 202
+
+    filename = job.result['filename']
+    with open(os.path.join(OUTPUT_JSON_DIR, filename), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return jsonify({'status': job.status, 'filename': filename, 'timings': job.timings, 'data': data})
+
+@app.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    try:
+        job = get_job_queue().retry(job_id)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    if job is None:
+        return jsonify({'error': 'Job not found or not failed'}), 404
+    return jsonify({'message': 'Job re-queued', 'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_extraction_cache().stats())
+
+@app.route('/prompts', methods=['GET'])
+def list_prompts():
+    prompts = [prompt_registry.get(version, profile).to_dict() for version in VERSIONS for profile in PROFILES]
+    return jsonify({'active_version': PROMPT_VERSION, 'prompts': prompts})
+
+@app.route('/client_stats', methods=['GET'])
+def client_stats():
+    return jsonify(clients.stats.snapshot())
+
+@app.before_request
+def start_request_trace():
+    # Honour an upstream proxy's request ID so logs can be joined across services
+    metrics.start_trace(request.headers.get('X-Request-ID'))
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def finish_request_trace(response):
+    response.headers['X-Request-ID'] = metrics.current_trace_id()
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - request.start_time, endpoint=request.endpoint or 'unknown',
+                                 method=request.method, status=response.status_code)
+    return response
+
+@metrics.REGISTRY.add_collector
+def collect_live_gauges():
+    if _job_queue is not None:
+        metrics.JOBS_PENDING.set(_job_queue.stats()['pending'])
+    for upstream, stats in rate_limiter.all_stats().items():
+        metrics.UPSTREAM_QUEUE_DEPTH.set(stats['queue_depth'], upstream=upstream)
+    metrics.CACHE_BYTES.set(get_extraction_cache().stats()['bytes'])
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process answers requests. Nothing else is checked, so a slow upstream never restarts it."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: 503 while the process drains for shutdown, when the document
+    store cannot be read or when the job queue is full, so the load balancer
+    sends uploads elsewhere. Configuration problems are reported but do not
+    fail it; the dashboard and stored documents still work without them.
+    """
+    checks = {'draining': _draining.is_set()}
+    try:
+        get_document_store().revision()
+        checks['document_store'] = True
+    except Exception as e:
+        logger.warning("Readiness check: document store unavailable: %s", e)
+        checks['document_store'] = False
+    if _job_queue is not None:
+        stats = _job_queue.stats()
+        checks['job_queue'] = stats['pending'] < stats['max_pending']
+    ready = not checks['draining'] and checks['document_store'] and checks.get('job_queue', True)
+    body = {'status': 'ready' if ready else 'unavailable', 'checks': checks, 'config_problems': config_problems}
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/scheduler_stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(rate_limiter.all_stats())
+
 @app.route('/get_documents', methods=['GET'])
 def get_documents():
-    documents = read_documents_db()
-    return jsonify(sorted(documents, key=lambda x: x['upload_date'], reverse=True))
+    """
+    List documents newest first. Without `limit` this returns the full list; with
+    it, one keyset page plus `next_cursor` and per-status counts. Filters:
+    status, tenant_code, property_no, external_id, date_from, date_to; `fields`
+    is a comma-separated projection.
+    """
+    # The revision changes on every write, so it plus the query string identifies the response
+    etag = hashlib.sha1(f"{get_document_store().revision()}?{request.query_string.decode()}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        return '', 304
+
+    if 'limit' not in request.args:
+        response = jsonify(get_document_store().list())
+    else:
+        try:
+            limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+            fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+            filters = {field: request.args[field] for field in FILTER_FIELDS if request.args.get(field)}
+            documents, next_cursor = get_document_store().query(
+                filters,
+                date_from=request.args.get('date_from'),
+                date_to=request.args.get('date_to'),
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                fields=fields,
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response = jsonify({
+            'documents': documents,
+            'next_cursor': next_cursor,
+            'status_counts': get_document_store().status_counts(),
+        })
+
+    response.set_etag(etag)
+    return response
+
+@app.route('/search', methods=['GET'])
+def search_documents():
+    """
+    Full-text search over extracted fields and OCR text. `q` takes terms,
+    "phrases", prefix* and fuzzy~ terms, each optionally scoped as field:term;
+    all must match. Results are best first, paged with `limit` and `offset`.
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    try:
+        with span('search'):
+            results = get_search_index().search(request.args.get('q', ''), limit=limit, offset=offset)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'next_offset': offset + limit if len(results) == limit else None})
+
+def analytics_as_of():
+    """The `as_of` date of an analytics query (default today); raises ValueError."""
+    as_of = request.args.get('as_of')
+    try:
+        return date.fromisoformat(as_of) if as_of else date.today()
+    except ValueError:
+        raise ValueError(f"as_of must be YYYY-MM-DD, not {as_of}")
+
+@app.route('/analytics/expiring', methods=['GET'])
+def analytics_expiring():
+    """
+    Policies ending within `days` (default 30) of `as_of`, soonest first.
+    `section` limits it to one coverage; `include_expired=1` adds policies
+    that have already ended.
+    """
+    limit = min(max(request.args.get('limit', MAX_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    days = request.args.get('days', 30, type=int)
+    try:
+        as_of = analytics_as_of()
+        until = as_of + timedelta(days=days)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError:
+        return jsonify({'error': f'days={days} is out of range'}), 400
+    date_from = None if request.args.get('include_expired', '').lower() in ('1', 'true', 'yes') else as_of.isoformat()
+    policies = get_document_store().expiring(date_from, until.isoformat(), section=request.args.get('section'), limit=limit)
+    for policy in policies:
+        policy['days_left'] = days_until(policy['end_date'], as_of)
+    return jsonify({'as_of': as_of.isoformat(), 'until': until.isoformat(), 'policies': policies})
+
+@app.route('/analytics/below_limit', methods=['GET'])
+def analytics_below_limit():
+    """
+    Coverages whose limit is under a requirement, e.g.
+    `section=commercial_general_liability&field=each_occurrence&threshold=$1M`.
+    `include_missing=1` also lists coverages where the limit could not be read.
+    """
+    section, field = request.args.get('section', ''), request.args.get('field', '')
+    if field not in MONEY_FIELDS or field not in (COI_SCHEMA.get(section) or []):
+        return jsonify({'error': f'{section}.{field} is not a limit field'}), 400
+    threshold = parse_money(request.args.get('threshold', ''))
+    if threshold is None:
+        return jsonify({'error': 'threshold must be a dollar amount'}), 400
+    limit = min(max(request.args.get('limit', MAX_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    include_missing = request.args.get('include_missing', '').lower() in ('1', 'true', 'yes')
+    policies = get_document_store().below_limit(section, field, threshold, include_missing=include_missing, limit=limit)
+    return jsonify({'section': section, 'field': field, 'threshold': threshold, 'policies': policies})
+
+@app.route('/analytics/summary', methods=['GET'])
+def analytics_summary():
+    """Per coverage section: policies, expired, expiring within each of `windows` days (default 30,60,90)."""
+    try:
+        as_of = analytics_as_of()
+        try:
+            windows = [int(w) for w in request.args.get('windows', '30,60,90').split(',') if w.strip()]
+        except ValueError:
+            raise ValueError("❌ windows must be comma-separated whole numbers of days, e.g. 30,60,90")
+        sections = get_document_store().coverage_summary(as_of.isoformat(), windows)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'as_of': as_of.isoformat(), 'sections': sections})
+
+@app.route('/export', methods=['GET'])
+def export_documents():
+    """
+    Render every document matching the filters (status, tenant_code,
+    property_no, external_id, date_from, date_to) to PDF and stream them back
+    as a ZIP, or with `format=pdf` as one merged PDF of at most
+    EXPORT_MAX_MERGED documents.
+    """
+    export_format = request.args.get('format', 'zip')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format: {export_format}'}), 400
+
+    filters = {field: request.args[field] for field in FILTER_FIELDS if request.args.get(field)}
+    filenames, cursor = [], None
+    try:
+        while True:
+            documents, cursor = get_document_store().query(
+                filters, date_from=request.args.get('date_from'), date_to=request.args.get('date_to'),
+                limit=MAX_PAGE_SIZE, cursor=cursor, fields=['filename'])
+            filenames.extend(doc['filename'] for doc in documents)
+            if cursor is None:
+                break
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not filenames:
+        return jsonify({'error': 'No documents match the filters'}), 404
+
+    paths = [os.path.join(OUTPUT_JSON_DIR, filename) for filename in filenames]
+    export_name = f"coi-export-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    headers = {'Content-Disposition': f'attachment; filename={export_name}'}
+    if export_format == 'zip':
+        return Response(stream_with_context(get_pdf_exporter().iter_zip(paths)), mimetype='application/zip',
+                        headers=headers)
+    if len(paths) > EXPORT_MAX_MERGED:
+        return jsonify({'error': f'{len(paths)} documents match; a merged PDF holds at most {EXPORT_MAX_MERGED}. '
+                                 'Narrow the filters or export a ZIP.'}), 413
+
+    pdf_path, count = get_pdf_exporter().merged_pdf(paths)
+    if not count:
+        os.remove(pdf_path)
+        return jsonify({'error': 'None of the matching documents could be rendered'}), 500
+    return Response(iter_file(pdf_path), mimetype='application/pdf', headers=headers)
 
 @app.route('/get_processed_files')
 def get_processed_files():
@@ -106,7 +882,79 @@ def get_processed_files():
 
 @app.route('/get_json/<filename>')
 def get_json(filename):
-    return send_from_directory(directory=OUTPUT_JSON_DIR, path=filename)
+    """The extracted JSON, with its version as ETag for If-Match on /patch_json."""
+    filepath = safe_join(OUTPUT_JSON_DIR, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        return jsonify({'error': 'File not found'}), 404
+    with open(filepath, 'rb') as f:
+        json_bytes = f.read()
+    version = json_version(json_bytes)
+    if request.if_none_match.contains(version):
+        return '', 304
+    response = Response(json_bytes, mimetype='application/json')
+    response.set_etag(version)
+    return response
+
+@app.route('/patch_json/<filename>', methods=['PATCH'])
+def patch_json(filename):
+    """
+    Apply a JSON Patch (`Content-Type: application/json-patch+json`) or a JSON
+    Merge Patch (any other JSON body, e.g. `application/merge-patch+json`) to
+    an extracted document. Send the ETag from /get_json as If-Match: if the
+    document changed in the meantime nothing is applied and 412 is returned
+    with the current version. Applied edits are kept in the edit history.
+    """
+    filepath = safe_join(OUTPUT_JSON_DIR, filename)
+    if filepath is None:
+        return jsonify({'error': 'File not found'}), 404
+    patch = request.get_json(force=True, silent=True)
+    if patch is None:
+        return jsonify({'error': 'Request body must be JSON'}), 400
+
+    with json_lock(filename):
+        try:
+            with open(filepath, 'rb') as f:
+                json_bytes = f.read()
+        except FileNotFoundError:
+            return jsonify({'error': 'File not found'}), 404
+        version = json_version(json_bytes)
+        if request.if_match and not request.if_match.contains(version):
+            response = jsonify({'error': 'Document was changed by someone else', 'version': version})
+            response.status_code = 412
+            response.set_etag(version)
+            return response
+
+        data = json.loads(json_bytes)
+        try:
+            if request.mimetype == JSON_PATCH:
+                updated = apply_json_patch(data, patch)
+            else:
+                updated = apply_merge_patch(data, patch)
+            if not isinstance(updated, dict):
+                raise PatchError("The patched document must be a JSON object")
+            _, errors = validate_record(updated, [section for section in COI_SCHEMA if section in updated])
+            if errors:
+                raise PatchError("; ".join(errors))
+        except PatchError as e:
+            return jsonify({'error': str(e), 'version': version}), 422
+
+        changes = merge_diff(data, updated)
+        new_version = version
+        if changes:
+            invalidate_pdf(filename)
+            new_version = write_json_file(filename, updated)
+            index_document(filename, updated)
+            get_document_store().add_edit(filename, version, new_version, changes)
+
+    get_document_store().update_status(filename, 'in_progress')
+    response = jsonify({'success': True, 'version': new_version, 'changed': bool(changes)})
+    response.set_etag(new_version)
+    return response
+
+@app.route('/edit_history/<filename>', methods=['GET'])
+def edit_history(filename):
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+    return jsonify(get_document_store().edit_history(filename, limit))
 
 @app.route('/download_json/<filename>')
 def download_json(filename):
@@ -121,15 +969,26 @@ def download_pdf(filename):
         if not os.path.exists(json_path):
             return 'File not found', 404
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(json_path, 'rb') as f:
+            json_bytes = f.read()
 
-        pdf_filename = f"{os.path.splitext(filename)[0]}.pdf"
-        pdf_path = os.path.join(UPLOAD_FOLDER, pdf_filename) # Storing in uploads temporarily
+        cache_key = pdf_cache_key(json_bytes)
+        if request.if_none_match.contains(cache_key):
+            return '', 304
 
-        generate_pdf_from_json(data, pdf_path)
+        pdf = get_extraction_cache().get_bytes(PDF_TIER, cache_key)
+        if pdf is None:
+            # Rendered in memory, so concurrent downloads never share a file on disk
+            buffer = io.BytesIO()
+            with span('pdf_render'):
+                render_pdf(json.loads(json_bytes), buffer)
+            pdf = buffer.getvalue()
+            get_extraction_cache().put_bytes(PDF_TIER, cache_key, pdf)
 
-        return send_file(pdf_path, as_attachment=True)
+        response = send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                             download_name=f"{os.path.splitext(filename)[0]}.pdf")
+        response.set_etag(cache_key)
+        return response
 
     except Exception as e:
         return str(e), 500
@@ -138,30 +997,40 @@ def download_pdf(filename):
 def save_json(filename):
     try:
         updated_data = request.get_json()
+        # Checked like a patched document, before anything is written
+        if not isinstance(updated_data, dict):
+            return jsonify({'error': 'The document must be a JSON object'}), 422
+        _, errors = validate_record(updated_data, [section for section in COI_SCHEMA if section in updated_data])
+        if errors:
+            return jsonify({'error': "; ".join(errors)}), 422
         filepath = os.path.join(OUTPUT_JSON_DIR, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(updated_data, f, indent=4)
-        
-        documents = read_documents_db()
-        for doc in documents:
-            if doc['filename'] == filename:
-                doc['status'] = 'in_progress'
-                break
-        write_documents_db(documents)
+        with json_lock(filename):
+            try:
+                with open(filepath, 'rb') as f:
+                    json_bytes = f.read()
+                previous, previous_version = json.loads(json_bytes), json_version(json_bytes)
+            except FileNotFoundError:
+                previous, previous_version = {}, None
+            invalidate_pdf(filename)
+            version = write_json_file(filename, updated_data)
+            index_document(filename, updated_data)
+            if version != previous_version:
+                # A file left by an older save may not be an object; record it as replaced wholesale
+                changes = merge_diff(previous, updated_data) if isinstance(previous, dict) else updated_data
+                get_document_store().add_edit(filename, previous_version, version, changes)
 
-        return jsonify({'success': True})
+        get_document_store().update_status(filename, 'in_progress')
+
+        response = jsonify({'success': True, 'version': version})
+        response.set_etag(version)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/mark_complete/<filename>', methods=['POST'])
 def mark_complete(filename):
     try:
-        documents = read_documents_db()
-        for doc in documents:
-            if doc['filename'] == filename:
-                doc['status'] = 'verified'
-                break
-        write_documents_db(documents)
+        get_document_store().update_status(filename, 'verified')
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -171,17 +1040,92 @@ def delete_document(filename):
     try:
         # Remove from the JSON file system
         filepath = os.path.join(OUTPUT_JSON_DIR, filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        with json_lock(filename):
+            invalidate_pdf(filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            get_search_index().delete(filename)
 
         # Remove from the DB
-        documents = read_documents_db()
-        updated_documents = [doc for doc in documents if doc['filename'] != filename]
-        write_documents_db(updated_documents)
+        get_document_store().delete(filename)
 
         return jsonify({'message': f'Document {filename} deleted successfully.'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# --- STARTUP ---
+def check_config():
+    """
+    Log configuration problems that would make extractions fail. The app still
+    starts, so the dashboard and the stored documents stay available; the
+    affected calls fail with the same message.
+    """
+    problems = openai_module.check_config() + clients.check_config()
+    if EXTRACTION_ENGINE not in EXTRACTION_ENGINES:
+        problems.append(f"❌ Unknown EXTRACTION_ENGINE {EXTRACTION_ENGINE!r}; using 'sync'")
+    for problem in problems:
+        logger.error(problem)
+    return problems
+
+def start_background_tasks():
+    for task in store_maintenance:
+        task.start()
+
+def warm():
+    """
+    Build the state a first request would otherwise pay for: the OpenAI and
+    Vision SDKs, the PDF renderer, the compiled prompts, the tokenizer, and
+    the document store, search index and cache (migrated, reconciled and
+    scanned). A preloading server calls this once in its parent so forked
+    workers share it. No gRPC channel or thread is created here, and the
+    SQLite connections opened here are closed, since none may cross fork().
+    """
+    with span('warm'):
+        clients.openai_sdk()
+        clients.vision_sdk()
+        warm_renderer()
+        for profile in PROFILES:
+            prompt_registry.get(PROMPT_VERSION, profile)
+        count_tokens("", MODEL)
+        get_document_store()
+        get_search_index()
+        get_extraction_cache()
+    get_document_store().close()
+    get_search_index().close()
+
+def post_fork():
+    """Start the per-process background tasks in a worker forked from a preloaded parent."""
+    start_background_tasks()
+
+def shutdown(timeout=None):
+    """
+    Drain the process before it exits: /readyz turns 503 and new uploads get
+    503, running extractions get up to `timeout` seconds to finish, then the
+    background tasks and PDF workers stop and the WAL is checkpointed. Jobs
+    left unfinished stay in the journal and are re-run on the next start.
+    """
+    _draining.set()
+    for task in store_maintenance:
+        task.stop()
+    with _job_queue_lock:
+        queue = _job_queue
+    unfinished = queue.drain(timeout) if queue is not None else 0
+    if unfinished:
+        logger.warning("Shutting down with %d unfinished job(s); they are re-run on the next start", unfinished)
+    with _state_lock:
+        exporter, store = _pdf_exporter, _document_store
+    if exporter is not None:
+        exporter.shutdown()
+    async_core.shutdown()
+    if store is not None:
+        store.checkpoint()
+    return unfinished
+
+_draining = threading.Event()
+config_problems = check_config()
+# Not in a child process: the PDF pool's workers import the main module, which is this one under `python app.py`
+if not APP_PRELOAD and multiprocessing.parent_process() is None:
+    start_background_tasks()
+
 if __name__ == '__main__':
     app.run(debug=True)
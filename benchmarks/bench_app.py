@@ -0,0 +1,261 @@
+"""
+Drive the Flask app end to end against recorded upstream responses.
+
+Vision responses are replayed from fixtures in place of the Vision client and
+chat completions are served by a local fake OpenAI endpoint, both with a
+simulated latency, so no credentials or network are needed. The app runs on a
+threaded local server with its data in a temporary directory, and each
+scenario (upload, get_documents, save_json, download_pdf) is run by
+`--concurrency` clients. Reported per scenario: p50/p95/p99 latency,
+throughput (docs/min for uploads), the process's peak RSS and the peak
+number of app threads (the benchmark's clients and the fake OpenAI server's
+threads are not counted). `--engine` picks the extraction engine
+(EXTRACTION_ENGINE), so the thread-per-call and asyncio paths can be
+compared at the same load. Upload latency includes up to `--poll-interval`
+of polling slack.
+
+    python benchmarks/bench_app.py [--uploads 40] [--concurrency 8] [--engine sync|async]
+        [--vision-latency 0.4] [--openai-latency 2.0] [--poll-interval 0.5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from fixtures import (AsyncFixtureVisionClient, FakeOpenAIServer, FixtureVisionClient,  # noqa: E402
+                      load_openai_fixtures, load_vision_fixtures)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Client:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def request(self, method, path, body=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def upload(self, filename, content):
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+                f"Content-Type: application/pdf\r\n\r\n").encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        return self.request('POST', '/upload', body, {'Content-Type': f"multipart/form-data; boundary={boundary}"})
+
+
+def run_scenario(name, operation, count, concurrency, unit_per_min=None):
+    """Run `operation(i)` `count` times on `concurrency` threads; it returns True on success."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal errors
+        start = time.perf_counter()
+        ok = operation(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    peak_threads = 0
+    finished = threading.Event()
+
+    def sample_threads():
+        # The app's threads: job and upstream pools, server request threads; not the benchmark's clients
+        nonlocal peak_threads
+        while not finished.wait(0.05):
+            app_threads = sum(1 for t in threading.enumerate() if not t.name.startswith(("bench-", "fake-openai")))
+            peak_threads = max(peak_threads, app_threads)
+
+    sampler = threading.Thread(target=sample_threads, name="bench-sampler", daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-client") as pool:
+        list(pool.map(timed, range(count)))
+    wall = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+
+    latencies.sort()
+    result = {
+        'scenario': name,
+        'requests': count,
+        'errors': errors,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'per_sec': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_threads': peak_threads,
+    }
+    if unit_per_min:
+        result[unit_per_min] = round(len(latencies) / wall * 60, 1) if wall else None
+    return result
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def configure_environment(data_dir, args, api_base):
+    os.environ.update({
+        'OPENAI_API_KEY': "bench",
+        'OPENAI_API_BASE': api_base,
+        'EXTRACTION_ENGINE': args.engine,
+        'OPENAI_RPM': "0",
+        'OPENAI_TPM': "0",
+        'VISION_RPM': "0",
+        'JOB_WORKERS': str(args.workers or args.concurrency),
+        'ASYNC_JOB_CONCURRENCY': str(args.workers or args.concurrency),
+        'JOB_QUEUE_LIMIT': str(max(100, args.uploads)),
+        'JOB_JOURNAL': os.path.join(data_dir, 'jobs.journal'),
+        'DOCUMENTS_DB': os.path.join(data_dir, 'documents.json'),
+        'DOCUMENT_STORE': "sqlite:///" + os.path.join(data_dir, 'documents.db'),
+        'SEARCH_INDEX': os.path.join(data_dir, 'search.db'),
+        'CACHE_DIR': os.path.join(data_dir, 'cache'),
+        'STORE_CHECKPOINT_SECONDS': "0",
+        'STORE_SNAPSHOT_SECONDS': "0",
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fixtures', default=os.path.join(BENCH_DIR, 'fixtures'))
+    parser.add_argument('--uploads', type=int, default=40, help="documents uploaded (and later saved/downloaded)")
+    parser.add_argument('--requests', type=int, default=200, help="requests for the read/write scenarios")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, help="JOB_WORKERS, or ASYNC_JOB_CONCURRENCY with --engine async (default: --concurrency)")
+    parser.add_argument('--engine', choices=('sync', 'async'), default='sync', help="EXTRACTION_ENGINE")
+    parser.add_argument('--vision-latency', type=float, default=0.4, help="seconds per Vision request")
+    parser.add_argument('--openai-latency', type=float, default=2.0, help="seconds per chat completion")
+    parser.add_argument('--poll-interval', type=float, default=0.5,
+                        help="seconds between a client's job status polls (the frontend polls every 2s)")
+    parser.add_argument('--jitter', type=float, default=0.1, help="± seconds added to each simulated latency")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--keep', action='store_true', help="keep the temporary data directory")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    vision_fixtures = load_vision_fixtures(args.fixtures)
+    fake_openai = FakeOpenAIServer(load_openai_fixtures(args.fixtures), args.openai_latency, args.jitter).start()
+
+    data_dir = tempfile.mkdtemp(prefix="coi-bench-")
+    configure_environment(data_dir, args, fake_openai.api_base)
+    # The app keeps uploads/ and extracted_json/ relative to the working directory
+    os.chdir(data_dir)
+
+    from werkzeug.serving import make_server
+
+    import app as coi_app
+    from modules import async_core, clients
+
+    if args.engine == 'async':
+        fixture_vision = AsyncFixtureVisionClient(vision_fixtures, args.vision_latency, args.jitter)
+        async_core.get_core()._vision = fixture_vision
+    else:
+        fixture_vision = FixtureVisionClient(vision_fixtures, args.vision_latency, args.jitter)
+        clients._vision_client = fixture_vision
+
+    server = make_server("127.0.0.1", 0, coi_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    client = Client(f"http://127.0.0.1:{server.server_port}")
+    filenames = [None] * args.uploads
+
+    def upload(i):
+        # Unique bytes per upload so every document misses the extraction cache
+        status, body = client.upload(f"bench_{i:05d}.pdf", b"%PDF-1.4\n%bench " + uuid.uuid4().bytes)
+        if status != 202:
+            return False
+        job_id = json.loads(body)['job_id']
+        while True:
+            status, body = client.request('GET', f'/jobs/{job_id}')
+            job = json.loads(body)
+            if job['status'] == 'done':
+                filenames[i] = job['result']['filename']
+                return True
+            if job['status'] == 'failed':
+                print(f"upload {i} failed: {job['error']}", file=sys.stderr)
+                return False
+            time.sleep(args.poll_interval)
+
+    def get_documents(i):
+        return client.request('GET', '/get_documents?limit=50')[0] == 200
+
+    def save_json(i):
+        filename = saved[i % len(saved)]
+        status, body = client.request('GET', f'/get_json/{filename}')
+        if status != 200:
+            return False
+        record = json.loads(body)
+        record['insured']['name'] = f"Bench edit {i}"
+        status, _ = client.request('POST', f'/save_json/{filename}', json.dumps(record).encode(),
+                                   {'Content-Type': 'application/json'})
+        return status == 200
+
+    def download_pdf(i):
+        status, body = client.request('GET', f'/download_pdf/{saved[i % len(saved)]}')
+        return status == 200 and body.startswith(b"%PDF")
+
+    results = [run_scenario('upload', upload, args.uploads, args.concurrency, unit_per_min='docs_per_min')]
+    saved = [f for f in filenames if f]
+    if saved:
+        results.append(run_scenario('get_documents', get_documents, args.requests, args.concurrency))
+        results.append(run_scenario('save_json', save_json, args.requests, args.concurrency))
+        results.append(run_scenario('download_pdf', download_pdf, args.requests, args.concurrency))
+
+    server.shutdown()
+    async_core.shutdown()
+    fake_openai.stop()
+    if not args.keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'scenario':<14} {'reqs':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>8} "
+          f"{'docs/min':>9} {'RSS MB':>7} {'threads':>8}")
+    for r in results:
+        print(f"{r['scenario']:<14} {r['requests']:>5} {r['errors']:>4} {r['p50_ms'] or '-':>9} {r['p95_ms'] or '-':>9} "
+              f"{r['p99_ms'] or '-':>9} {r['per_sec']:>8} {r.get('docs_per_min', ''):>9} {r['peak_rss_mb']:>7} "
+              f"{r['peak_threads']:>8}")
+
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key != 'json'}
+        config.update(vision_calls=fixture_vision.calls, openai_calls=fake_openai.calls)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'app', 'config': config, 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Measure how long a fresh process takes to import the app, against a budget.
+
+Each run starts a new interpreter with its data in a temporary directory and
+times `import app` (what every worker pays before serving) and then
+`app.warm()` (what a preloading server pays once in its parent). The modules
+that take longest under `python -X importtime` are listed, as are any heavy
+SDKs that were imported eagerly. Exits non-zero when the median import time is
+over `--budget-ms`, so it can run as a check.
+
+    python benchmarks/bench_import.py [--runs 5] [--budget-ms 500] [--top 10] [--json results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# Loaded on first use; none of them should be imported by `import app`
+LAZY_MODULES = ("openai", "google.cloud.vision", "grpc", "reportlab")
+
+PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {REPO_DIR!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+eager = [name for name in {LAZY_MODULES!r} if name in sys.modules]
+app.warm()
+print(json.dumps({{'import_seconds': imported - start, 'warm_seconds': time.perf_counter() - imported,
+                  'eager': eager}}))
+"""
+IMPORT_ONLY = f"import sys; sys.path.insert(0, {REPO_DIR!r}); import app"
+
+
+def probe_environment(data_dir):
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY') or "bench",
+        'JOB_JOURNAL': os.path.join(data_dir, 'jobs.journal'),
+        'DOCUMENTS_DB': os.path.join(data_dir, 'documents.json'),
+        'DOCUMENT_STORE': "sqlite:///" + os.path.join(data_dir, 'documents.db'),
+        'SEARCH_INDEX': os.path.join(data_dir, 'search.db'),
+        'CACHE_DIR': os.path.join(data_dir, 'cache'),
+        'STORE_CHECKPOINT_SECONDS': "0",
+        'STORE_SNAPSHOT_SECONDS': "0",
+    })
+    return env
+
+
+def run_python(data_dir, *args):
+    completed = subprocess.run([sys.executable, *args], cwd=data_dir, env=probe_environment(data_dir),
+                               capture_output=True, text=True, check=False)
+    if completed.returncode != 0:
+        sys.exit(f"Importing the app failed:\n{completed.stderr}")
+    return completed
+
+
+def run_probe(data_dir):
+    """Time `import app` and `app.warm()` in a fresh interpreter."""
+    return json.loads(run_python(data_dir, "-c", PROBE).stdout.strip().splitlines()[-1])
+
+
+def importtime_report(data_dir):
+    """The -X importtime report of `import app` alone."""
+    return run_python(data_dir, "-X", "importtime", "-c", IMPORT_ONLY).stderr
+
+
+def slowest_imports(report, top):
+    """
+    The `top` modules imported directly by the app, by cumulative import time in ms, from a -X importtime report. Submodules are
+    left out so a package's time is not counted twice.
+    """
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Names are indented two spaces per nesting level; `app` is level 0, what it imports level 1
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative.strip().isdigit() and depth == 1:
+            entries.append((int(cumulative) / 1000, name.strip()))
+    return [{'module': name, 'cumulative_ms': round(ms, 1)} for ms, name in sorted(entries, reverse=True)[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=500, help="maximum median `import app` time")
+    parser.add_argument('--top', type=int, default=10, help="slowest imports of the app to list")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="coi-bench-import-")
+    try:
+        # The first run creates the stores and warms the OS file cache; it is not counted
+        run_probe(data_dir)
+        runs = [run_probe(data_dir) for _ in range(args.runs)]
+        report = importtime_report(data_dir)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    import_ms = sorted(run['import_seconds'] * 1000 for run in runs)
+    warm_ms = sorted(run['warm_seconds'] * 1000 for run in runs)
+    result = {
+        'runs': args.runs,
+        'import_p50_ms': round(statistics.median(import_ms), 1),
+        'import_max_ms': round(import_ms[-1], 1),
+        'warm_p50_ms': round(statistics.median(warm_ms), 1),
+        'budget_ms': args.budget_ms,
+        'eager_sdks': sorted({name for run in runs for name in run['eager']}),
+        'slowest_imports': slowest_imports(report, args.top),
+    }
+
+    print(f"import app   p50 {result['import_p50_ms']:>8} ms   max {result['import_max_ms']:>8} ms   "
+          f"budget {args.budget_ms:g} ms")
+    print(f"app.warm()   p50 {result['warm_p50_ms']:>8} ms")
+    if result['eager_sdks']:
+        print(f"imported eagerly: {', '.join(result['eager_sdks'])}")
+    print(f"\n{'slowest imports of app':<40} {'ms':>8}")
+    for entry in result['slowest_imports']:
+        print(f"{entry['module']:<40} {entry['cumulative_ms']:>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'import', 'results': [result]}, f, indent=4)
+
+    if result['import_p50_ms'] > args.budget_ms:
+        sys.exit(f"import app took {result['import_p50_ms']} ms, over the {args.budget_ms:g} ms budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare the plain-text table heuristic with the layout-aware markdown builder.
+
+The corpus is a directory of Vision responses saved as JSON: either
+AnnotateFileResponse / BatchAnnotateFilesResponse objects (e.g. from
+`vision.AnnotateFileResponse.to_json(response)`) or the REST API output.
+For each builder it reports the time per page and the size of the markdown
+it produces, i.e. what ends up in the GPT-4 prompt.
+
+    python benchmarks/bench_markdown.py path/to/corpus [--repeat 20] [--json results.json]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.layout_markdown import layout_to_markdown, text_to_markdown  # noqa: E402
+
+_CAMEL = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+def legacy_to_markdown(page_number, text):
+    """The per-character heuristic run_ocr used before the layout builder."""
+    output_md = [f"### Page {page_number}\n"]
+    in_table = False
+    for line in text.split("\n"):
+        if any(char in line for char in ['|', '+', '-', '—', '│']):
+            if not in_table:
+                output_md.append("```\n")
+                in_table = True
+            output_md.append(line + "\n")
+        else:
+            if in_table:
+                output_md.append("```\n")
+                in_table = False
+            output_md.append(line + "\n")
+    if in_table:
+        output_md.append("```\n")
+    return "".join(output_md)
+
+
+def snake_case_keys(value):
+    """REST JSON uses camelCase keys; the builder expects proto field names."""
+    if isinstance(value, dict):
+        return {_CAMEL.sub("_", key).lower(): snake_case_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [snake_case_keys(item) for item in value]
+    return value
+
+
+def load_pages(corpus_dir):
+    """Return a list of `full_text_annotation` dicts, one per page in the corpus."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = snake_case_keys(json.load(f))
+        file_responses = data['responses'] if 'total_pages' not in data else [data]
+        for file_response in file_responses:
+            for page in file_response.get('responses', []):
+                annotation = page.get('full_text_annotation')
+                if annotation:
+                    pages.append(annotation)
+    return pages
+
+
+def approx_tokens(text):
+    # Roughly four characters per token for English text with GPT-4's tokenizer
+    return len(text) // 4
+
+
+def measure(name, render, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = [render(i + 1, page) for i, page in enumerate(pages)]
+    elapsed = time.perf_counter() - start
+    chars = sum(len(output) for output in outputs)
+    return {
+        'builder': name,
+        'pages': len(pages),
+        'ms_per_page': round(elapsed * 1000 / (repeat * len(pages)), 4),
+        'output_chars': chars,
+        'approx_tokens': sum(approx_tokens(output) for output in outputs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('corpus', help="directory of Vision response JSON files")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    pages = load_pages(args.corpus)
+    if not pages:
+        sys.exit(f"No Vision page responses found in {args.corpus}")
+
+    results = [
+        measure('legacy', lambda n, page: legacy_to_markdown(n, page.get('text', '')), pages, args.repeat),
+        measure('text', lambda n, page: text_to_markdown(n, page.get('text', '')), pages, args.repeat),
+        measure('layout', lambda n, page: layout_to_markdown(n, page['pages'][0]), pages, args.repeat),
+    ]
+
+    print(f"{'builder':<8} {'pages':>6} {'ms/page':>10} {'chars':>10} {'~tokens':>9}")
+    for r in results:
+        print(f"{r['builder']:<8} {r['pages']:>6} {r['ms_per_page']:>10} {r['output_chars']:>10} {r['approx_tokens']:>9}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'markdown', 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Measure COI PDF rendering throughput.
+
+"legacy" runs the baseline generate_pdf_from_json, loaded from git: styles,
+table styles and the logo rebuilt on each call, and ReportLab's default
+ASCII85 streams. "per_call" builds a new PdfRenderer per document with
+binary image streams, and "shared" reuses one renderer as the app now does. Records are read from a directory of
+extracted JSON files, or a filled-in sample record is used when none is given.
+
+    python benchmarks/bench_pdf.py [extracted_json] [--repeat 50] [--json results.json]
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.pdf_generator import PdfRenderer  # noqa: E402
+from modules.prompt_builder import empty_record  # noqa: E402
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# The commit before the renderer was reworked
+BASELINE_COMMIT = "fbd432b"
+BASELINE_PATH = "modules/pdf_generator.py"
+
+
+def load_baseline():
+    """
+    The baseline pdf_generator module, read from git into a module of its own.
+    Its __file__ is the current module's path so it finds the logo the same way.
+    """
+    try:
+        source = subprocess.run(["git", "show", f"{BASELINE_COMMIT}:{BASELINE_PATH}"], cwd=REPO_DIR,
+                                check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        sys.exit(f"Cannot read the baseline {BASELINE_PATH} at {BASELINE_COMMIT} from git: {e}")
+    module = types.ModuleType("baseline_pdf_generator")
+    module.__file__ = os.path.join(REPO_DIR, BASELINE_PATH)
+    exec(compile(source, f"{BASELINE_COMMIT}:{BASELINE_PATH}", "exec"), module.__dict__)
+    return module
+
+
+class LegacyRenderer:
+    baseline = None
+
+    def render(self, data, filename):
+        if LegacyRenderer.baseline is None:
+            LegacyRenderer.baseline = load_baseline()
+        LegacyRenderer.baseline.generate_pdf_from_json(data, filename)
+
+
+def sample_record():
+    """A record with every field filled in, so every row and sub-row is rendered."""
+    record = empty_record()
+    for section, fields in record.items():
+        if not isinstance(fields, dict):
+            record[section] = f"{section} text"
+            continue
+        for field, value in fields.items():
+            fields[field] = {'start': "01/01/2026", 'end': "01/01/2027"} if isinstance(value, dict) else f"{field} value"
+    return record
+
+
+def load_records(directory):
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            records.append(json.load(f))
+    return records
+
+
+def measure(name, renderer_for, records, repeat):
+    sizes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for record in records:
+            buffer = io.BytesIO()
+            renderer_for().render(record, buffer)
+            sizes += buffer.tell()
+    elapsed = time.perf_counter() - start
+    renders = repeat * len(records)
+    return {
+        'renderer': name,
+        'renders': renders,
+        'renders_per_sec': round(renders / elapsed, 1),
+        'ms_per_render': round(elapsed * 1000 / renders, 3),
+        'avg_bytes': sizes // renders,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('records', nargs='?', help="directory of extracted JSON files")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    records = load_records(args.records) if args.records else [sample_record()]
+    if not records:
+        sys.exit(f"No JSON files found in {args.records}")
+
+    shared = PdfRenderer()
+    # Warm up both paths (font and image caches inside ReportLab) before timing
+    measure('warmup', PdfRenderer, records[:1], 1)
+    measure('warmup', LegacyRenderer, records[:1], 1)
+    results = [
+        measure('legacy', LegacyRenderer, records, args.repeat),
+        measure('per_call', PdfRenderer, records, args.repeat),
+        measure('shared', lambda: shared, records, args.repeat),
+    ]
+
+    print(f"{'renderer':<10} {'renders':>8} {'renders/s':>10} {'ms/render':>10} {'bytes':>8}")
+    for r in results:
+        print(f"{r['renderer']:<10} {r['renders']:>8} {r['renders_per_sec']:>10} {r['ms_per_render']:>10} {r['avg_bytes']:>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'pdf', 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Measure /search query latency on a large synthetic index, against a budget.
+
+Builds a SearchIndex of `--docs` generated certificates (insurers, producers,
+policy numbers, limits and a page of OCR-like text drawn from a fixed
+vocabulary) in a temporary directory, then runs each kind of query the search
+syntax supports (term, several terms, field-scoped, phrase, prefix, fuzzy,
+and a term that matches nearly every document) `--repeat` times with varying
+terms. Reported per kind: p50/p95/p99 latency and result count. Exits
+non-zero when any kind's p95 is over `--budget-ms`, so it can run as a check.
+Pass `--index` to keep the built index and reuse it on the next run.
+
+    python benchmarks/bench_search.py [--docs 100000] [--repeat 200] [--budget-ms 50] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.prompt_builder import empty_record  # noqa: E402
+from modules.search_index import SearchIndex  # noqa: E402
+
+INSURERS = ["Travelers Casualty", "Hartford Fire", "Liberty Mutual", "Zurich American", "Chubb Indemnity",
+            "Great American", "Nationwide Mutual", "Cincinnati Insurance", "Erie Indemnity", "Acuity Mutual",
+            "Selective Way", "Westfield National", "Markel American", "Berkley Regional", "Sentry Casualty"]
+PRODUCERS = ["Marsh Brokerage", "Aon Risk Services", "Gallagher Agency", "Lockton Companies", "Brown Riding",
+             "Hub International", "USI Insurance", "Alliant Specialty", "Acrisure Partners", "NFP Property"]
+CITIES = ["Chicago", "Dallas", "Denver", "Atlanta", "Boston", "Seattle", "Phoenix", "Portland", "Austin", "Tampa"]
+STREETS = ["Main", "Oak", "Maple", "Cedar", "Elm", "Pine", "Lake", "Hill", "Park", "River"]
+OCR_WORDS = ("certificate liability insurance producer insured holder coverage policy effective expiration "
+             "limits occurrence aggregate premises damage medical expense personal advertising injury products "
+             "completed operations automobile combined single umbrella excess retention workers compensation "
+             "employers disease employee statutory description operations locations vehicles cancellation "
+             "notice accordance provisions authorized representative additional subrogation waived").split()
+
+
+def generate_record(rng, number):
+    record = empty_record()
+    insurer = rng.choice(INSURERS)
+    city, street = rng.choice(CITIES), rng.choice(STREETS)
+    record['producer']['name'] = rng.choice(PRODUCERS)
+    record['producer']['address'] = f"{rng.randint(1, 9999)} {street} St, {city}"
+    record['insured']['name'] = f"Tenant {number:06d} LLC"
+    record['insured']['address'] = f"{rng.randint(1, 9999)} {rng.choice(STREETS)} Ave, {rng.choice(CITIES)}"
+    gl = record['commercial_general_liability']
+    gl['insurer_name'] = insurer
+    gl['policy_number'] = f"GL{rng.randint(100000, 999999)}"
+    gl['each_occurrence'] = f"${rng.choice([1, 2, 5])},000,000"
+    record['property_insurance']['insurer'] = rng.choice(INSURERS)
+    record['description_of_operations']['addresses'] = f"{street} Plaza, {city}"
+    return record
+
+
+def ocr_text(rng, record):
+    words = rng.choices(OCR_WORDS, k=250)
+    return " ".join(words + [record['producer']['name'], record['commercial_general_liability']['insurer_name']])
+
+
+def build_index(path, docs, seed):
+    index = SearchIndex(path)
+    have = len(index.filenames())
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for number in range(docs):
+        record = generate_record(rng, number)
+        text = ocr_text(rng, record)
+        if number >= have:
+            index.update(f"bench_{number:06d}.json", record, ocr_text=text)
+    built = docs - min(have, docs)
+    return index, built, time.perf_counter() - start
+
+
+def query_sets(rng, repeat):
+    """`{kind: [query, ...]}` with `repeat` queries of each kind."""
+    def insurer_word():
+        return rng.choice(INSURERS).split()[0].lower()
+
+    def fuzzy(word):
+        position = rng.randrange(2, len(word))
+        return word[:position] + word[position + 1:] + "~"
+
+    return {
+        'term': [insurer_word() for _ in range(repeat)],
+        'terms': [f"{insurer_word()} {rng.choice(CITIES).lower()}" for _ in range(repeat)],
+        'field': [f"producer:{rng.choice(PRODUCERS).split()[0].lower()}" for _ in range(repeat)],
+        'phrase': [f'"{rng.choice(INSURERS).lower()}"' for _ in range(repeat)],
+        'prefix': [insurer_word()[:4] + "*" for _ in range(repeat)],
+        'fuzzy': [fuzzy(insurer_word()) for _ in range(repeat)],
+        'common': [rng.choice(["certificate", "insurance", "liability"]) for _ in range(repeat)],
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(index, kind, queries, limit):
+    latencies, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        hits += len(index.search(query, limit=limit))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'kind': kind,
+        'queries': len(queries),
+        'avg_results': round(hits / len(queries), 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200, help="queries of each kind")
+    parser.add_argument('--limit', type=int, default=20, help="results per query, as /search returns by default")
+    parser.add_argument('--budget-ms', type=float, default=50.0, help="p95 latency budget per query kind")
+    parser.add_argument('--index', help="build (or reuse) the index at this path and keep it")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    data_dir = None if args.index else tempfile.mkdtemp(prefix="coi-bench-search-")
+    path = args.index or os.path.join(data_dir, "search.db")
+    try:
+        index, built, seconds = build_index(path, args.docs, args.seed)
+        if built:
+            print(f"Indexed {built} document(s) in {seconds:.1f}s ({built / seconds:.0f} docs/s)")
+        # Warm the page cache and the vocabulary before timing
+        index.search("certificate")
+
+        rng = random.Random(args.seed + 1)
+        results = [measure(index, kind, queries, args.limit) for kind, queries in query_sets(rng, args.repeat).items()]
+        index.close()
+    finally:
+        if data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'kind':<8} {'queries':>8} {'results':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['kind']:<8} {r['queries']:>8} {r['avg_results']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+
+    over = [r['kind'] for r in results if r['p95_ms'] > args.budget_ms]
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'search', 'docs': args.docs, 'budget_ms': args.budget_ms,
+                       'over_budget': over, 'results': results}, f, indent=4)
+    if over:
+        sys.exit(f"p95 over the {args.budget_ms:g} ms budget: {', '.join(over)}")
+
+
+if __name__ == '__main__':
+    main()
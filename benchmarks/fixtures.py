@@ -0,0 +1,321 @@
+"""
+Recorded upstream responses for offline benchmarks.
+
+Vision fixtures are AnnotateFileResponse JSON files (`<dir>/vision/*.json`),
+chat completion fixtures the raw OpenAI response bodies (`<dir>/openai/*.json`).
+FixtureVisionClient replays the former in place of the Vision client
+(AsyncFixtureVisionClient in place of the async core's) and FakeOpenAIServer serves the latter on a local port for OPENAI_API_BASE, each
+with a simulated latency.
+
+    python benchmarks/fixtures.py sample benchmarks/fixtures        # synthetic two-page certificate
+    python benchmarks/fixtures.py record benchmarks/fixtures a.pdf  # live Vision + OpenAI calls
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.cloud import vision
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from modules.prompt_builder import empty_record  # noqa: E402
+
+
+def _jittered(latency, jitter):
+    return max(0.0, random.uniform(latency - jitter, latency + jitter))
+
+
+def _simulated_delay(latency, jitter):
+    if latency:
+        time.sleep(_jittered(latency, jitter))
+
+
+def load_vision_fixtures(directory):
+    responses = []
+    for path in sorted(glob.glob(os.path.join(directory, "vision", "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            responses.append(vision.AnnotateFileResponse.from_json(f.read(), ignore_unknown_fields=True))
+    if not responses:
+        raise FileNotFoundError(f"No Vision fixtures in {os.path.join(directory, 'vision')}")
+    return responses
+
+
+class _NoTransport:
+    def close(self):
+        pass
+
+
+class FixtureVisionClient:
+    """
+    Stands in for vision.ImageAnnotatorClient. Each PDF is mapped to one
+    fixture by a hash of its bytes, and requested pages are sliced out of it.
+    """
+
+    def __init__(self, responses, latency=0.0, jitter=0.0):
+        self.responses = responses
+        self.latency = latency
+        self.jitter = jitter
+        self.transport = _NoTransport()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def batch_annotate_files(self, requests):
+        with self._lock:
+            self.calls += 1
+        _simulated_delay(self.latency, self.jitter)
+        return self._replay(requests)
+
+    def _replay(self, requests):
+        file_responses = []
+        for request in requests:
+            digest = hashlib.sha256(request.input_config.content).digest()
+            fixture = self.responses[int.from_bytes(digest[:4], 'big') % len(self.responses)]
+            pages = list(request.pages) or list(range(1, min(fixture.total_pages, 5) + 1))
+            file_responses.append(vision.AnnotateFileResponse(
+                total_pages=fixture.total_pages,
+                responses=[fixture.responses[page - 1] for page in pages if page <= len(fixture.responses)],
+            ))
+        return vision.BatchAnnotateFilesResponse(responses=file_responses)
+
+
+class _NoAsyncTransport:
+    async def close(self):
+        pass
+
+
+class AsyncFixtureVisionClient(FixtureVisionClient):
+    """Stands in for vision.ImageAnnotatorAsyncClient on the async core's loop."""
+
+    def __init__(self, responses, latency=0.0, jitter=0.0):
+        super().__init__(responses, latency, jitter)
+        self.transport = _NoAsyncTransport()
+
+    async def batch_annotate_files(self, requests, timeout=None):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            await asyncio.sleep(_jittered(self.latency, self.jitter))
+        return self._replay(requests)
+
+
+def load_openai_fixtures(directory):
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(directory, "openai", "*.json"))):
+        with open(path, 'rb') as f:
+            bodies.append(f.read())
+    if not bodies:
+        raise FileNotFoundError(f"No chat completion fixtures in {os.path.join(directory, 'openai')}")
+    return bodies
+
+
+class FakeOpenAIServer:
+    """A local /v1/chat/completions endpoint replaying fixture bodies round-robin."""
+
+    def __init__(self, bodies, latency=0.0, jitter=0.0, port=0):
+        self.bodies = itertools.cycle(bodies)
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                # Named so benchmarks can tell the fake upstream's threads from the app's
+                threading.current_thread().name = "fake-openai-request"
+                super().setup()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.calls += 1
+                    body = next(server.bodies)
+                _simulated_delay(server.latency, server.jitter)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# --- fixture generation ---
+SAMPLE_PAGES = [
+    [
+        ["CERTIFICATE OF LIABILITY INSURANCE", "DATE (MM/DD/YYYY) 01/15/2026"],
+        ["PRODUCER", "Acme Insurance Brokers LLC", "100 Main Street, Springfield, IL 62701"],
+        ["INSURED", "Northwind Property Holdings", "42 Elm Avenue, Springfield, IL 62704"],
+        ["INSURER A :", "Travelers Casualty and Surety Company", "NAIC # 19038"],
+        ["INSURER B :", "Hartford Fire Insurance Company", "NAIC # 19682"],
+        ["LTR", "TYPE OF INSURANCE", "POLICY NUMBER", "POLICY EFF", "POLICY EXP", "LIMITS"],
+        ["A", "COMMERCIAL GENERAL LIABILITY", "CGL-1234567", "01/01/2026", "01/01/2027", "EACH OCCURRENCE $1,000,000"],
+        ["", "CLAIMS-MADE X OCCUR", "", "", "", "DAMAGE TO RENTED PREMISES $300,000"],
+        ["", "", "", "", "", "MED EXP (Any one person) $10,000"],
+        ["", "", "", "", "", "PERSONAL & ADV INJURY $1,000,000"],
+        ["", "GEN'L AGGREGATE LIMIT APPLIES PER: POLICY", "", "", "", "GENERAL AGGREGATE $2,000,000"],
+        ["", "", "", "", "", "PRODUCTS - COMP/OP AGG $2,000,000"],
+        ["B", "AUTOMOBILE LIABILITY ANY AUTO", "BA-7654321", "01/01/2026", "01/01/2027", "COMBINED SINGLE LIMIT $1,000,000"],
+        ["A", "UMBRELLA LIAB X OCCUR", "UMB-5555555", "01/01/2026", "01/01/2027", "EACH OCCURRENCE $5,000,000"],
+        ["", "", "", "", "", "AGGREGATE $5,000,000"],
+    ],
+    [
+        ["B", "WORKERS COMPENSATION AND EMPLOYERS' LIABILITY", "WC-1122334", "01/01/2026", "01/01/2027",
+         "E.L. EACH ACCIDENT $1,000,000"],
+        ["", "", "", "", "", "E.L. DISEASE - EA EMPLOYEE $1,000,000"],
+        ["", "", "", "", "", "E.L. DISEASE - POLICY LIMIT $1,000,000"],
+        ["DESCRIPTION OF OPERATIONS / LOCATIONS / VEHICLES"],
+        ["Certificate holder is included as additional insured on the general liability policy where required by written contract."],
+        ["CERTIFICATE HOLDER", "Springfield Tenants Association", "7 Market Square, Springfield, IL 62701"],
+        ["CANCELLATION", "SHOULD ANY OF THE ABOVE DESCRIBED POLICIES BE CANCELLED BEFORE THE EXPIRATION DATE THEREOF, "
+                         "NOTICE WILL BE DELIVERED IN ACCORDANCE WITH THE POLICY PROVISIONS."],
+    ],
+]
+
+
+def _synthetic_page(rows, width=2550, height=3300):
+    """A Vision page laying out `rows` of cells as paragraphs at fixed column positions."""
+    blocks, text_lines = [], []
+    for row_index, cells in enumerate(rows):
+        y = 150 + row_index * 80
+        for column, cell in enumerate(cells):
+            if not cell:
+                continue
+            x = 100 + column * 400
+            words = []
+            for word in cell.split():
+                symbols = [{'text': ch} for ch in word]
+                symbols[-1]['property'] = {'detected_break': {'type_': 'SPACE'}}
+                words.append({'symbols': symbols})
+            box = {'vertices': [{'x': x, 'y': y}, {'x': x + 380, 'y': y}, {'x': x + 380, 'y': y + 40},
+                                {'x': x, 'y': y + 40}]}
+            blocks.append({'bounding_box': box, 'paragraphs': [{'bounding_box': box, 'words': words}]})
+        text_lines.append("  ".join(cell for cell in cells if cell))
+    text = "\n".join(text_lines) + "\n"
+    return vision.AnnotateImageResponse(full_text_annotation={
+        'text': text,
+        'pages': [{'width': width, 'height': height, 'blocks': blocks}],
+    })
+
+
+def sample_completion():
+    record = empty_record()
+    record['producer'] = {'name': "Acme Insurance Brokers LLC", 'address': "100 Main Street, Springfield, IL 62701"}
+    record['insured'] = {'name': "Northwind Property Holdings", 'address': "42 Elm Avenue, Springfield, IL 62704"}
+    gl = record['commercial_general_liability']
+    gl.update(name="Commercial General Liability", policy_number="CGL-1234567",
+              insurer_name="Travelers Casualty and Surety Company", claims_basis="Occur",
+              effective_date={'start': "01/01/2026", 'end': "01/01/2027"}, each_occurrence="$1,000,000",
+              general_aggregate_limit="$2,000,000", additional_insured="Y")
+    content = json.dumps(record, indent=4)
+    return {
+        'id': "chatcmpl-fixture", 'object': "chat.completion", 'created': 0, 'model': "gpt-4",
+        'choices': [{'index': 0, 'message': {'role': "assistant", 'content': content}, 'finish_reason': "stop"}],
+        'usage': {'prompt_tokens': 3200, 'completion_tokens': 900, 'total_tokens': 4100},
+    }
+
+
+def _vision_json(response):
+    return vision.AnnotateFileResponse.to_json(response, including_default_value_fields=False, indent=None)
+
+
+def write_fixture(directory, kind, name, text):
+    os.makedirs(os.path.join(directory, kind), exist_ok=True)
+    path = os.path.join(directory, kind, f"{name}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def write_sample(directory):
+    response = vision.AnnotateFileResponse(total_pages=len(SAMPLE_PAGES),
+                                           responses=[_synthetic_page(rows) for rows in SAMPLE_PAGES])
+    print(write_fixture(directory, "vision", "sample", _vision_json(response)))
+    print(write_fixture(directory, "openai", "sample", json.dumps(sample_completion(), indent=2)))
+
+
+def record(directory, pdf_paths):
+    """Call the live services for each PDF (needs credentials) and save their responses as fixtures."""
+    import openai
+
+    from modules.clients import get_vision_client
+    from modules.openai_module import MODEL
+    from modules.ocr_module import page_to_markdown
+    from modules.prompt_builder import build_prompt
+
+    client = get_vision_client()
+    for pdf_path in pdf_paths:
+        with open(pdf_path, 'rb') as f:
+            content = f.read()
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        input_config = vision.InputConfig(content=content, mime_type="application/pdf")
+        features = [vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
+        first = client.batch_annotate_files(requests=[vision.AnnotateFileRequest(
+            input_config=input_config, features=features)]).responses[0]
+        pages = list(first.responses)
+        for start in range(len(pages) + 1, first.total_pages + 1, 5):
+            more = client.batch_annotate_files(requests=[vision.AnnotateFileRequest(
+                input_config=input_config, features=features,
+                pages=list(range(start, min(start + 5, first.total_pages + 1))))]).responses[0]
+            pages.extend(more.responses)
+        response = vision.AnnotateFileResponse(total_pages=first.total_pages, responses=pages)
+        print(write_fixture(directory, "vision", name, _vision_json(response)))
+
+        markdown = "".join(
+            page_to_markdown(i + 1, {'text': page.full_text_annotation.text}) for i, page in enumerate(pages))
+        completion = openai.ChatCompletion.create(model=MODEL, temperature=0, messages=[
+            {"role": "system", "content": build_prompt()},
+            {"role": "user", "content": markdown},
+        ])
+        print(write_fixture(directory, "openai", name, json.dumps(completion.to_dict_recursive(), indent=2)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest='command', required=True)
+    sample = sub.add_parser('sample', help="write a synthetic certificate fixture")
+    sample.add_argument('directory')
+    rec = sub.add_parser('record', help="record live responses for PDFs")
+    rec.add_argument('directory')
+    rec.add_argument('pdfs', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'sample':
+        write_sample(args.directory)
+    else:
+        record(args.directory, args.pdfs)
+
+
+if __name__ == '__main__':
+    main()
@@ -72,11 +72,10 @@ echo ""
 echo "📋 Next steps:"
 echo "1. Edit .env file with your API keys"
 echo "2. Add Google Vision API credentials to config/google_ocr.json"
-echo "3. Run: python app.py"
+echo "3. Run: gunicorn -c gunicorn.conf.py wsgi:application (or python app.py for development)"
 echo "4. Access the application at http://localhost:5000"
 echo ""
 echo "🔧 For production deployment:"
-echo "- Use a WSGI server like Gunicorn"
 echo "- Set up a reverse proxy with Nginx"
 echo "- Configure SSL certificates"
 echo "- Set up monitoring and logging"
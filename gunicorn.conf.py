@@ -0,0 +1,51 @@
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Extraction is almost all waiting on Vision and OpenAI, so each worker runs a thread per
+# request (gthread) rather than a process per request. Jobs and their journal live in the
+# process that accepted the upload, so /jobs/<id> only works on that process: one worker per
+# instance (more are refused below); scale with GUNICORN_THREADS and JOB_WORKERS, or instances.
+import os
+import sys
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+if workers > 1:
+    # Each worker would replay and compact the one journal file as its own, and answer /jobs/<id>
+    # only for the jobs it accepted
+    sys.exit(f"❌ GUNICORN_WORKERS={workers}: jobs and the job journal are per process, so run one worker "
+             "and raise GUNICORN_THREADS and JOB_WORKERS, or run more instances")
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+# Seconds a worker may go without checking in before it is restarted (not a per-request limit)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Seconds after SIGTERM for in-flight requests and running extractions to finish
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "120"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Restart a worker after this many requests (0 never does); with jitter so they do not all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+# Import the app once in the arbiter, warm it and fork workers that share it
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ('1', 'true', 'yes', 'on')
+if preload_app:
+    os.environ["APP_PRELOAD"] = "1"
+
+
+def when_ready(server):
+    if preload_app:
+        sys.modules["app"].warm()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        sys.modules["app"].post_fork()
+
+
+def worker_exit(server, worker):
+    # Extractions kept running while requests drained; wait for them until about when the arbiter
+    # kills the worker. Whatever is left is re-run from the job journal on the next start.
+    coi_app = sys.modules.get("app")
+    if coi_app is not None:
+        coi_app.shutdown(timeout=max(graceful_timeout - 10, 1))
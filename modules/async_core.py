@@ -0,0 +1,253 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from modules import ocr_module, openai_module
+from modules.clients import (HTTP_KEEPALIVE_IDLE, VISION_HOST, openai_sdk, stats, vision_channel_options,
+                             vision_credentials_file, vision_sdk)
+from modules.metrics import OCR_PAGES
+from modules.ocr_engine import page_chunks
+from modules.rate_limiter import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight per upstream for the whole process, however many documents are being extracted.
+# 100 is what one gRPC connection multiplexes and aiohttp's default connection pool size.
+ASYNC_VISION_CONCURRENCY = int(os.getenv("ASYNC_VISION_CONCURRENCY", "100"))
+ASYNC_OPENAI_CONCURRENCY = int(os.getenv("ASYNC_OPENAI_CONCURRENCY", "100"))
+# Seconds per upstream request, and per stage: all of one document's OCR requests, or one model call,
+# including retries. A stage that runs out of time is cancelled and fails with UpstreamUnavailable.
+VISION_REQUEST_TIMEOUT = float(os.getenv("VISION_REQUEST_TIMEOUT", "60"))
+OPENAI_REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "180"))
+OCR_STAGE_TIMEOUT = float(os.getenv("OCR_STAGE_TIMEOUT", "300"))
+COMPLETION_STAGE_TIMEOUT = float(os.getenv("COMPLETION_STAGE_TIMEOUT", "600"))
+
+
+class AsyncCore:
+    """
+    Extraction I/O on one asyncio event loop.
+
+    Every document's Vision requests and model calls run as coroutines on a
+    loop thread owned by the core, sharing one gRPC channel and one aiohttp
+    session, so a document in flight costs a few coroutines rather than
+    threads. Per-upstream semaphores cap the requests in flight; the
+    upstream Schedulers, shared with the synchronous path, apply the rate
+    limits, retries and circuit breakers. `ocr()` and `complete()` are the
+    coroutine API and `to_thread()` runs the blocking steps around them
+    (disk, SQLite, parsing) in the loop's executor. Whole pipelines, such as
+    the upload jobs of a JobQueue with this core as its runner, are scheduled
+    with `submit()`; threads that only need one call use `run()` or the
+    module-level `run_ocr()` and `chat_completion()`, drop-ins for the
+    synchronous functions.
+    """
+
+    def __init__(self, vision_concurrency=ASYNC_VISION_CONCURRENCY, openai_concurrency=ASYNC_OPENAI_CONCURRENCY):
+        self.vision_concurrency = vision_concurrency
+        self.openai_concurrency = openai_concurrency
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._vision_limit = None
+        self._openai_limit = None
+        self._vision = None
+        # Requests in flight per Vision client, so a client replaced after an error is closed once idle
+        self._vision_calls = Counter()
+        self._http = None
+
+    # --- calling in from threads and other loops ---
+    def submit(self, coro):
+        """Schedule `coro` on the core's loop; returns a concurrent.futures.Future (asyncio.wrap_future to await it)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def run(self, coro):
+        """Run `coro` on the core's loop and block the calling thread until it is done."""
+        return self.submit(coro).result()
+
+    async def to_thread(self, fn, *args):
+        """Run blocking `fn(*args)` in the loop's executor, keeping the caller's context (trace ID, lane)."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(context.run, fn, *args))
+
+    def close(self):
+        """Close the Vision channel and HTTP session and stop the loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+    # --- OCR ---
+    async def ocr(self, pdf_content):
+        """OCR a PDF to markdown: the first pages, then the rest concurrently, within OCR_STAGE_TIMEOUT."""
+        try:
+            return await asyncio.wait_for(self._ocr(pdf_content), OCR_STAGE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise UpstreamUnavailable("vision", f"❌ OCR did not finish within {OCR_STAGE_TIMEOUT:g}s") from None
+
+    async def _ocr(self, pdf_content):
+        total_pages, first = await self._annotate(pdf_content, None)
+        chunks = page_chunks(len(first), total_pages, ocr_module.OCR_CHUNK_PAGES)
+        tasks = [asyncio.ensure_future(self._annotate(pdf_content, chunk)) for chunk in chunks]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # One chunk failed or the stage was cancelled: stop the others too
+            for task in tasks:
+                task.cancel()
+            raise
+        annotations = first + [annotation for _, chunk_annotations in results for annotation in chunk_annotations]
+        OCR_PAGES.observe(len(annotations))
+        return await self.to_thread(_to_markdown, annotations)
+
+    async def _annotate(self, pdf_content, pages):
+        async with self._vision_limit:
+            response = await ocr_module.scheduler.acall(self._batch_annotate,
+                                                        ocr_module.annotate_request(pdf_content, pages))
+        # Unpacking the layout takes tens of ms a response; off the loop, so it does not hold up other I/O
+        return await self.to_thread(ocr_module.file_annotations, response)
+
+    async def _batch_annotate(self, request):
+        from google.api_core import exceptions as google_exceptions
+        client = self._vision_client()
+        self._vision_calls[client] += 1
+        try:
+            return await client.batch_annotate_files(requests=[request], timeout=VISION_REQUEST_TIMEOUT)
+        except google_exceptions.ServiceUnavailable:
+            # The channel may be wedged: new calls, including the scheduler's retry, get a new one
+            if self._vision is client:
+                self._vision = None
+            raise
+        finally:
+            self._vision_calls[client] -= 1
+            if client is not self._vision and not self._vision_calls[client]:
+                # Closed only once the other requests still on it have finished
+                del self._vision_calls[client]
+                await client.transport.close()
+
+    def _vision_client(self):
+        if self._vision is None:
+            from google.cloud.vision_v1.services.image_annotator.transports.grpc_asyncio import (
+                ImageAnnotatorGrpcAsyncIOTransport)
+
+            start = time.perf_counter()
+            channel = ImageAnnotatorGrpcAsyncIOTransport.create_channel(
+                VISION_HOST, credentials_file=vision_credentials_file(), options=vision_channel_options())
+            transport = ImageAnnotatorGrpcAsyncIOTransport(host=VISION_HOST, channel=channel)
+            self._vision = vision_sdk().ImageAnnotatorAsyncClient(transport=transport)
+            stats.record_setup('vision_async', time.perf_counter() - start)
+        stats.record_call('vision_async')
+        return self._vision
+
+    # --- OpenAI ---
+    async def complete(self, system_prompt, user_input):
+        """One extraction call within COMPLETION_STAGE_TIMEOUT; returns `(content, usage)` like chat_completion."""
+        try:
+            return await asyncio.wait_for(self._complete(system_prompt, user_input), COMPLETION_STAGE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise UpstreamUnavailable("openai", f"❌ The model did not answer within {COMPLETION_STAGE_TIMEOUT:g}s") \
+                from None
+
+    async def _complete(self, system_prompt, user_input):
+        estimate = openai_module.estimate_tokens(system_prompt, user_input)
+        async with self._openai_limit:
+            response = await openai_module.scheduler.acall(self._acreate, system_prompt, user_input, tokens=estimate)
+        usage = openai_module.record_usage(estimate, response)
+        return response['choices'][0]['message']['content'], usage
+
+    async def _acreate(self, system_prompt, user_input):
+        args = openai_module.completion_args(system_prompt, user_input)
+        openai = openai_sdk()
+        # openai reads the session from a context variable, set here for this task
+        openai.aiosession.set(self._http_session())
+        stats.record_call('openai_async')
+        return await openai.ChatCompletion.acreate(**args, request_timeout=OPENAI_REQUEST_TIMEOUT)
+
+    def _http_session(self):
+        if self._http is None:
+            import aiohttp
+
+            async def connection_started(session, context, params):
+                context.start = time.perf_counter()
+
+            async def connection_created(session, context, params):
+                stats.record_setup('openai_async', time.perf_counter() - context.start)
+
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_start.append(connection_started)
+            trace.on_connection_create_end.append(connection_created)
+            connector = aiohttp.TCPConnector(limit=self.openai_concurrency, keepalive_timeout=HTTP_KEEPALIVE_IDLE)
+            self._http = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+        return self._http
+
+    # --- internals ---
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="async-core", daemon=True)
+                self._thread.start()
+                # Semaphores belong to the loop they are used on, so they are created on it
+                asyncio.run_coroutine_threadsafe(self._create_limits(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _create_limits(self):
+        self._vision_limit = asyncio.Semaphore(self.vision_concurrency)
+        self._openai_limit = asyncio.Semaphore(self.openai_concurrency)
+
+    async def _close_clients(self):
+        vision_clients = set(self._vision_calls)
+        if self._vision is not None:
+            vision_clients.add(self._vision)
+        self._vision, self._vision_calls = None, Counter()
+        http, self._http = self._http, None
+        for client in vision_clients:
+            await client.transport.close()
+        if http is not None:
+            await http.close()
+
+
+def _to_markdown(annotations):
+    return "".join(ocr_module.page_to_markdown(number, annotation)
+                   for number, annotation in enumerate(annotations, start=1))
+
+
+_core = None
+_core_lock = threading.Lock()
+
+
+def get_core():
+    """The process-wide core; its loop thread starts on first use, so a preloading parent never runs it."""
+    global _core
+    with _core_lock:
+        if _core is None:
+            _core = AsyncCore()
+        return _core
+
+
+def shutdown():
+    with _core_lock:
+        core = _core
+    if core is not None:
+        core.close()
+
+
+def run_ocr(pdf_content: bytes) -> str:
+    """ocr_module.run_ocr on the async core."""
+    core = get_core()
+    return core.run(core.ocr(pdf_content))
+
+
+def chat_completion(system_prompt: str, user_input: str):
+    """openai_module.chat_completion on the async core."""
+    core = get_core()
+    return core.run(core.complete(system_prompt, user_input))
+
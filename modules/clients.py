@@ -0,0 +1,187 @@
+import functools
+import os
+import socket
+import threading
+import time
+
+VISION_HOST = "vision.googleapis.com:443"
+# Service account key for Vision. Passed to the client rather than exported, so nothing else in the
+# process picks it up; when the file does not exist Application Default Credentials are used.
+VISION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "config", "google_ocr.json")
+VISION_KEEPALIVE_MS = int(os.getenv("VISION_KEEPALIVE_MS", "30000"))
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "16"))
+HTTP_KEEPALIVE_IDLE = int(os.getenv("HTTP_KEEPALIVE_IDLE", "60"))
+
+
+class ConnectionStats:
+    """Counts calls and the time spent creating clients / connections per upstream."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record_setup(self, name, seconds):
+        with self._lock:
+            entry = self._entry(name)
+            entry['setups'] += 1
+            entry['setup_seconds'] += seconds
+
+    def record_call(self, name):
+        with self._lock:
+            self._entry(name)['calls'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for name, entry in self._stats.items():
+                avg_setup = entry['setup_seconds'] / entry['setups'] if entry['setups'] else 0.0
+                result[name] = dict(
+                    entry,
+                    setup_seconds=round(entry['setup_seconds'], 4),
+                    avg_setup_seconds=round(avg_setup, 4),
+                    # What the calls that reused a connection would have paid without reuse
+                    saved_seconds_estimate=round(max(entry['calls'] - entry['setups'], 0) * avg_setup, 4),
+                )
+            return result
+
+    def _entry(self, name):
+        return self._stats.setdefault(name, {'calls': 0, 'setups': 0, 'setup_seconds': 0.0})
+
+
+stats = ConnectionStats()
+
+_lock = threading.Lock()
+_vision_client = None
+_openai_session = None
+
+
+# The Vision and OpenAI SDKs are most of the app's import time, so they are imported on first use
+def vision_sdk():
+    from google.cloud import vision
+    return vision
+
+
+def openai_sdk():
+    import openai
+    return openai
+
+
+def check_config():
+    """Configuration problems of the upstream clients, as messages."""
+    if os.getenv("GOOGLE_APPLICATION_CREDENTIALS") and not os.path.exists(VISION_CREDENTIALS):
+        return [f"❌ Google credentials file not found: {VISION_CREDENTIALS} (GOOGLE_APPLICATION_CREDENTIALS)"]
+    return []
+
+
+# --- Google Vision ---
+def vision_credentials_file():
+    return VISION_CREDENTIALS if os.path.exists(VISION_CREDENTIALS) else None
+
+
+def vision_channel_options():
+    return [
+        ('grpc.keepalive_time_ms', VISION_KEEPALIVE_MS),
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.max_pings_without_data', 0),
+    ]
+
+
+def get_vision_client():
+    """The process-wide Vision client; its gRPC channel is shared by all threads."""
+    global _vision_client
+    with _lock:
+        if _vision_client is None:
+            from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcTransport
+
+            start = time.perf_counter()
+            channel = ImageAnnotatorGrpcTransport.create_channel(
+                VISION_HOST, credentials_file=vision_credentials_file(), options=vision_channel_options())
+            transport = ImageAnnotatorGrpcTransport(host=VISION_HOST, channel=channel)
+            _vision_client = vision_sdk().ImageAnnotatorClient(transport=transport)
+            stats.record_setup('vision', time.perf_counter() - start)
+        stats.record_call('vision')
+        return _vision_client
+
+
+def reset_vision_client():
+    """Drop the Vision client so the next call builds a fresh channel (e.g. after UNAVAILABLE)."""
+    global _vision_client
+    with _lock:
+        client, _vision_client = _vision_client, None
+    if client is not None:
+        client.transport.close()
+
+
+# --- OpenAI ---
+@functools.lru_cache(maxsize=None)
+def _http_classes():
+    """
+    `(session_class, adapter_class)` for the shared OpenAI session, defined on
+    first use: requests and urllib3 add about 100 ms to the app's import.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPSConnection
+    from urllib3.connectionpool import HTTPSConnectionPool
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.record_setup('openai', time.perf_counter() - start)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    class KeepAliveAdapter(HTTPAdapter):
+        """Pooled adapter with TCP keep-alive that records TCP+TLS setup time per new connection."""
+
+        def init_poolmanager(self, *args, **kwargs):
+            socket_options = [(socket.SOL_TCP, socket.TCP_NODELAY, 1), (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, HTTP_KEEPALIVE_IDLE))
+            kwargs['socket_options'] = socket_options
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = dict(self.poolmanager.pool_classes_by_scheme,
+                                                            https=TimedHTTPSConnectionPool)
+
+    class SharedSession(requests.Session):
+        """
+        openai 0.28 closes its per-thread session every few minutes; for a session
+        shared by all threads that would tear down every pooled connection, so
+        close() is a no-op and `shutdown()` does the real close.
+        """
+
+        def close(self):
+            pass
+
+        def shutdown(self):
+            super().close()
+
+    return SharedSession, KeepAliveAdapter
+
+
+def get_openai_session():
+    """Install (once) and return the pooled HTTP session openai uses for every thread."""
+    global _openai_session
+    with _lock:
+        if _openai_session is None:
+            session_class, adapter_class = _http_classes()
+            session = session_class()
+            adapter = adapter_class(pool_connections=1, pool_maxsize=OPENAI_POOL_SIZE)
+            session.mount("https://", adapter)
+            openai_sdk().requestssession = session
+            _openai_session = session
+        stats.record_call('openai')
+        return _openai_session
+
+
+def reset_openai_session():
+    global _openai_session
+    with _lock:
+        session, _openai_session = _openai_session, None
+        if session is not None:
+            openai_sdk().requestssession = None
+    if session is not None:
+        session.shutdown()
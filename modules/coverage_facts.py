@@ -0,0 +1,91 @@
+import re
+from datetime import date, datetime
+
+from modules.prompt_builder import COI_SCHEMA, DATE_RANGE_FIELDS, MONEY_FIELDS
+
+# Date layouts seen on ACORD certificates; numeric dates are US month-first
+DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%m-%d-%Y", "%m-%d-%y", "%m.%d.%Y",
+                "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y")
+
+_DATE_RE = re.compile(r"\d{1,4}[/.-]\d{1,2}[/.-]\d{2,4}|[A-Za-z]{3,9}\.? \d{1,2},? \d{4}|\d{1,2} [A-Za-z]{3,9}\.? \d{4}")
+_MONEY_RE = re.compile(r"\$?\s*(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?\s*(k|m|mm|mil|million|thousand)?\b",
+                       re.IGNORECASE)
+_MULTIPLIERS = {'k': 1_000, 'thousand': 1_000, 'm': 1_000_000, 'mm': 1_000_000, 'mil': 1_000_000,
+                'million': 1_000_000}
+
+
+def parse_date(text):
+    """The first date in `text` as a `date`, or None."""
+    if not isinstance(text, str):
+        return None
+    for candidate in _DATE_RE.findall(text):
+        candidate = candidate.replace(".", "") if not candidate[0].isdigit() else candidate
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_money(text):
+    """
+    The first dollar amount in `text` as a whole number of dollars, or None:
+    "$1,000,000", "1000000.00", "$1M", "2 MILLION" and "$500K" are understood.
+    """
+    if not isinstance(text, str):
+        return None
+    match = _MONEY_RE.search(text)
+    if match is None:
+        return None
+    amount = int(match.group(1).replace(",", ""))
+    suffix = (match.group(3) or "").lower()
+    if suffix:
+        fraction = match.group(2) or ""
+        return int((amount + (int(fraction) / 10 ** len(fraction) if fraction else 0)) * _MULTIPLIERS[suffix])
+    return amount
+
+
+def coverage_facts(record):
+    """
+    Typed facts of an extracted record: `(coverages, limits)`.
+
+    `coverages` has one row per coverage section with a policy number, insurer
+    or effective date (`section, policy_number, insurer, start_date, end_date`,
+    dates as ISO strings); `limits` one row per parsed dollar amount
+    (`section, field, amount`). Values that do not parse are left out.
+    """
+    coverages, limits = [], []
+    for section, fields in COI_SCHEMA.items():
+        values = record.get(section)
+        if fields is None or not isinstance(values, dict):
+            continue
+        start = end = None
+        for field in DATE_RANGE_FIELDS.intersection(fields):
+            effective = values.get(field)
+            if isinstance(effective, dict):
+                start, end = parse_date(effective.get('start')), parse_date(effective.get('end'))
+        for field in MONEY_FIELDS.intersection(fields):
+            amount = parse_money(values.get(field))
+            if amount is not None:
+                limits.append({'section': section, 'field': field, 'amount': amount})
+        policy_number = _text(values.get('policy_number'))
+        insurer = _text(values.get('insurer_name')) or _text(values.get('insurer'))
+        if policy_number or insurer or start or end:
+            coverages.append({
+                'section': section,
+                'policy_number': policy_number,
+                'insurer': insurer,
+                'start_date': start.isoformat() if start else None,
+                'end_date': end.isoformat() if end else None,
+            })
+    return coverages, limits
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def days_until(end_date, as_of=None):
+    """Days from `as_of` (today) to an ISO `end_date`; negative once it has passed."""
+    return (date.fromisoformat(end_date) - (as_of or date.today())).days
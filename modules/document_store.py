@@ -0,0 +1,529 @@
+import abc
+import base64
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from modules.coverage_facts import coverage_facts
+from modules.metrics import DB_WRITE_SECONDS
+from modules.storage import fsync_directory
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_FIELDS = (
+    'filename',
+    'custom_name',
+    'external_id',
+    'tenant_code',
+    'property_no',
+    'action',
+    'upload_date',
+    'status',
+)
+
+# Fields /get_documents can filter on. Each gets a (field, upload_date, filename) index so a
+# filtered page is an index range scan already in the dashboard's newest-first order.
+FILTER_FIELDS = ('status', 'tenant_code', 'property_no', 'external_id')
+
+
+class DocumentStore(abc.ABC):
+    """Interface for document metadata backends. Records are plain dicts keyed by DOCUMENT_FIELDS."""
+
+    def add(self, doc):
+        """Insert a document, replacing any existing record with the same filename."""
+        self.add_many([doc])
+
+    @abc.abstractmethod
+    def add_many(self, docs):
+        """Insert documents in one transaction, replacing records with the same filenames."""
+
+    @abc.abstractmethod
+    def get(self, filename):
+        """The document stored under `filename`, or None."""
+
+    @abc.abstractmethod
+    def update_status(self, filename, status):
+        """Set the status of a document; returns False when it does not exist."""
+
+    @abc.abstractmethod
+    def delete(self, filename):
+        """Remove a document; returns False when it does not exist."""
+
+    @abc.abstractmethod
+    def list(self):
+        """All documents, newest upload first."""
+
+    @abc.abstractmethod
+    def query(self, filters=None, date_from=None, date_to=None, limit=50, cursor=None, fields=None):
+        """
+        One page of documents, newest upload first. A bare `date_to` date
+        includes uploads made during that day.
+
+        Returns `(documents, next_cursor)`; pass `next_cursor` back to fetch the
+        following page, it is None on the last page.
+        """
+
+    @abc.abstractmethod
+    def status_counts(self):
+        """Number of documents per status."""
+
+    @abc.abstractmethod
+    def revision(self):
+        """A number that changes whenever any document changes, for ETags."""
+
+    @abc.abstractmethod
+    def add_edit(self, filename, version_from, version_to, patch):
+        """Record one edit of a document's JSON; `patch` is the merge patch that was applied."""
+
+    @abc.abstractmethod
+    def edit_history(self, filename, limit=50):
+        """The most recent edits of a document, newest first."""
+
+    @abc.abstractmethod
+    def filenames(self):
+        """The set of every stored document's filename."""
+
+    @abc.abstractmethod
+    def set_coverage(self, filename, coverages, limits):
+        """Replace a document's typed coverage facts (see coverage_facts.coverage_facts)."""
+
+    @abc.abstractmethod
+    def coverage_filenames(self):
+        """Filenames whose coverage facts have been recorded."""
+
+    @abc.abstractmethod
+    def expiring(self, date_from, date_to, section=None, limit=500):
+        """Coverages whose policy ends between two ISO dates (either may be None), soonest first."""
+
+    @abc.abstractmethod
+    def below_limit(self, section, field, threshold, include_missing=False, limit=500):
+        """Coverages of `section` whose `field` amount is under `threshold` (or unknown), lowest first."""
+
+    @abc.abstractmethod
+    def coverage_summary(self, as_of, windows):
+        """Per section: policies, expired, expiring within each window of days, and without an end date."""
+
+    def checkpoint(self):
+        """Flush pending writes into the main store so recovery has little to replay."""
+
+    def snapshot(self):
+        """Write a consistent copy of the store that recovery can start from."""
+
+    def close(self):
+        """Release the calling thread's resources, e.g. before the process forks."""
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """
+    Document metadata in an embedded SQLite database.
+
+    WAL mode lets readers run alongside a writer, and every mutation is a
+    single transaction, so concurrent requests can no longer clobber each
+    other the way the read-modify-write of documents.json did. Each thread
+    gets its own connection.
+    """
+
+    def __init__(self, path, history_limit=100):
+        self.path = path
+        self.history_limit = history_limit
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{field} TEXT" for field in DOCUMENT_FIELDS if field != 'filename')
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS documents (filename TEXT PRIMARY KEY, {columns})")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents (upload_date, filename)")
+            for field in FILTER_FIELDS:
+                # Replace the single-column indexes created by earlier versions
+                conn.execute(f"DROP INDEX IF EXISTS idx_documents_{field}")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{field}_date "
+                             f"ON documents ({field}, upload_date, filename)")
+
+            conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('revision', 0)")
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS documents_revision_{event.lower()} "
+                             f"AFTER {event} ON documents BEGIN "
+                             f"UPDATE store_meta SET value = value + 1 WHERE key = 'revision'; END")
+
+            conn.execute("CREATE TABLE IF NOT EXISTS edit_history (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "filename TEXT NOT NULL, edited_at TEXT NOT NULL, version_from TEXT, "
+                         "version_to TEXT, patch TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_edit_history_filename ON edit_history (filename, id)")
+
+            # Typed facts normalised from the extracted JSON, so analytics never open the files
+            conn.execute("CREATE TABLE IF NOT EXISTS coverage_docs (filename TEXT PRIMARY KEY, indexed_at TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS coverages (filename TEXT NOT NULL, section TEXT NOT NULL, "
+                         "policy_number TEXT, insurer TEXT, start_date TEXT, end_date TEXT, "
+                         "PRIMARY KEY (filename, section))")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_coverages_end_date ON coverages (end_date, section)")
+            conn.execute("CREATE TABLE IF NOT EXISTS coverage_limits (filename TEXT NOT NULL, section TEXT NOT NULL, "
+                         "field TEXT NOT NULL, amount INTEGER NOT NULL, PRIMARY KEY (filename, section, field))")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_coverage_limits_amount ON coverage_limits (section, field, amount)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self, op):
+        """A write transaction, timed into coi_db_write_seconds."""
+        conn = self._connect()
+        with DB_WRITE_SECONDS.time(op=op), conn:
+            yield conn
+
+    def add_many(self, docs):
+        placeholders = ", ".join("?" for _ in DOCUMENT_FIELDS)
+        updates = ", ".join(f"{field}=excluded.{field}" for field in DOCUMENT_FIELDS if field != 'filename')
+        rows = [tuple(doc.get(field) for field in DOCUMENT_FIELDS) for doc in docs]
+        with self._write('add') as conn:
+            conn.executemany(
+                f"INSERT INTO documents ({', '.join(DOCUMENT_FIELDS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(filename) DO UPDATE SET {updates}",
+                rows,
+            )
+
+    def get(self, filename):
+        row = self._connect().execute("SELECT * FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def update_status(self, filename, status):
+        with self._write('update_status') as conn:
+            cursor = conn.execute("UPDATE documents SET status = ? WHERE filename = ?", (status, filename))
+        return cursor.rowcount > 0
+
+    def delete(self, filename):
+        with self._write('delete') as conn:
+            cursor = conn.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            conn.execute("DELETE FROM edit_history WHERE filename = ?", (filename,))
+            self._delete_coverage(conn, filename)
+        return cursor.rowcount > 0
+
+    def list(self):
+        rows = self._connect().execute("SELECT * FROM documents ORDER BY upload_date DESC, filename DESC")
+        return [dict(row) for row in rows]
+
+    def query(self, filters=None, date_from=None, date_to=None, limit=50, cursor=None, fields=None):
+        clauses, params = [], []
+        for field, value in (filters or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on {field}")
+            clauses.append(f"{field} = ?")
+            params.append(value)
+        if date_from:
+            clauses.append("upload_date >= ?")
+            params.append(date_from)
+        if date_to and len(date_to) == len("YYYY-MM-DD"):
+            clauses.append("upload_date < ?")
+            params.append(_end_of_day(date_to))
+        elif date_to:
+            clauses.append("upload_date <= ?")
+            params.append(date_to)
+        if cursor:
+            upload_date, filename = decode_cursor(cursor)
+            clauses.append("(upload_date < ? OR (upload_date = ? AND filename < ?))")
+            params.extend([upload_date, upload_date, filename])
+
+        fields = list(fields or DOCUMENT_FIELDS)
+        unknown = set(fields) - set(DOCUMENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        # The cursor needs the sort key even when the caller did not ask for it
+        columns = fields + [c for c in ('upload_date', 'filename') if c not in fields]
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(columns)} FROM documents {where} "
+            f"ORDER BY upload_date DESC, filename DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['upload_date'], rows[-1]['filename'])
+        return [{field: row[field] for field in fields} for row in rows], next_cursor
+
+    def status_counts(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM documents GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def revision(self):
+        return self._connect().execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()[0]
+
+    def add_edit(self, filename, version_from, version_to, patch):
+        with self._write('add_edit') as conn:
+            conn.execute(
+                "INSERT INTO edit_history (filename, edited_at, version_from, version_to, patch) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (filename, datetime.utcnow().isoformat(), version_from, version_to,
+                 json.dumps(patch, separators=(',', ':'))),
+            )
+            # Keep only the newest history_limit edits of the document
+            conn.execute(
+                "DELETE FROM edit_history WHERE filename = ? AND id NOT IN "
+                "(SELECT id FROM edit_history WHERE filename = ? ORDER BY id DESC LIMIT ?)",
+                (filename, filename, self.history_limit),
+            )
+
+    def edit_history(self, filename, limit=50):
+        rows = self._connect().execute(
+            "SELECT edited_at, version_from, version_to, patch FROM edit_history "
+            "WHERE filename = ? ORDER BY id DESC LIMIT ?",
+            (filename, limit),
+        )
+        return [dict(row, patch=json.loads(row['patch'])) for row in rows]
+
+    def filenames(self):
+        return {row[0] for row in self._connect().execute("SELECT filename FROM documents")}
+
+    def set_coverage(self, filename, coverages, limits):
+        with self._write('set_coverage') as conn:
+            self._delete_coverage(conn, filename)
+            conn.execute("INSERT INTO coverage_docs (filename, indexed_at) VALUES (?, ?)",
+                         (filename, datetime.utcnow().isoformat()))
+            conn.executemany(
+                "INSERT INTO coverages (filename, section, policy_number, insurer, start_date, end_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(filename, c['section'], c['policy_number'], c['insurer'], c['start_date'], c['end_date'])
+                 for c in coverages],
+            )
+            conn.executemany(
+                "INSERT INTO coverage_limits (filename, section, field, amount) VALUES (?, ?, ?, ?)",
+                [(filename, l['section'], l['field'], l['amount']) for l in limits],
+            )
+
+    @staticmethod
+    def _delete_coverage(conn, filename):
+        for table in ('coverage_docs', 'coverages', 'coverage_limits'):
+            conn.execute(f"DELETE FROM {table} WHERE filename = ?", (filename,))
+
+    def coverage_filenames(self):
+        return {row[0] for row in self._connect().execute("SELECT filename FROM coverage_docs")}
+
+    def expiring(self, date_from, date_to, section=None, limit=500):
+        clauses, params = ["c.end_date IS NOT NULL"], []
+        if date_from:
+            clauses.append("c.end_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("c.end_date <= ?")
+            params.append(date_to)
+        if section:
+            clauses.append("c.section = ?")
+            params.append(section)
+        rows = self._connect().execute(
+            f"SELECT c.*, {_DOCUMENT_COLUMNS} FROM coverages c LEFT JOIN documents d ON d.filename = c.filename "
+            f"WHERE {' AND '.join(clauses)} ORDER BY c.end_date, c.filename LIMIT ?",
+            params + [limit],
+        )
+        return [dict(row) for row in rows]
+
+    def below_limit(self, section, field, threshold, include_missing=False, limit=500):
+        condition = "(l.amount < ? OR l.amount IS NULL)" if include_missing else "l.amount < ?"
+        rows = self._connect().execute(
+            f"SELECT c.*, l.amount, {_DOCUMENT_COLUMNS} FROM coverages c "
+            f"LEFT JOIN coverage_limits l ON l.filename = c.filename AND l.section = c.section AND l.field = ? "
+            f"LEFT JOIN documents d ON d.filename = c.filename "
+            f"WHERE c.section = ? AND {condition} ORDER BY l.amount, c.filename LIMIT ?",
+            (field, section, threshold, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def coverage_summary(self, as_of, windows):
+        windows = sorted(set(windows))
+        if any(not isinstance(days, int) or days < 0 for days in windows):
+            raise ValueError("❌ Expiry windows must be whole numbers of days, 0 or more")
+        # Window lengths are bound; the column aliases are built from the validated ints
+        cases = "".join(
+            f", SUM(end_date >= :as_of AND julianday(end_date) - julianday(:as_of) <= :window_{i}) AS expiring_{days}"
+            for i, days in enumerate(windows)
+        )
+        params = dict({f'window_{i}': days for i, days in enumerate(windows)}, as_of=as_of)
+        rows = self._connect().execute(
+            f"SELECT section, COUNT(*) AS policies, SUM(end_date < :as_of) AS expired{cases}, "
+            f"SUM(end_date IS NULL) AS no_end_date FROM coverages GROUP BY section ORDER BY section",
+            params,
+        )
+        return [dict(row) for row in rows]
+
+    @property
+    def snapshot_path(self):
+        return self.path + ".snapshot"
+
+    def checkpoint(self):
+        """
+        Copy the WAL back into the database file and truncate it. The WAL is
+        what SQLite replays after a crash, so keeping it short keeps recovery
+        time flat however long the process has been running.
+        """
+        busy, _, _ = self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return not busy
+
+    def snapshot(self):
+        """Back the database up to `<path>.snapshot` with the online backup API, atomically replacing the old one."""
+        # Per process: every worker runs its own snapshot task against the same database
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        target = sqlite3.connect(tmp_path)
+        try:
+            self._connect().backup(target)
+        finally:
+            target.close()
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        fsync_directory(os.path.dirname(os.path.abspath(self.snapshot_path)))
+
+    def integrity_ok(self):
+        return self._connect().execute("PRAGMA quick_check").fetchone()[0] == "ok"
+
+    def close(self):
+        """Close the calling thread's connection; SQLite connections must not be carried across fork()."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+
+_DOCUMENT_COLUMNS = "d.custom_name, d.tenant_code, d.property_no, d.status"
+
+
+def _end_of_day(day):
+    """The first ISO timestamp after a bare `YYYY-MM-DD` date, so the whole day is included."""
+    try:
+        return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    except ValueError:
+        raise ValueError(f"❌ date_to must be YYYY-MM-DD or an ISO timestamp, got {day!r}") from None
+
+
+def encode_cursor(upload_date, filename):
+    raw = json.dumps([upload_date, filename]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        upload_date, filename = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return upload_date, filename
+
+
+def open_document_store(url):
+    """
+    Open a store from a URL. Like SQLAlchemy, `sqlite:///documents.db` is a
+    relative path and `sqlite:////var/lib/coi/documents.db` an absolute one.
+    """
+    scheme, _, location = url.partition("://")
+    if scheme == "sqlite":
+        return open_sqlite_store(location[1:])
+    raise ValueError(f"❌ Unsupported document store: {url}")
+
+
+def open_sqlite_store(path):
+    """
+    Open a SQLite store, falling back to its last snapshot when the database
+    is corrupt. The damaged file is kept as `<path>.corrupt` for inspection;
+    changes since the snapshot are recovered by `reconcile_with_directory`.
+    """
+    try:
+        store = SQLiteDocumentStore(path)
+        if store.integrity_ok():
+            return store
+    except sqlite3.DatabaseError:
+        logger.exception("Document store %s could not be opened", path)
+    snapshot_path = path + ".snapshot"
+    if not os.path.exists(snapshot_path):
+        raise RuntimeError(f"❌ Document store {path} is corrupt and there is no snapshot to restore")
+    logger.error("Document store %s is corrupt; restoring %s", path, snapshot_path)
+    os.replace(path, path + ".corrupt")
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    tmp_path = path + ".restore"
+    shutil.copyfile(snapshot_path, tmp_path)
+    os.replace(tmp_path, path)
+    return SQLiteDocumentStore(path)
+
+
+def reconcile_with_directory(store, json_dir):
+    """
+    Bring the index back in line with the extracted JSON files, which are the
+    source of truth: files without a row are registered (dated by their mtime)
+    and rows whose file is gone are removed. Coverage facts missing for a
+    file are backfilled. Returns `(added, removed)`.
+    """
+    on_disk = {name for name in os.listdir(json_dir) if name.endswith(".json")}
+    indexed = store.filenames()
+
+    added = sorted(on_disk - indexed)
+    store.add_many([
+        {
+            'filename': name,
+            'upload_date': datetime.utcfromtimestamp(os.path.getmtime(os.path.join(json_dir, name))).isoformat(),
+            'status': 'uploaded',
+        }
+        for name in added
+    ])
+    removed = sorted(indexed - on_disk)
+    for name in removed:
+        store.delete(name)
+    if added or removed:
+        logger.warning("Reconciled document store with %s: %d added, %d removed", json_dir, len(added), len(removed))
+
+    # Backfill coverage facts for documents written before they were recorded
+    for name in sorted(on_disk - store.coverage_filenames()):
+        try:
+            with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Cannot read %s for coverage facts", name)
+            continue
+        if isinstance(record, dict):
+            store.set_coverage(name, *coverage_facts(record))
+    return added, removed
+
+
+def migrate_json_db(json_path, store):
+    """
+    One-shot import of a legacy documents.json into `store`.
+
+    The JSON file is renamed to `<name>.migrated` afterwards so the import is
+    never repeated. A file that is not a JSON list of records is left in
+    place and nothing is imported, so it can be repaired and migrated on the
+    next start. Returns the number of imported records.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, 'r', encoding='utf-8') as f:
+        try:
+            documents = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error("Not migrating %s: it is not valid JSON (%s)", json_path, e)
+            return 0
+    if not isinstance(documents, list) or not all(isinstance(doc, dict) for doc in documents):
+        logger.error("Not migrating %s: expected a JSON list of document records", json_path)
+        return 0
+    store.add_many([doc for doc in documents if doc.get('filename')])
+    os.replace(json_path, json_path + ".migrated")
+    return len(documents)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m modules.document_store <documents.json> <documents.db>")
+    count = migrate_json_db(sys.argv[1], SQLiteDocumentStore(sys.argv[2]))
+    if os.path.exists(sys.argv[1]):
+        sys.exit(f"❌ {sys.argv[1]} was not migrated, see the log above")
+    print(f"Imported {count} document(s) into {sys.argv[2]}")
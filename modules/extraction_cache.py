@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from modules.metrics import CACHE_REQUESTS
+
+OCR_TIER = "ocr"
+JSON_TIER = "json"
+PDF_TIER = "pdf"
+TIERS = (OCR_TIER, JSON_TIER, PDF_TIER)
+
+
+def sha256_hex(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def json_key(pdf_hash: str, prompt: str, model: str) -> str:
+    """Cache key for an extraction: same PDF, same prompt text and same model."""
+    return sha256_hex(f"{pdf_hash}:{sha256_hex(prompt)}:{model}")
+
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk cache for OCR markdown, extracted JSON and
+    rendered PDFs.
+
+    Entries live in one file per key under `<root>/<tier>/`. An in-memory LRU
+    index tracks sizes and write times so eviction never has to walk the disk;
+    it is rebuilt from the directory listing on start.
+    """
+
+    def __init__(self, root, max_bytes=500 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # (tier, key) -> (size, written_at)
+        self._total_bytes = 0
+        self._last_sweep = 0.0
+        self._counters = {tier: {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0} for tier in TIERS}
+
+        entries = []
+        for tier in TIERS:
+            tier_dir = os.path.join(root, tier)
+            os.makedirs(tier_dir, exist_ok=True)
+            for name in os.listdir(tier_dir):
+                if name.endswith(".tmp"):
+                    continue
+                st = os.stat(os.path.join(tier_dir, name))
+                entries.append((st.st_mtime, tier, name, st.st_size))
+        for written_at, tier, key, size in sorted(entries):
+            self._index[(tier, key)] = (size, written_at)
+            self._total_bytes += size
+
+    def get(self, tier, key):
+        """Return the cached text for `key`, or None on a miss or an expired entry."""
+        data = self.get_bytes(tier, key)
+        return None if data is None else data.decode('utf-8')
+
+    def put(self, tier, key, value: str):
+        self.put_bytes(tier, key, value.encode('utf-8'))
+
+    def get_bytes(self, tier, key):
+        with self._lock:
+            entry = self._index.get((tier, key))
+            if entry is not None and time.time() - entry[1] > self.max_age:
+                self._evict((tier, key))
+                entry = None
+            if entry is None:
+                self._counters[tier]['misses'] += 1
+                CACHE_REQUESTS.inc(tier=tier, result='miss')
+                return None
+            self._index.move_to_end((tier, key))
+
+        try:
+            with open(self._path(tier, key), 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._forget((tier, key))
+                self._counters[tier]['misses'] += 1
+            CACHE_REQUESTS.inc(tier=tier, result='miss')
+            return None
+
+        with self._lock:
+            self._counters[tier]['hits'] += 1
+        CACHE_REQUESTS.inc(tier=tier, result='hit')
+        return value
+
+    def put_bytes(self, tier, key, data: bytes):
+        path = self._path(tier, key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._forget((tier, key))
+            self._index[(tier, key)] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self._counters[tier]['writes'] += 1
+            self._evict_to_fit()
+
+    def delete(self, tier, key):
+        """Drop an entry, e.g. one derived from content that has just been replaced."""
+        with self._lock:
+            if (tier, key) in self._index:
+                self._evict((tier, key))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._index),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'tiers': {tier: dict(counters) for tier, counters in self._counters.items()},
+            }
+
+    # --- internals (callers hold self._lock) ---
+    def _path(self, tier, key):
+        return os.path.join(self.root, tier, key)
+
+    def _forget(self, item):
+        entry = self._index.pop(item, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def _evict(self, item):
+        self._forget(item)
+        self._counters[item[0]]['evictions'] += 1
+        try:
+            os.remove(self._path(*item))
+        except FileNotFoundError:
+            pass
+
+    def _evict_to_fit(self):
+        now = time.time()
+        if now - self._last_sweep > 60:
+            self._last_sweep = now
+            expired = [item for item, (_, written_at) in self._index.items() if now - written_at > self.max_age]
+            for item in expired:
+                self._evict(item)
+        while self._total_bytes > self.max_bytes and self._index:
+            self._evict(next(iter(self._index)))
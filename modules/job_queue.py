@@ -0,0 +1,296 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+from modules.metrics import StageTimer
+from modules.storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds the maximum number of pending jobs."""
+
+
+class Job(StageTimer):
+    """A unit of background work plus its status and per-stage timings."""
+
+    def __init__(self, job_id, payload, created_at=None):
+        super().__init__()
+        self.id = job_id
+        self.payload = payload
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        # Seconds after which a job that failed on an unavailable upstream is worth retrying
+        self.retry_after = None
+        self.created_at = created_at or datetime.utcnow().isoformat()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'retry_after': self.retry_after,
+            'timings': self.timings,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue backed by a bounded thread pool.
+
+    `handler(job)` is called on a worker thread and its return value becomes the
+    job result. With a `runner` (an object whose `submit(coroutine)` returns a
+    concurrent.futures.Future, such as AsyncCore) `handler` is a coroutine
+    function instead: up to `max_workers` jobs run at once as coroutines on the
+    runner's event loop and no thread is held per job. When `journal_path` is
+    set every state change is appended to a
+    JSON-lines journal so that jobs still pending at shutdown are re-run by
+    `recover()` on the next start. The journal is rewritten every
+    `compact_every` entries, so replaying it costs the same however long the
+    process ran.
+    """
+
+    def __init__(self, handler, max_workers=4, max_pending=100, journal_path=None, keep_finished=1000,
+                 compact_every=5000, runner=None):
+        self.handler = handler
+        self.max_workers = max_workers
+        self.runner = runner
+        self.max_pending = max_pending
+        self.journal_path = journal_path
+        self.keep_finished = keep_finished
+        self.compact_every = compact_every
+        self._journal_entries = 0
+        self._compact_at = compact_every
+        self._executor = None if runner else ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        # Bounds the coroutine jobs running at once; created on the runner's loop by the first job
+        self._slots = None
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._closed = False
+        # Futures of queued and running jobs, for drain() to wait on
+        self._futures = {}
+
+    def submit(self, payload):
+        """Queue a job for `payload` (must be JSON serialisable) and return it."""
+        job = Job(uuid.uuid4().hex, payload)
+        self._enqueue(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def retry(self, job_id):
+        """Re-queue a failed job with its original payload; returns the job, or None if it cannot be retried."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != FAILED:
+                return None
+            if self._closed:
+                raise QueueFull("Job queue is shutting down")
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+            job.status = QUEUED
+            job.error = job.retry_after = job.result = None
+            job.timings = {}
+        self._enqueue(job, force=True)
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {'pending': self._pending, 'max_pending': self.max_pending, 'tracked': len(self._jobs)}
+
+    def recover(self):
+        """Replay the journal, restoring finished jobs and re-queueing unfinished ones."""
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return 0
+
+        jobs = OrderedDict()
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append; skip it.
+                    continue
+                job_id = entry['id']
+                if entry['event'] == QUEUED:
+                    jobs[job_id] = Job(job_id, entry['payload'], entry.get('created_at'))
+                elif job_id in jobs:
+                    job = jobs[job_id]
+                    job.status = entry['event']
+                    job.result = entry.get('result')
+                    job.error = entry.get('error')
+                    job.retry_after = entry.get('retry_after')
+                    job.timings = entry.get('timings', {})
+                    job.finished_at = entry.get('at')
+
+        finished = [job for job in jobs.values() if job.status in (DONE, FAILED)][-self.keep_finished:]
+        unfinished = [job for job in jobs.values() if job.status not in (DONE, FAILED)]
+
+        self._compact_journal(finished, unfinished)
+        with self._lock:
+            for job in finished:
+                self._jobs[job.id] = job
+        for job in unfinished:
+            job.status = QUEUED
+            self._enqueue(job, journal=False, force=True)
+
+        if unfinished:
+            logger.info("Re-queued %d unfinished job(s) from %s", len(unfinished), self.journal_path)
+        return len(unfinished)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def drain(self, timeout=None):
+        """
+        Stop taking jobs and wait up to `timeout` seconds for the running ones
+        to finish. Jobs that have not started return as soon as they get a
+        worker, but stay queued in the journal, so `recover()` runs them on the
+        next start. Returns the number of jobs left unfinished.
+        """
+        with self._lock:
+            self._closed = True
+            futures = list(self._futures.values())
+        wait(futures, timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        with self._lock:
+            return self._pending
+
+    # --- internals ---
+    def _enqueue(self, job, journal=True, force=False):
+        with self._lock:
+            if self._closed:
+                raise QueueFull("Job queue is shutting down")
+            if not force and self._pending >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+            self._pending += 1
+            self._jobs[job.id] = job
+        if journal:
+            self._journal(QUEUED, job, payload=job.payload, created_at=job.created_at)
+        if self.runner is not None:
+            future = self.runner.submit(self._arun(job))
+        else:
+            future = self._executor.submit(self._run, job)
+        with self._lock:
+            self._futures[job.id] = future
+        future.add_done_callback(functools.partial(self._forget_future, job.id))
+
+    def _forget_future(self, job_id, future):
+        with self._lock:
+            if self._futures.get(job_id) is future:
+                del self._futures[job_id]
+
+    def _run(self, job):
+        if not self._start(job):
+            return
+        try:
+            job.result = self.handler(job)
+            job.status = DONE
+        except Exception as e:
+            self._failed(job, e)
+        self._finish(job)
+
+    async def _arun(self, job):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            # The journal is fsynced, so it is written off the loop
+            if not await loop.run_in_executor(None, self._start, job):
+                return
+            try:
+                job.result = await self.handler(job)
+                job.status = DONE
+            except asyncio.CancelledError:
+                # The loop is shutting down; the job stays unfinished in the journal
+                raise
+            except Exception as e:
+                self._failed(job, e)
+            await loop.run_in_executor(None, self._finish, job)
+
+    def _start(self, job):
+        """Mark a job running; False when the queue is draining, leaving it queued for recover()."""
+        with self._lock:
+            if self._closed:
+                return False
+        job.status = RUNNING
+        job.started_at = datetime.utcnow().isoformat()
+        self._journal(RUNNING, job)
+        return True
+
+    def _failed(self, job, error):
+        logger.error("Job %s failed", job.id, exc_info=error)
+        job.error = str(error)
+        job.retry_after = getattr(error, 'retry_after', None)
+        job.status = FAILED
+
+    def _finish(self, job):
+        job.finished_at = datetime.utcnow().isoformat()
+        self._journal(job.status, job, result=job.result, error=job.error, retry_after=job.retry_after,
+                      timings=job.timings)
+
+        with self._lock:
+            self._pending -= 1
+            self._forget_old_jobs()
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _journal(self, event, job, **fields):
+        if not self.journal_path:
+            return
+        entry = {'event': event, 'id': job.id, 'at': datetime.utcnow().isoformat()}
+        entry.update(fields)
+        with self._journal_lock:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_entries += 1
+            if self.compact_every and self._journal_entries >= self._compact_at:
+                with self._lock:
+                    jobs = list(self._jobs.values())
+                self._compact_journal([job for job in jobs if job.status in (DONE, FAILED)],
+                                      [job for job in jobs if job.status not in (DONE, FAILED)])
+
+    def _compact_journal(self, finished, unfinished):
+        """Rewrite the journal so it only holds the jobs we still care about."""
+        lines = []
+        for job in finished + unfinished:
+            lines.append(json.dumps({'event': QUEUED, 'id': job.id, 'payload': job.payload,
+                                     'created_at': job.created_at}))
+            if job.status in (DONE, FAILED):
+                lines.append(json.dumps({'event': job.status, 'id': job.id, 'at': job.finished_at,
+                                         'result': job.result, 'error': job.error,
+                                         'retry_after': job.retry_after, 'timings': job.timings}))
+        atomic_write(self.journal_path, "".join(line + "\n" for line in lines).encode('utf-8'))
+        self._journal_entries = len(lines)
+        self._compact_at = len(lines) + self.compact_every
@@ -0,0 +1,136 @@
+import copy
+
+JSON_PATCH = "application/json-patch+json"
+MERGE_PATCH = "application/merge-patch+json"
+
+
+class PatchError(ValueError):
+    """A patch that is malformed or does not apply to the document."""
+
+
+def apply_merge_patch(target, patch):
+    """Apply an RFC 7396 JSON Merge Patch and return the result; `target` is not modified."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def merge_diff(before, after):
+    """The merge patch that turns `before` into `after` (both objects)."""
+    patch = {key: None for key in before if key not in after}
+    for key, value in after.items():
+        old = before.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = merge_diff(old, value)
+            if nested:
+                patch[key] = nested
+        elif key not in before or old != value:
+            patch[key] = value
+    return patch
+
+
+def apply_json_patch(document, operations):
+    """
+    Apply an RFC 6902 JSON Patch and return the result.
+
+    Operations are applied to a copy in order; if any of them fails (including
+    a failed `test`) PatchError is raised and nothing is changed.
+    """
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be an array of operations")
+    document = copy.deepcopy(document)
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise PatchError(f"Operation {index} needs 'op' and 'path'")
+        op, path = operation['op'], _parse_pointer(operation['path'])
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError(f"Operation {index} ({op}) needs 'value'")
+        if op in ('move', 'copy') and 'from' not in operation:
+            raise PatchError(f"Operation {index} ({op}) needs 'from'")
+
+        if op == 'add':
+            document = _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            document = _remove(document, path)[0]
+        elif op == 'replace':
+            document = _add(_remove(document, path)[0], path, copy.deepcopy(operation['value']))
+        elif op == 'move':
+            source = _parse_pointer(operation['from'])
+            if path[:len(source)] == source and path != source:
+                raise PatchError(f"Operation {index} moves a value into itself")
+            document, value = _remove(document, source)
+            document = _add(document, path, value)
+        elif op == 'copy':
+            document = _add(document, path, copy.deepcopy(_get(document, _parse_pointer(operation['from']))))
+        elif op == 'test':
+            if _get(document, path) != operation['value']:
+                raise PatchError(f"Test failed at {operation['path']}")
+        else:
+            raise PatchError(f"Unknown operation: {op}")
+    return document
+
+
+def _parse_pointer(pointer):
+    """Split an RFC 6901 JSON Pointer into its unescaped reference tokens."""
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise PatchError(f"Invalid JSON Pointer: {pointer!r}")
+    if pointer == "":
+        return []
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _array_index(container, token, allow_end=False):
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _get(document, path):
+    for token in path:
+        if isinstance(document, dict):
+            if token not in document:
+                raise PatchError(f"Path not found: /{'/'.join(path)}")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_array_index(document, token)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(path)}")
+    return document
+
+
+def _add(document, path, value):
+    if not path:
+        return value
+    parent, token = _get(document, path[:-1]), path[-1]
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, token, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to a scalar at /{'/'.join(path[:-1])}")
+    return document
+
+
+def _remove(document, path):
+    """Remove the value at `path`; returns `(document, removed_value)`."""
+    if not path:
+        return None, document
+    parent, token = _get(document, path[:-1]), path[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"Path not found: /{'/'.join(path)}")
+        return document, parent.pop(token)
+    if isinstance(parent, list):
+        return document, parent.pop(_array_index(parent, token))
+    raise PatchError(f"Path not found: /{'/'.join(path)}")
@@ -0,0 +1,74 @@
+import json
+
+
+class ObjectStreamParser:
+    """
+    Incrementally parse a JSON object that arrives in arbitrary chunks.
+
+    `feed(chunk)` returns the `(key, value)` pairs of the top-level members
+    that became complete with this chunk, so a caller can act on
+    `"producer": {...}` long before the rest of the object has been generated.
+    Anything before the opening brace (such as a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._finished = False
+        self._member = []
+        self.members = {}
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def feed(self, chunk):
+        completed = []
+        for char in chunk:
+            if self._finished:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._member.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+
+            if self._depth == 1 and char == ",":
+                completed.append(self._close_member())
+            elif self._depth == 0:
+                if "".join(self._member).strip():
+                    completed.append(self._close_member())
+                self._finished = True
+            else:
+                self._member.append(char)
+        return completed
+
+    def _close_member(self):
+        text = "".join(self._member)
+        self._member = []
+        # A member is `"key": value`; parse it as a one-member object
+        member = json.loads("{" + text + "}")
+        if len(member) != 1:
+            raise ValueError(f"Expected one object member, got {text!r}")
+        key, value = next(iter(member.items()))
+        self.members[key] = value
+        return key, value
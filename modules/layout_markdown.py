@@ -0,0 +1,129 @@
+import re
+from statistics import median
+
+# Characters that mark a line as part of a drawn table in plain OCR text
+TABLE_LINE = re.compile(r"[|+\-—│]")
+
+# Vision break types (TextAnnotation.DetectedBreak.BreakType) that do not separate words,
+# as proto-plus ints or REST JSON strings. proto-plus names the key `type_`, JSON `type`.
+_JOINING_BREAKS = {0, 4, None, "UNKNOWN", "HYPHEN"}
+
+# Paragraphs whose left edges are closer than this (fraction of page width) share a column
+COLUMN_TOLERANCE = 0.03
+
+
+def text_to_markdown(page_number, text):
+    """Markdown from plain OCR text, fencing runs of lines that contain table-drawing characters."""
+    output_md = [f"### Page {page_number}\n"]
+    in_table = False
+    for line in text.split("\n"):
+        is_table = TABLE_LINE.search(line) is not None
+        if is_table != in_table:
+            output_md.append("```\n")
+            in_table = is_table
+        output_md.append(line + "\n")
+    if in_table:
+        output_md.append("```\n")
+    return "".join(output_md)
+
+
+def layout_to_markdown(page_number, page):
+    """
+    Markdown from the block/paragraph geometry of one Vision page.
+
+    Paragraphs whose vertical centres line up form a row. Consecutive rows with
+    more than one cell are the boxed grids of an ACORD 25 form (producer /
+    insured, the coverage table, limits) and are emitted as markdown tables,
+    with columns taken from the clustered left edges of their cells. Everything
+    else is emitted as plain lines in reading order.
+    """
+    paragraphs = _paragraphs(page)
+    output_md = [f"### Page {page_number}\n"]
+    if not paragraphs:
+        return output_md[0]
+
+    rows = _rows(paragraphs)
+    i = 0
+    while i < len(rows):
+        j = i
+        while j < len(rows) and len(rows[j]) > 1:
+            j += 1
+        if j - i >= 2:
+            output_md.append(_table(rows[i:j]))
+            i = j
+        else:
+            output_md.append(" ".join(cell[0] for cell in rows[i]) + "\n")
+            i += 1
+    return "".join(output_md)
+
+
+def _paragraphs(page):
+    """Flatten a page into `(text, x0, y0, x1, y1)` tuples in page-relative coordinates."""
+    width = page.get('width') or 1
+    height = page.get('height') or 1
+    paragraphs = []
+    for block in page.get('blocks', ()):
+        for paragraph in block.get('paragraphs', ()):
+            parts = []
+            for word in paragraph.get('words', ()):
+                for symbol in word.get('symbols', ()):
+                    parts.append(symbol.get('text', ''))
+                    detected_break = (symbol.get('property') or {}).get('detected_break') or {}
+                    if detected_break.get('type_', detected_break.get('type')) not in _JOINING_BREAKS:
+                        parts.append(" ")
+            text = "".join(parts).strip()
+            if not text:
+                continue
+            box = _box(paragraph.get('bounding_box', {}), width, height)
+            if box is not None:
+                paragraphs.append((text,) + box)
+    return paragraphs
+
+
+def _box(bounding_box, width, height):
+    vertices = bounding_box.get('normalized_vertices')
+    if vertices:
+        xs = [v.get('x', 0.0) for v in vertices]
+        ys = [v.get('y', 0.0) for v in vertices]
+    else:
+        vertices = bounding_box.get('vertices')
+        if not vertices:
+            return None
+        xs = [v.get('x', 0) / width for v in vertices]
+        ys = [v.get('y', 0) / height for v in vertices]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _rows(paragraphs):
+    """Group paragraphs into rows by vertical centre; each row is sorted left to right."""
+    tolerance = median(p[4] - p[2] for p in paragraphs) / 2
+    rows = []
+    current, current_y = [], None
+    for paragraph in sorted(paragraphs, key=lambda p: (p[2] + p[4]) / 2):
+        centre = (paragraph[2] + paragraph[4]) / 2
+        if current and centre - current_y > tolerance:
+            rows.append(sorted(current, key=lambda p: p[1]))
+            current = []
+        if not current:
+            current_y = centre
+        current.append(paragraph)
+    rows.append(sorted(current, key=lambda p: p[1]))
+    return rows
+
+
+def _table(rows):
+    anchors = []
+    for x0 in sorted(cell[1] for row in rows for cell in row):
+        if not anchors or x0 - anchors[-1] > COLUMN_TOLERANCE:
+            anchors.append(x0)
+
+    lines = []
+    for row in rows:
+        cells = [""] * len(anchors)
+        for text, x0, *_ in row:
+            column = max(k for k, anchor in enumerate(anchors) if anchor <= x0 + COLUMN_TOLERANCE)
+            cell = text.replace("|", "\\|").replace("\n", " ")
+            cells[column] = f"{cells[column]} {cell}".strip()
+        lines.append("| " + " | ".join(cells) + " |\n")
+    lines.insert(1, "|" + "---|" * len(anchors) + "\n")
+    return "".join(lines)
@@ -0,0 +1,266 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# "json" writes one JSON object per log line; "text" a readable line with the trace ID
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics and collectors; collectors are called at scrape time to refresh gauges from live state."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, fn):
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self._lock:
+            collectors, metrics = list(self._collectors), list(self._metrics.values())
+        for collect in collectors:
+            try:
+                collect()
+            except Exception:
+                logging.getLogger(__name__).exception("Metrics collector %s failed", collect)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, help_text, labels=()):
+    return REGISTRY.register(Counter(name, help_text, labels))
+
+
+def gauge(name, help_text, labels=()):
+    return REGISTRY.register(Gauge(name, help_text, labels))
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+
+# --- pipeline metrics ---
+# Later stages add their own timings with `with span('pdf_render'): ...`, or define
+# metrics here with counter()/histogram() and update them where the work happens.
+STAGE_SECONDS = histogram("coi_stage_seconds", "Duration of pipeline stages (spans)", ["stage"])
+HTTP_SECONDS = histogram("coi_http_request_seconds", "HTTP request duration", ["endpoint", "method", "status"])
+OCR_PAGES = histogram("coi_ocr_pages", "Pages per OCR'd document", buckets=(1, 2, 3, 5, 10, 20, 50, 100))
+CACHE_REQUESTS = counter("coi_cache_requests_total", "Extraction cache lookups", ["tier", "result"])
+OPENAI_TOKENS = counter("coi_openai_tokens_total", "OpenAI tokens used", ["kind"])
+JOBS_PENDING = gauge("coi_jobs_pending", "Extraction jobs queued or running")
+UPSTREAM_QUEUE_DEPTH = gauge("coi_upstream_queue_depth", "Calls waiting for an upstream rate limit", ["upstream"])
+CACHE_BYTES = gauge("coi_cache_bytes", "Bytes held by the extraction cache")
+DB_WRITE_SECONDS = histogram("coi_db_write_seconds", "Document store write duration", ["op"],
+                             buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+
+
+@contextmanager
+def span(name):
+    """Time a stage of the pipeline into coi_stage_seconds."""
+    with STAGE_SECONDS.time(stage=name):
+        yield
+
+
+class StageTimer:
+    """Per-stage timings of one unit of work, kept in `timings` (seconds) and coi_stage_seconds."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time a named stage; the duration lands in `timings` in seconds and coi_stage_seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(elapsed, 3)
+            STAGE_SECONDS.observe(elapsed, stage=name)
+
+
+# --- trace IDs ---
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+# Client-supplied IDs end up in logs, so only short tokens are accepted
+_TRACE_ID_RE = re.compile(r"[\w.-]{1,64}")
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Run the block under `trace_id` (a new one if None); yields the ID."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def start_trace(trace_id=None):
+    """Set the trace ID for the rest of the current context (e.g. a request); returns it."""
+    if not trace_id or not _TRACE_ID_RE.fullmatch(trace_id):
+        trace_id = new_trace_id()
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'trace_id': getattr(record, 'trace_id', None),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level=logging.INFO):
+    """Log to stderr with the trace ID on every record, as text or JSON lines (LOG_FORMAT). Idempotent."""
+    root = logging.getLogger()
+    if any(isinstance(f, TraceIdFilter) for h in root.handlers for f in h.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
@@ -0,0 +1,117 @@
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Google Vision's synchronous file annotation accepts at most five pages per request
+MAX_PAGES_PER_REQUEST = 5
+
+
+class OcrBackend:
+    """
+    Something that can OCR a range of PDF pages.
+
+    `annotate(pdf_content, pages)` returns `(total_pages, annotations)` where
+    `annotations` holds one dict per requested page with at least a `text` key.
+    `pages` is a list of 1-based page numbers, or None for the first
+    MAX_PAGES_PER_REQUEST pages (used before the page count is known).
+    """
+
+    # Errors worth retrying; anything else fails the document immediately
+    transient_errors = ()
+
+    def annotate(self, pdf_content, pages):
+        raise NotImplementedError
+
+
+class LocalBackend(OcrBackend):
+    """
+    Stand-in backend that serves canned page texts, so the engine can run
+    without network access. `latency` seconds are slept per request and the
+    first `failures` requests raise ConnectionError to exercise retries.
+    """
+
+    transient_errors = (ConnectionError,)
+
+    def __init__(self, page_texts, latency=0.0, failures=0):
+        self.page_texts = list(page_texts)
+        self.latency = latency
+        self.failures = failures
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def annotate(self, pdf_content, pages):
+        with self._lock:
+            self.requests += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("simulated OCR failure")
+        if self.latency:
+            time.sleep(self.latency)
+        total = len(self.page_texts)
+        if pages is None:
+            pages = list(range(1, min(total, MAX_PAGES_PER_REQUEST) + 1))
+        return total, [{'text': self.page_texts[page - 1]} for page in pages]
+
+
+def page_chunks(done, total_pages, chunk_size):
+    """The page numbers after the first `done` pages, in requests of up to `chunk_size` pages."""
+    return [list(range(start, min(start + chunk_size, total_pages + 1)))
+            for start in range(done + 1, total_pages + 1, chunk_size)]
+
+
+class OcrEngine:
+    """
+    Page-parallel OCR driver.
+
+    The first request fetches the opening pages and learns the page count; the
+    remaining pages are split into `chunk_size` page requests and sent with up
+    to `max_workers` in flight. Failed requests are retried with jittered
+    exponential backoff.
+    """
+
+    def __init__(self, backend, chunk_size=MAX_PAGES_PER_REQUEST, max_workers=4, retries=3, backoff=0.5):
+        self.backend = backend
+        self.chunk_size = max(1, min(chunk_size, MAX_PAGES_PER_REQUEST))
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+
+    def stream_pages(self, pdf_content):
+        """Yield `(page_number, annotation)` in page order as soon as each page is available."""
+        total_pages, first = self._annotate(pdf_content, None)
+        for offset, annotation in enumerate(first):
+            yield offset + 1, annotation
+
+        chunks = page_chunks(len(first), total_pages, self.chunk_size)
+        # Run each request in a copy of the caller's context so its upstream priority lane carries over
+        futures = {
+            self._executor.submit(contextvars.copy_context().run, self._annotate, pdf_content, chunk): chunk
+            for chunk in chunks
+        }
+
+        ready = {}
+        next_page = len(first) + 1
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _, annotations = future.result()
+                    ready.update(zip(futures[future], annotations))
+                while next_page in ready:
+                    yield next_page, ready.pop(next_page)
+                    next_page += 1
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _annotate(self, pdf_content, pages):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.backend.annotate(pdf_content, pages)
+            except self.backend.transient_errors:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
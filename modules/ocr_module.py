@@ -1,39 +1,100 @@
 import os
-from google.cloud import vision
+from modules.clients import get_vision_client, reset_vision_client, vision_sdk
+from modules.layout_markdown import layout_to_markdown, text_to_markdown
+from modules.ocr_engine import OcrBackend, OcrEngine, MAX_PAGES_PER_REQUEST
+from modules.metrics import OCR_PAGES
+from modules.rate_limiter import Scheduler, register
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-CREDENTIALS_PATH = os.path.join(SCRIPT_DIR, "..", "config", "google_ocr.json")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = CREDENTIALS_PATH
+OCR_CHUNK_PAGES = int(os.getenv("OCR_CHUNK_PAGES", str(MAX_PAGES_PER_REQUEST)))
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+OCR_RETRIES = int(os.getenv("OCR_RETRIES", "3"))
+# "text" fences table-looking lines of plain text; "layout" rebuilds tables from Vision's block
+# geometry, but is ~20x slower per page and makes ~11% longer prompts (benchmarks/bench_markdown.py)
+OCR_MARKDOWN = os.getenv("OCR_MARKDOWN", "text")
+# Vision requests per minute across all threads (each request covers up to MAX_PAGES_PER_REQUEST pages)
+VISION_RPM = int(os.getenv("VISION_RPM", "1800"))
 
-def run_ocr(pdf_content: bytes) -> str:
-    """Runs Google Vision OCR on PDF content and returns raw markdown text."""
-    client = vision.ImageAnnotatorClient()
 
+def transient_errors():
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+    )
+
+
+class VisionBackend(OcrBackend):
+    """OCR backend calling Google Vision DOCUMENT_TEXT_DETECTION on a page range."""
+
+    @property
+    def transient_errors(self):
+        return transient_errors()
+
+    def annotate(self, pdf_content, pages):
+        client = get_vision_client()
+        response = scheduler.call(self._batch_annotate, client, annotate_request(pdf_content, pages))
+        return file_annotations(response)
+
+    @staticmethod
+    def _batch_annotate(client, request):
+        from google.api_core import exceptions as google_exceptions
+        try:
+            return client.batch_annotate_files(requests=[request])
+        except google_exceptions.ServiceUnavailable:
+            # The shared channel may be wedged; rebuild it before the scheduler retries
+            reset_vision_client()
+            raise
+
+
+def annotate_request(pdf_content, pages):
+    """The DOCUMENT_TEXT_DETECTION request for `pages` of a PDF (None: the first MAX_PAGES_PER_REQUEST)."""
+    vision = vision_sdk()
     input_config = vision.InputConfig(content=pdf_content, mime_type="application/pdf")
     features = [vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
-    request = vision.AnnotateFileRequest(input_config=input_config, features=features)
-    response = client.batch_annotate_files(requests=[request])
-
-    output_md = []
-    for i, page in enumerate(response.responses[0].responses):
-        output_md.append(f"### Page {i + 1}\n")
-        text = page.full_text_annotation.text
-        lines = text.split("\n")
-
-        in_table = False
-        for line in lines:
-            if any(char in line for char in ['|', '+', '-', '—', '│']):
-                if not in_table:
-                    output_md.append("```\n")
-                    in_table = True
-                output_md.append(line + "\n")
-            else:
-                if in_table:
-                    output_md.append("```\n")
-                    in_table = False
-                output_md.append(line + "\n")
-
-        if in_table:
-            output_md.append("```\n")
-
-    return "".join(output_md)
+    return vision.AnnotateFileRequest(input_config=input_config, features=features, pages=pages or [])
+
+
+def file_annotations(response):
+    """`(total_pages, annotations)` of a batch_annotate_files response, as OcrBackend.annotate returns them."""
+    file_response = response.responses[0]
+    if file_response.error.message:
+        raise RuntimeError(f"Vision OCR failed: {file_response.error.message}")
+    return file_response.total_pages, [_annotation(page.full_text_annotation) for page in file_response.responses]
+
+
+def _annotation(full_text_annotation):
+    annotation = {'text': full_text_annotation.text}
+    if OCR_MARKDOWN == "layout":
+        layout = vision_sdk().TextAnnotation.to_dict(full_text_annotation, preserving_proto_field_name=True)
+        annotation['pages'] = layout.get('pages', [])
+    return annotation
+
+
+def page_to_markdown(page_number: int, annotation: dict) -> str:
+    """Render one OCR'd page as markdown, using its layout when the backend provided one."""
+    if annotation.get('pages'):
+        return layout_to_markdown(page_number, annotation['pages'][0])
+    return text_to_markdown(page_number, annotation['text'])
+
+
+scheduler = register(Scheduler("vision", requests_per_minute=VISION_RPM, retries=OCR_RETRIES,
+                               retryable=transient_errors))
+# The scheduler retries transient Vision errors, so the engine does not retry again
+_engine = OcrEngine(VisionBackend(), chunk_size=OCR_CHUNK_PAGES, max_workers=OCR_MAX_WORKERS, retries=0)
+
+
+def stream_ocr(pdf_content: bytes):
+    """Yield the markdown of each page, in order, as soon as it has been OCR'd."""
+    pages = 0
+    for page_number, annotation in _engine.stream_pages(pdf_content):
+        pages += 1
+        yield page_to_markdown(page_number, annotation)
+    OCR_PAGES.observe(pages)
+
+
+def run_ocr(pdf_content: bytes) -> str:
+    """Runs Google Vision OCR on PDF content and returns raw markdown text."""
+    return "".join(stream_ocr(pdf_content))
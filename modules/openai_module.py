@@ -1,21 +1,115 @@
-import openai
-
 import os
+from modules.clients import get_openai_session, openai_sdk
+from modules.metrics import OPENAI_TOKENS
+from modules.prompt_compactor import count_tokens
+from modules.rate_limiter import Scheduler, parse_retry_after, register
 
-# Load the API key from an environment variable
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Load the API key from an environment variable; check_config() reports it missing at startup
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+MISSING_KEY_MESSAGE = "❌ OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
 
-if not openai.api_key:
-    raise ValueError("❌ OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
 
-def extract_json_from_md(system_prompt: str, user_input: str) -> str:
-    """Send markdown + questions to OpenAI and return JSON string output."""
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
+# Account limits; tokens/min is charged the prompt estimate plus OPENAI_REPLY_TOKENS until usage is known
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "80000"))
+OPENAI_REPLY_TOKENS = int(os.getenv("OPENAI_REPLY_TOKENS", "1500"))
+OPENAI_RETRIES = int(os.getenv("OPENAI_RETRIES", "4"))
+
+
+def check_config():
+    """Configuration problems that would make every OpenAI call fail, as messages."""
+    return [] if OPENAI_API_KEY else [MISSING_KEY_MESSAGE]
+
+
+def transient_errors():
+    openai = openai_sdk()
+    return (
+        openai.error.RateLimitError,
+        openai.error.ServiceUnavailableError,
+        openai.error.APIError,
+        openai.error.Timeout,
+        openai.error.APIConnectionError,
+        openai.error.TryAgain,
+    )
+
+
+def _retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    return parse_retry_after(headers.get('retry-after'))
+
+
+scheduler = register(Scheduler("openai", requests_per_minute=OPENAI_RPM, tokens_per_minute=OPENAI_TPM,
+                               retries=OPENAI_RETRIES, retryable=transient_errors, retry_after=_retry_after))
+
+
+def completion_args(system_prompt: str, user_input: str) -> dict:
+    """Keyword arguments of ChatCompletion.create (or acreate) for one extraction call."""
+    if not OPENAI_API_KEY:
+        raise ValueError(MISSING_KEY_MESSAGE)
+    return dict(
+        model=MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_input}
         ],
-        temperature=0
+        temperature=0,
     )
-    return response['choices'][0]['message']['content']
+
+def _create(system_prompt: str, user_input: str, **kwargs):
+    args = completion_args(system_prompt, user_input)
+    get_openai_session()
+    return openai_sdk().ChatCompletion.create(**args, **kwargs)
+
+def estimate_tokens(system_prompt: str, user_input: str) -> int:
+    return count_tokens(system_prompt + user_input, MODEL) + OPENAI_REPLY_TOKENS
+
+def record_usage(estimate: int, response) -> dict:
+    """Return the unused part of `estimate` to the token bucket and count the tokens; returns the usage."""
+    usage = dict(response.get('usage', {}))
+    if 'total_tokens' in usage:
+        scheduler.adjust_tokens(estimate - usage['total_tokens'])
+    for kind in ('prompt', 'completion'):
+        OPENAI_TOKENS.inc(usage.get(f'{kind}_tokens', 0), kind=kind)
+    return usage
+
+def chat_completion(system_prompt: str, user_input: str):
+    """Run one extraction call and return `(content, usage)`; usage holds the token counts."""
+    estimate = estimate_tokens(system_prompt, user_input)
+    response = scheduler.call(_create, system_prompt, user_input, tokens=estimate)
+    usage = record_usage(estimate, response)
+    return response['choices'][0]['message']['content'], usage
+
+def stream_chat_completion(system_prompt: str, user_input: str):
+    """
+    Run one extraction call with `stream=True`, yielding the reply's content as it is generated.
+    Usage is recorded when the stream ends, also when the caller stops reading early: from the
+    final usage chunk when the API sends one, otherwise counted from the prompt and the text streamed.
+    """
+    estimate = estimate_tokens(system_prompt, user_input)
+    response = scheduler.call(_create, system_prompt, user_input, stream=True,
+                              stream_options={"include_usage": True}, tokens=estimate)
+    parts, usage = [], None
+    try:
+        for chunk in response:
+            if chunk.get('usage'):
+                usage = chunk['usage']
+            # The usage chunk has no choices
+            if not chunk.get('choices'):
+                continue
+            content = chunk['choices'][0].get('delta', {}).get('content')
+            if content:
+                parts.append(content)
+                yield content
+    finally:
+        if usage is None:
+            prompt_tokens = count_tokens(system_prompt + user_input, MODEL)
+            completion_tokens = count_tokens("".join(parts), MODEL)
+            usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                     'total_tokens': prompt_tokens + completion_tokens}
+        record_usage(estimate, {'usage': usage})
+
+def extract_json_from_md(system_prompt: str, user_input: str) -> str:
+    """Send markdown + questions to OpenAI and return JSON string output."""
+    content, _ = chat_completion(system_prompt, user_input)
+    return content
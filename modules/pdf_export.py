@@ -0,0 +1,212 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from modules.extraction_cache import PDF_TIER, sha256_hex
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("zip", "pdf")
+
+# Bump when the rendered layout changes so cached PDFs are not served for the old one
+PDF_LAYOUT_VERSION = "2"
+
+
+def _pdf_generator():
+    # reportlab is imported on the first render, not when the app starts
+    from modules import pdf_generator
+    return pdf_generator
+
+
+def warm_renderer():
+    """Build the process's renderer (styles, layout, logo) before its first document."""
+    _pdf_generator().get_renderer()
+
+
+def render_pdf(data, output):
+    """Render one record to `output`, a path or a writable binary file object."""
+    _pdf_generator().generate_pdf_from_json(data, output)
+
+
+def render_json(json_bytes):
+    """Render the bytes of one extracted JSON file to PDF bytes."""
+    buffer = io.BytesIO()
+    render_pdf(json.loads(json_bytes), buffer)
+    return buffer.getvalue()
+
+
+def pdf_cache_key(json_bytes):
+    """Rendered PDFs are keyed by the exact JSON file content and the layout version."""
+    return sha256_hex(PDF_LAYOUT_VERSION.encode() + b":" + json_bytes)
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Unseekable sink that ZipFile writes into; `drain()` hands over what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class PdfExporter:
+    """
+    Renders many certificates in a pool of worker processes.
+
+    The pool is started on first use. Exports keep at most `window` renders
+    in flight and hand each PDF on as soon as it is ready, so memory stays
+    bounded however many documents match. PDFs already in `cache` (the
+    PDF_TIER that /download_pdf fills) are reused, and new renders are added
+    to it. A file that cannot be rendered is logged and left out.
+    """
+
+    def __init__(self, max_workers=None, window=None, cache=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.window = window or self.max_workers * 2
+        self.cache = cache
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def iter_zip(self, json_paths):
+        """
+        Yield the bytes of a ZIP with one `<name>.pdf` per JSON file, in order.
+        A file that fails to render gets a `<name>.error.txt` entry instead, as
+        the response has already started.
+        """
+        sink = _ChunkWriter()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for json_path, pdf, error in self.iter_rendered(json_paths):
+                name = os.path.splitext(os.path.basename(json_path))[0]
+                if error is not None:
+                    archive.writestr(f"{name}.error.txt", f"Could not render {name}: {error}\n")
+                elif pdf is not None:
+                    archive.writestr(f"{name}.pdf", pdf)
+                yield sink.drain()
+        yield sink.drain()
+
+    def merged_pdf(self, json_paths):
+        """
+        Render every file in the pool and merge the PDFs into a temp file;
+        returns `(temp_path, count)`. The caller removes the file. Renders run
+        in the window like a ZIP export, but the merged document is held in
+        memory until the last one is appended, so callers cap how many files
+        go into one merge (EXPORT_MAX_MERGED in app.py).
+        """
+        from pypdf import PdfReader, PdfWriter
+
+        fd, output_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        count = 0
+        try:
+            writer = PdfWriter()
+            for _, pdf, _ in self.iter_rendered(json_paths):
+                if pdf is not None:
+                    writer.append(PdfReader(io.BytesIO(pdf)))
+                    count += 1
+            writer.write(output_path)
+        except Exception:
+            os.remove(output_path)
+            raise
+        return output_path, count
+
+    def iter_rendered(self, json_paths):
+        """
+        Yield `(json_path, pdf, error)` for each file, in order. `pdf` is None
+        when the file has gone or failed to render; `error` says why it failed.
+        """
+        in_flight = deque()
+        paths = iter(json_paths)
+        while True:
+            for json_path in paths:
+                in_flight.append((json_path, self._submit(json_path)))
+                if len(in_flight) >= self.window:
+                    break
+            if not in_flight:
+                break
+            json_path, (cache_key, future) = in_flight.popleft()
+            if future is None:
+                logger.warning("Skipping %s in export: file not found", json_path)
+                yield json_path, None, None
+                continue
+            try:
+                pdf = future.result()
+            except Exception as e:
+                logger.exception("Skipping %s in export: render failed", json_path)
+                yield json_path, None, str(e) or type(e).__name__
+                continue
+            if cache_key is not None and self.cache is not None:
+                self.cache.put_bytes(PDF_TIER, cache_key, pdf)
+            yield json_path, pdf, None
+
+    def _submit(self, json_path):
+        """`(cache_key, future)` for one file: cache_key None on a cache hit, future None if the file has gone."""
+        try:
+            with open(json_path, 'rb') as f:
+                json_bytes = f.read()
+        except FileNotFoundError:
+            return None, None
+        cache_key = pdf_cache_key(json_bytes)
+        pdf = self.cache.get_bytes(PDF_TIER, cache_key) if self.cache is not None else None
+        if pdf is not None:
+            future = Future()
+            future.set_result(pdf)
+            return None, future
+        return cache_key, self._get_pool().submit(render_json, json_bytes)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context(),
+                                                 initializer=warm_renderer)
+            return self._pool
+
+
+def _pool_context():
+    """
+    The pool starts lazily inside a threaded server, so its workers must not be
+    fork()ed from it: a lock another thread held at that moment (logging, SQLite,
+    the schedulers) would stay locked in the child. forkserver forks them from a
+    clean single-threaded process; spawn is the fallback where it is missing.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Not the default ["__main__"]: under `python app.py` that would import the app into the server
+        context.set_forkserver_preload(["modules.pdf_export"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def iter_file(path, chunk_size=64 * 1024):
+    """Yield a file in chunks and delete it afterwards."""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
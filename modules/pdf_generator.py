@@ -1,450 +1,332 @@
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Flowable
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
+from reportlab import rl_config
 from reportlab.lib.units import inch
 from reportlab.lib.pagesizes import letter
 import os
+import threading
+from contextlib import contextmanager
 
-def generate_pdf_from_json(data, filename):
+from modules.prompt_builder import COI_SCHEMA
+
+# ReportLab reads rl_config.useA85 while a document is built and has no per-document
+# setting; _stream_encoding() tracks the builds running with the current value.
+_encoding_cond = threading.Condition()
+_encoding_builds = 0
+_encoding_previous = None
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "images", "tiarna-logo.png")
+
+
+class CoverageRow:
     """
-    Generates a professional Certificate of Insurance PDF from JSON data.
+    How one COI_SCHEMA coverage section is laid out in the coverage table.
+
+    `limits` are `(field, label)` pairs joined into the LIMITS cell (a label
+    of None shows the bare value); `details` are `(field, label)` pairs each
+    shown as an indented sub-row when the field is filled in.
     """
-    doc = SimpleDocTemplate(filename, pagesize=letter,
-                            rightMargin=0.5*inch, leftMargin=0.5*inch,
-                            topMargin=0.4*inch, bottomMargin=0.4*inch)
-    
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # --- Logo ---
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    logo_path = os.path.join(script_dir, "..", "static", "images", "tiarna-logo.png")
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=1.2*inch, height=0.4*inch) # Reduced logo size
-        logo.hAlign = 'LEFT'
-        story.append(logo)
-        story.append(Spacer(1, 0.1*inch)) # Reduced spacer
-
-    # Custom Styles - Optimized for single page
-    title_style = ParagraphStyle(
-        name='Title',
-        fontSize=14, # Reduced font size
-        leading=18, # Reduced leading
-        alignment=1,
-        spaceAfter=10, # Reduced space after
-        fontName='Helvetica-Bold',
-        textColor=colors.HexColor("#2C3E50")
-    )
-    
-    section_header_style = ParagraphStyle(
-        name='SectionHeader',
-        fontSize=10, # Reduced font size
-        leading=12, # Reduced leading
-        spaceBefore=8, # Reduced space before
-        spaceAfter=4, # Reduced space after
-        fontName='Helvetica-Bold',
-        textColor=colors.HexColor("#34495E")
-    )
-    
-    field_style = ParagraphStyle(
-        name='Field',
-        fontSize=7, # Reduced font size
-        leading=10, # Reduced leading
-        fontName='Helvetica',
-        textColor=colors.HexColor("#34495E")
-    )
-    
-    field_bold_style = ParagraphStyle(
-        name='FieldBold',
-        fontSize=7, # Reduced font size
-        leading=10, # Reduced leading
-        fontName='Helvetica-Bold',
-        textColor=colors.HexColor("#2C3E50")
-    )
-    
-    # Title
-    story.append(Paragraph("CERTIFICATE OF LIABILITY INSURANCE", title_style))
-    story.append(Spacer(1, 0.15*inch))
-    
-    # Producer, Insured, Certificate Holder Section
-    basic_info_data = []
-    
-    # Row 1: Headers
-    basic_info_data.append([
-        Paragraph("<b>PRODUCER</b>", field_bold_style),
-        Paragraph("<b>INSURED</b>", field_bold_style),
-        Paragraph("<b>CERTIFICATE HOLDER</b>", field_bold_style)
-    ])
-    
-    # Row 2: Names
-    producer_name = data.get('producer', {}).get('name', '')
-    insured_name = data.get('insured', {}).get('name', '')
-    cert_holder_name = data.get('certificate_holder', {}).get('name', '')
-    
-    basic_info_data.append([
-        Paragraph(f"<b>Name:</b><br/>{producer_name}", field_style),
-        Paragraph(f"<b>Name:</b><br/>{insured_name}", field_style),
-        Paragraph(f"<b>Name:</b><br/>{cert_holder_name}", field_style)
-    ])
-    
-    # Row 3: Addresses
-    producer_address = data.get('producer', {}).get('address', '')
-    insured_address = data.get('insured', {}).get('address', '')
-    cert_holder_address = data.get('certificate_holder', {}).get('address', '')
-    
-    basic_info_data.append([
-        Paragraph(f"<b>Address:</b><br/>{producer_address}", field_style),
-        Paragraph(f"<b>Address:</b><br/>{insured_address}", field_style),
-        Paragraph(f"<b>Address:</b><br/>{cert_holder_address}", field_style)
-    ])
-    
-    basic_info_table = Table(basic_info_data, colWidths=[2.5*inch, 2.5*inch, 2.5*inch])
-    basic_info_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#EAECEE")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('TOPPADDING', (0, 0), (-1, 0), 6),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (1, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (1, 1), (-1, -1), 6),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor("#34495E")),
-        ('LINEAFTER', (0, 0), (-2, -1), 1, colors.HexColor("#D5D8DC")),
-    ]))
-    
-    story.append(basic_info_table)
-    story.append(Spacer(1, 0.15*inch))
-    
-    # Insurance Coverage Table
-    story.append(Paragraph("Insurance Coverage", section_header_style))
-    
-    coverage_headers = [
-        "TYPE OF INSURANCE",
-        "INSURER",
-        "POLICY NUMBER", 
-        "POLICY EFFECTIVE DATE",
-        "LIMITS"
-    ]
-    
-    coverage_data = [coverage_headers]
-    
-    # Helper function to format effective dates
-    def format_date_range(effective_date):
-        if isinstance(effective_date, dict):
-            start = effective_date.get('start', '')
-            end = effective_date.get('end', '')
-            if start or end:
-                return f"{start} to {end}"
-            return ""
-        return str(effective_date) if effective_date else ""
-    
-    # Commercial General Liability
-    cgl = data.get('commercial_general_liability', {})
-    date_range = format_date_range(cgl.get('effective_date', {}))
-    
-    limits_text = []
-    if cgl.get('each_occurrence'):
-        limits_text.append(f"Each Occurrence: {cgl.get('each_occurrence')}")
-    if cgl.get('damage_to_rented_premises'):
-        limits_text.append(f"Damage to Rented Premises: {cgl.get('damage_to_rented_premises')}")
-    if cgl.get('med_expense_limit'):
-        limits_text.append(f"Med Expense: {cgl.get('med_expense_limit')}")
-    if cgl.get('personal_adv_injury_limit'):
-        limits_text.append(f"Personal & Adv Injury: {cgl.get('personal_adv_injury_limit')}")
-    if cgl.get('general_aggregate_limit'):
-        limits_text.append(f"General Aggregate: {cgl.get('general_aggregate_limit')}")
-    if cgl.get('products_comp_op_aggregate_limit'):
-        limits_text.append(f"Products-Comp/OP Agg: {cgl.get('products_comp_op_aggregate_limit')}")
-    
-    coverage_data.append([
-        "Commercial General Liability",
-        cgl.get('insurer_name', ''),
-        cgl.get('policy_number', ''),
-        date_range,
-        '\n'.join(limits_text) if limits_text else ''
-    ])
-    
-    if cgl.get('additional_insured'):
-        coverage_data.append([
-            "  - Additional Insured",
-            "",
-            "",
-            "",
-            cgl.get('additional_insured', '')
-        ])
-    
-    if cgl.get('subrogation'):
-        coverage_data.append([
-            "  - Subrogation Waived",
-            "",
-            "",
-            "",
-            cgl.get('subrogation', '')
-        ])
-    
-    if cgl.get('claims_basis'):
-        coverage_data.append([
-            "  - Claims Basis",
-            "",
-            "",
-            "",
-            cgl.get('claims_basis', '')
-        ])
-    
-    # Automobile Liability
-    auto = data.get('automobile_liability', {})
-    date_range = format_date_range(auto.get('effective_date', {}))
-    
-    limits_text = []
-    if auto.get('combined_single_limit'):
-        limits_text.append(f"Combined Single Limit: {auto.get('combined_single_limit')}")
-    
-    coverage_data.append([
-        "Automobile Liability",
-        auto.get('insurer_name', ''),
-        auto.get('policy_number', ''),
-        date_range,
-        '\n'.join(limits_text) if limits_text else ''
-    ])
-    
-    if auto.get('coverage_type'):
-        coverage_data.append([
-            "  - Coverage Type",
-            "",
-            "",
-            "",
-            auto.get('coverage_type', '')
-        ])
-    
-    if auto.get('additional_insured'):
-        coverage_data.append([
-            "  - Additional Insured",
-            "",
-            "",
-            "",
-            auto.get('additional_insured', '')
-        ])
-    
-    if auto.get('subrogation'):
-        coverage_data.append([
-            "  - Subrogation Waived",
-            "",
-            "",
-            "",
-            auto.get('subrogation', '')
-        ])
-    
-    # Umbrella Liability
-    umbrella = data.get('umbrella_liability', {})
-    date_range = format_date_range(umbrella.get('effective_date', {}))
-    
-    limits_text = []
-    if umbrella.get('each_occurrence_limit'):
-        limits_text.append(f"Each Occurrence: {umbrella.get('each_occurrence_limit')}")
-    if umbrella.get('aggregate_limit'):
-        limits_text.append(f"Aggregate: {umbrella.get('aggregate_limit')}")
-    if umbrella.get('retention_amount'):
-        limits_text.append(f"Retention: {umbrella.get('retention_amount')}")
-    
-    coverage_data.append([
-        "Umbrella Liability",
-        umbrella.get('insurer_name', ''),
-        umbrella.get('policy_number', ''),
-        date_range,
-        '\n'.join(limits_text) if limits_text else ''
-    ])
-    
-    if umbrella.get('claims_basis'):
-        coverage_data.append([
-            "  - Claims Basis",
-            "",
-            "",
-            "",
-            umbrella.get('claims_basis', '')
-        ])
-    
-    # Workers Compensation
-    workers_comp = data.get('workers_compensation', {})
-    date_range = format_date_range(workers_comp.get('effective_date', {}))
-    
-    limits_text = []
-    if workers_comp.get('each_accident_limit'):
-        limits_text.append(f"Each Accident: {workers_comp.get('each_accident_limit')}")
-    if workers_comp.get('disease_policy_limit'):
-        limits_text.append(f"Disease - Policy Limit: {workers_comp.get('disease_policy_limit')}")
-    if workers_comp.get('disease_each_employee_limit'):
-        limits_text.append(f"Disease - Each Employee: {workers_comp.get('disease_each_employee_limit')}")
-    
-    coverage_data.append([
-        "Workers Compensation",
-        workers_comp.get('insurer_name', ''),
-        workers_comp.get('policy_number', ''),
-        date_range,
-        '\n'.join(limits_text) if limits_text else ''
-    ])
-    
-    if workers_comp.get('compliance'):
-        coverage_data.append([
-            "  - Compliance",
-            "",
-            "",
-            "",
-            workers_comp.get('compliance', '')
-        ])
-    
-    if workers_comp.get('exclusion'):
-        coverage_data.append([
-            "  - Exclusion",
-            "",
-            "",
-            "",
-            workers_comp.get('exclusion', '')
-        ])
-    
-    # Property Insurance
-    prop_insurance = data.get('property_insurance', {})
-    date_range = format_date_range(prop_insurance.get('effective_date', {}))
-    
-    coverage_data.append([
-        "Property Insurance",
-        prop_insurance.get('insurer', ''),
-        prop_insurance.get('policy_number', ''),
-        date_range,
-        prop_insurance.get('limit', '')
-    ])
-    
-    if prop_insurance.get('additional_insured'):
-        coverage_data.append([
-            "  - Additional Insured",
-            "",
-            "",
-            "",
-            prop_insurance.get('additional_insured', '')
-        ])
-    
-    if prop_insurance.get('subrogation'):
-        coverage_data.append([
-            "  - Subrogation Waived",
-            "",
-            "",
-            "",
-            prop_insurance.get('subrogation', '')
+
+    def __init__(self, section, title, insurer, limits, details):
+        self.section = section
+        self.title = title
+        self.insurer = insurer
+        self.limits = limits
+        self.details = details
+
+    def fields(self):
+        return [self.insurer, 'policy_number', 'effective_date'] + [f for f, _ in self.limits + self.details]
+
+
+COVERAGE_ROWS = [
+    CoverageRow("commercial_general_liability", "Commercial General Liability", "insurer_name",
+                limits=[("each_occurrence", "Each Occurrence"),
+                        ("damage_to_rented_premises", "Damage to Rented Premises"),
+                        ("med_expense_limit", "Med Expense"),
+                        ("personal_adv_injury_limit", "Personal & Adv Injury"),
+                        ("general_aggregate_limit", "General Aggregate"),
+                        ("products_comp_op_aggregate_limit", "Products-Comp/OP Agg")],
+                details=[("additional_insured", "Additional Insured"),
+                         ("subrogation", "Subrogation Waived"),
+                         ("claims_basis", "Claims Basis")]),
+    CoverageRow("automobile_liability", "Automobile Liability", "insurer_name",
+                limits=[("combined_single_limit", "Combined Single Limit")],
+                details=[("coverage_type", "Coverage Type"),
+                         ("additional_insured", "Additional Insured"),
+                         ("subrogation", "Subrogation Waived")]),
+    CoverageRow("umbrella_liability", "Umbrella Liability", "insurer_name",
+                limits=[("each_occurrence_limit", "Each Occurrence"),
+                        ("aggregate_limit", "Aggregate"),
+                        ("retention_amount", "Retention")],
+                details=[("claims_basis", "Claims Basis")]),
+    CoverageRow("workers_compensation", "Workers Compensation", "insurer_name",
+                limits=[("each_accident_limit", "Each Accident"),
+                        ("disease_policy_limit", "Disease - Policy Limit"),
+                        ("disease_each_employee_limit", "Disease - Each Employee")],
+                details=[("compliance", "Compliance"),
+                         ("exclusion", "Exclusion")]),
+    CoverageRow("property_insurance", "Property Insurance", "insurer",
+                limits=[("limit", None)],
+                details=[("additional_insured", "Additional Insured"),
+                         ("subrogation", "Subrogation Waived")]),
+]
+
+COVERAGE_HEADERS = ["TYPE OF INSURANCE", "INSURER", "POLICY NUMBER", "POLICY EFFECTIVE DATE", "LIMITS"]
+
+
+def _check_coverage_rows(rows):
+    """Fail at import if the layout names a field the extraction schema does not have."""
+    for row in rows:
+        unknown = set(row.fields()) - set(COI_SCHEMA.get(row.section) or ())
+        if unknown:
+            raise ValueError(f"❌ PDF layout for {row.section} uses unknown fields: {sorted(unknown)}")
+
+
+_check_coverage_rows(COVERAGE_ROWS)
+
+
+def format_date_range(effective_date):
+    if isinstance(effective_date, dict):
+        start = effective_date.get('start', '')
+        end = effective_date.get('end', '')
+        if start or end:
+            return f"{start} to {end}"
+        return ""
+    return str(effective_date) if effective_date else ""
+
+
+class _Logo(Flowable):
+    """The logo drawn from a shared ImageReader, so its pixels are decoded once per renderer."""
+
+    def __init__(self, reader, width, height):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = 'LEFT'
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask='auto')
+
+
+class PdfRenderer:
+    """
+    Renders COI records to PDF.
+
+    Paragraph and table styles, column layout and the decoded logo are built
+    once when the renderer is created; `render()` only builds the flowables
+    that depend on the record. A renderer holds no per-render state and can be
+    shared between threads.
+
+    Streams are binary Flate by default: ASCII85 (`use_a85=True`, ReportLab's
+    default) only keeps the file 7-bit clean, and without the optional C
+    accelerator encoding the logo took about a third of every render.
+    """
+
+    def __init__(self, logo_path=LOGO_PATH, coverage_rows=COVERAGE_ROWS, use_a85=False):
+        self.coverage_rows = coverage_rows
+        self.use_a85 = use_a85
+        self.logo = ImageReader(logo_path) if logo_path and os.path.exists(logo_path) else None
+        if self.logo is not None:
+            # Decode now: ImageReader decodes lazily on first draw, which is not safe across threads
+            self.logo.getRGBData()
+            if self.logo._dataA is not None:
+                self.logo._dataA.getRGBData()
+
+        self.title_style = ParagraphStyle(
+            name='Title', fontSize=14, leading=18, alignment=1, spaceAfter=10,
+            fontName='Helvetica-Bold', textColor=colors.HexColor("#2C3E50"))
+        self.section_header_style = ParagraphStyle(
+            name='SectionHeader', fontSize=10, leading=12, spaceBefore=8, spaceAfter=4,
+            fontName='Helvetica-Bold', textColor=colors.HexColor("#34495E"))
+        self.field_style = ParagraphStyle(
+            name='Field', fontSize=7, leading=10, fontName='Helvetica', textColor=colors.HexColor("#34495E"))
+        self.field_bold_style = ParagraphStyle(
+            name='FieldBold', fontSize=7, leading=10, fontName='Helvetica-Bold', textColor=colors.HexColor("#2C3E50"))
+        self.footer_style = ParagraphStyle(
+            name='Footer', fontSize=7, leading=10, textColor=colors.grey, alignment=1)
+
+        # Boxed tables with a shaded header row; the coverage table uses tighter padding
+        boxed = [
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#EAECEE")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+            ('TOPPADDING', (0, 0), (-1, 0), 6),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (1, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (1, 1), (-1, -1), 6),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor("#34495E")),
+        ]
+        self.basic_info_table_style = TableStyle(boxed + [('LINEAFTER', (0, 0), (-2, -1), 1, colors.HexColor("#D5D8DC"))])
+        self.signature_table_style = TableStyle(boxed + [('LINEAFTER', (0, 0), (0, -1), 1, colors.HexColor("#D5D8DC"))])
+        self.coverage_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#EAECEE")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 7),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+            ('TOPPADDING', (0, 0), (-1, 0), 6),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor("#34495E")),
+            ('LINEABOVE', (0, 1), (-1, -1), 0.5, colors.HexColor("#D5D8DC")),
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 1), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
         ])
-    
-    # Convert data to Paragraphs for better formatting
-    formatted_coverage_data = []
-    for i, row in enumerate(coverage_data):
-        formatted_row = []
-        for cell in row:
-            if i == 0:  # Header row
-                formatted_row.append(Paragraph(f"<b>{cell}</b>", field_bold_style))
-            else:
-                formatted_row.append(Paragraph(str(cell), field_style))
-        formatted_coverage_data.append(formatted_row)
-    
-    coverage_table = Table(formatted_coverage_data, 
-                          colWidths=[1.6*inch, 1.3*inch, 1.3*inch, 1.4*inch, 2.1*inch])
-    coverage_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#EAECEE")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 7),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('TOPPADDING', (0, 0), (-1, 0), 6),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor("#34495E")),
-        ('LINEABOVE', (0, 1), (-1, -1), 0.5, colors.HexColor("#D5D8DC")),
-        ('LEFTPADDING', (0, 0), (-1, -1), 4),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 1), (-1, -1), 4),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
-    ]))
-    
-    story.append(coverage_table)
-    story.append(Spacer(1, 0.1*inch))
-    
-    # Description of Operations
-    story.append(Paragraph("DESCRIPTION OF OPERATIONS / LOCATIONS / VEHICLES", section_header_style))
-    
-    description = data.get('description_of_operations', {})
-    full_text = description.get('full_text', '')
-    addresses = description.get('addresses', '')
-    entitlement = description.get('entitlement', '')
-    
-    if full_text:
-        story.append(Paragraph(full_text, field_style))
-        story.append(Spacer(1, 0.05*inch))
-    
-    if addresses:
-        story.append(Paragraph(f"<b>Location Address:</b> {addresses}", field_style))
-        story.append(Spacer(1, 0.05*inch))
-    
-    if entitlement:
-        story.append(Paragraph(f"<b>Certificate Holder Entitlement:</b> {entitlement}", field_style))
-        story.append(Spacer(1, 0.05*inch))
-    
-    if not (full_text or addresses or entitlement):
-        story.append(Paragraph("No description provided", field_style))
+
+        self.basic_info_widths = [2.5*inch, 2.5*inch, 2.5*inch]
+        self.coverage_widths = [1.6*inch, 1.3*inch, 1.3*inch, 1.4*inch, 2.1*inch]
+        self.signature_widths = [4*inch, 3.5*inch]
+        self.coverage_header_markup = [f"<b>{header}</b>" for header in COVERAGE_HEADERS]
+
+    def render(self, data, filename):
+        """Write one certificate to `filename`, a path or a writable binary file object."""
+        self._build(self.story(data), filename)
+
+    def story(self, data):
+        """The flowables of one certificate."""
+        story = []
+        if self.logo is not None:
+            story.append(_Logo(self.logo, 1.2*inch, 0.4*inch))
+            story.append(Spacer(1, 0.1*inch))
+
+        story.append(Paragraph("CERTIFICATE OF LIABILITY INSURANCE", self.title_style))
+        story.append(Spacer(1, 0.15*inch))
+
+        # Producer, Insured, Certificate Holder
+        parties = [data.get(section) or {} for section in ('producer', 'insured', 'certificate_holder')]
+        basic_info_table = Table([
+            [Paragraph(f"<b>{title}</b>", self.field_bold_style)
+             for title in ("PRODUCER", "INSURED", "CERTIFICATE HOLDER")],
+            [Paragraph(f"<b>Name:</b><br/>{party.get('name', '')}", self.field_style) for party in parties],
+            [Paragraph(f"<b>Address:</b><br/>{party.get('address', '')}", self.field_style) for party in parties],
+        ], colWidths=self.basic_info_widths)
+        basic_info_table.setStyle(self.basic_info_table_style)
+        story.append(basic_info_table)
+        story.append(Spacer(1, 0.15*inch))
+
+        story.append(Paragraph("Insurance Coverage", self.section_header_style))
+        coverage_table = Table(self._coverage_cells(data), colWidths=self.coverage_widths)
+        coverage_table.setStyle(self.coverage_table_style)
+        story.append(coverage_table)
         story.append(Spacer(1, 0.1*inch))
-    
-    # Notice of Cancellation
-    story.append(Paragraph("CANCELLATION", section_header_style))
-    notice = data.get('notice_of_cancellation', '')
-    if notice:
-        story.append(Paragraph(notice, field_style))
-    else:
-        story.append(Paragraph("No cancellation notice provided", field_style))
-    
-    story.append(Spacer(1, 0.15*inch))
-    
-    # Footer/Signature Section - Compact for single page
-    signature_data = [
-        [
-            Paragraph("<b>CERTIFICATE HOLDER</b>", field_bold_style),
-            Paragraph("<b>AUTHORIZED REPRESENTATIVE</b>", field_bold_style)
-        ],
-        [
-            Paragraph(f"{cert_holder_name}<br/>{cert_holder_address}", field_style),
-            Paragraph("Signature: ________________________<br/>Date: _______________", field_style)
-        ]
-    ]
-    
-    signature_table = Table(signature_data, colWidths=[4*inch, 3.5*inch])
-    signature_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#EAECEE")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('TOPPADDING', (0, 0), (-1, 0), 6),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (1, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (1, 1), (-1, -1), 6),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor("#34495E")),
-        ('LINEAFTER', (0, 0), (0, -1), 1, colors.HexColor("#D5D8DC")),
-    ]))
-
-    story.append(signature_table)
-
-    # --- Footer ---
-    def footer(canvas, doc):
+
+        story.append(Paragraph("DESCRIPTION OF OPERATIONS / LOCATIONS / VEHICLES", self.section_header_style))
+        description = data.get('description_of_operations') or {}
+        full_text = description.get('full_text', '')
+        addresses = description.get('addresses', '')
+        entitlement = description.get('entitlement', '')
+        for text in (full_text,
+                     addresses and f"<b>Location Address:</b> {addresses}",
+                     entitlement and f"<b>Certificate Holder Entitlement:</b> {entitlement}"):
+            if text:
+                story.append(Paragraph(text, self.field_style))
+                story.append(Spacer(1, 0.05*inch))
+        if not (full_text or addresses or entitlement):
+            story.append(Paragraph("No description provided", self.field_style))
+            story.append(Spacer(1, 0.1*inch))
+
+        story.append(Paragraph("CANCELLATION", self.section_header_style))
+        notice = data.get('notice_of_cancellation', '')
+        story.append(Paragraph(notice or "No cancellation notice provided", self.field_style))
+        story.append(Spacer(1, 0.15*inch))
+
+        holder = parties[2]
+        signature_table = Table([
+            [Paragraph("<b>CERTIFICATE HOLDER</b>", self.field_bold_style),
+             Paragraph("<b>AUTHORIZED REPRESENTATIVE</b>", self.field_bold_style)],
+            [Paragraph(f"{holder.get('name', '')}<br/>{holder.get('address', '')}", self.field_style),
+             Paragraph("Signature: ________________________<br/>Date: _______________", self.field_style)],
+        ], colWidths=self.signature_widths)
+        signature_table.setStyle(self.signature_table_style)
+        story.append(signature_table)
+        return story
+
+    def _coverage_cells(self, data):
+        rows = [[Paragraph(markup, self.field_bold_style) for markup in self.coverage_header_markup]]
+        for layout in self.coverage_rows:
+            section = data.get(layout.section) or {}
+            limits = [f"{label}: {section[field]}" if label else section[field]
+                      for field, label in layout.limits if section.get(field)]
+            rows.append([
+                layout.title,
+                section.get(layout.insurer, ''),
+                section.get('policy_number', ''),
+                format_date_range(section.get('effective_date', {})),
+                '\n'.join(limits),
+            ])
+            rows.extend([f"  - {label}", "", "", "", section[field]]
+                        for field, label in layout.details if section.get(field))
+        return rows[:1] + [[Paragraph(str(cell), self.field_style) for cell in row] for row in rows[1:]]
+
+    def _footer(self, canvas, doc):
         canvas.saveState()
-        footer_style = ParagraphStyle(
-            name='Footer',
-            fontSize=7,
-            leading=10,
-            textColor=colors.grey,
-            alignment=1
-        )
-        footer_text = "Generated by Real Estate Company | Page %d" % doc.page
-        p = Paragraph(footer_text, footer_style)
+        p = Paragraph("Generated by Real Estate Company | Page %d" % doc.page, self.footer_style)
         w, h = p.wrap(doc.width, doc.bottomMargin)
         p.drawOn(canvas, doc.leftMargin, h)
         canvas.restoreState()
 
-    doc.build(story, onFirstPage=footer, onLaterPages=footer)
+    def _build(self, story, filename):
+        doc = SimpleDocTemplate(filename, pagesize=letter,
+                                rightMargin=0.5*inch, leftMargin=0.5*inch,
+                                topMargin=0.4*inch, bottomMargin=0.4*inch)
+        with _stream_encoding(self.use_a85):
+            doc.build(story, onFirstPage=self._footer, onLaterPages=self._footer)
+
+
+@contextmanager
+def _stream_encoding(use_a85):
+    """
+    Set rl_config.useA85 for one build. Builds that want the value already in
+    effect run side by side; only a build that wants the other value waits for
+    the running ones to finish. The value from before is put back when the
+    last build ends.
+    """
+    global _encoding_builds, _encoding_previous
+    wanted = int(use_a85)
+    with _encoding_cond:
+        while _encoding_builds and int(rl_config.useA85) != wanted:
+            _encoding_cond.wait()
+        if not _encoding_builds:
+            _encoding_previous = rl_config.useA85
+            rl_config.useA85 = wanted
+        _encoding_builds += 1
+    try:
+        yield
+    finally:
+        with _encoding_cond:
+            _encoding_builds -= 1
+            if not _encoding_builds:
+                rl_config.useA85 = _encoding_previous
+                _encoding_cond.notify_all()
+
+
+_renderer = None
+
+
+def get_renderer():
+    """The process-wide renderer, created on first use."""
+    global _renderer
+    if _renderer is None:
+        _renderer = PdfRenderer()
+    return _renderer
+
+
+def generate_pdf_from_json(data, filename):
+    """
+    Generates a professional Certificate of Insurance PDF from JSON data.
+    `filename` is a path or a writable binary file object such as BytesIO.
+    """
+    get_renderer().render(data, filename)
+
@@ -1,88 +1,152 @@
-def build_prompt() -> str:
-    """Return the fixed system prompt for OpenAI extraction."""
-    return (
-        "You are an insurance coverage field extractor.\n"
-        "\n"
-        "You will receive OCR output from a Certificate of Insurance in markdown format.\n"
-        "You will also receive a list of field-specific questions. Use them to locate and extract matching values from the document.\n"
-        "\n"
-        "Return the result as a JSON object using this format (include all fields, use empty string \"\" if not found):\n"
-        "\n"
-        "{\n"
-        "  \"producer\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"address\": \"...\"\n"
-        "  },\n"
-        "  \"insured\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"address\": \"...\"\n"
-        "  },\n"
-        "  \"certificate_holder\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"address\": \"...\"\n"
-        "  },\n"
-        "  \"commercial_general_liability\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"policy_number\": \"...\",\n"
-        "    \"insurer_name\": \"...\",\n"
-        "    \"claims_basis\": \"...\",\n"
-        "    \"effective_date\": { \"start\": \"...\", \"end\": \"...\" },\n"
-        "    \"each_occurrence\": \"...\",\n"
-        "    \"damage_to_rented_premises\": \"...\",\n"
-        "    \"med_expense_limit\": \"...\",\n"
-        "    \"personal_adv_injury_limit\": \"...\",\n"
-        "    \"general_aggregate_limit\": \"...\",\n"
-        "    \"products_comp_op_aggregate_limit\": \"...\",\n"
-        "    \"additional_insured\": \"...\",\n"
-        "    \"subrogation\": \"...\"\n"
-        "  },\n"
-        "  \"automobile_liability\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"policy_number\": \"...\",\n"
-        "    \"insurer_name\": \"...\",\n"
-        "    \"coverage_type\": \"...\",\n"
-        "    \"effective_date\": { \"start\": \"...\", \"end\": \"...\" },\n"
-        "    \"combined_single_limit\": \"...\",\n"
-        "    \"additional_insured\": \"...\",\n"
-        "    \"subrogation\": \"...\"\n"
-        "  },\n"
-        "  \"umbrella_liability\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"policy_number\": \"...\",\n"
-        "    \"insurer_name\": \"...\",\n"
-        "    \"claims_basis\": \"...\",\n"
-        "    \"effective_date\": { \"start\": \"...\", \"end\": \"...\" },\n"
-        "    \"each_occurrence_limit\": \"...\",\n"
-        "    \"aggregate_limit\": \"...\",\n"
-        "    \"retention_amount\": \"...\"\n"
-        "  },\n"
-        "  \"workers_compensation\": {\n"
-        "    \"name\": \"...\",\n"
-        "    \"policy_number\": \"...\",\n"
-        "    \"insurer_name\": \"...\",\n"
-        "    \"effective_date\": { \"start\": \"...\", \"end\": \"...\" },\n"
-        "    \"each_accident_limit\": \"...\",\n"
-        "    \"disease_policy_limit\": \"...\",\n"
-        "    \"disease_each_employee_limit\": \"...\",\n"
-        "    \"compliance\": \"...\",\n"
-        "    \"exclusion\": \"...\"\n"
-        "  },\n"
-        "  \"property_insurance\": {\n"
-        "    \"policy_number\": \"...\",\n"
-        "    \"insurer\": \"...\",\n"
-        "    \"effective_date\": { \"start\": \"...\", \"end\": \"...\" },\n"
-        "    \"limit\": \"...\",\n"
-        "    \"additional_insured\": \"...\",\n"
-        "    \"subrogation\": \"...\"\n"
-        "  },\n"
-        "  \"description_of_operations\": {\n"
-        "    \"full_text\": \"...\",\n"
-        "    \"entitlement\": \"...\",\n"
-        "    \"addresses\": \"...\"\n"
-        "  },\n"
-        "  \"notice_of_cancellation\": \"...\"\n"
-        "}\n"
-        "\n"
-        "Only extract values exactly as they appear. Do not guess.\n"
-        "If you cannot find a value, use an empty string. Never return null or fabricated values."
-    )
+# Sections of the extracted COI JSON, in output order, with their fields.
+# A section of None is a top-level string field. DATE_RANGE_FIELDS are {start, end} objects.
+COI_SCHEMA = {
+    "producer": ["name", "address"],
+    "insured": ["name", "address"],
+    "certificate_holder": ["name", "address"],
+    "commercial_general_liability": [
+        "name", "policy_number", "insurer_name", "claims_basis", "effective_date",
+        "each_occurrence", "damage_to_rented_premises", "med_expense_limit", "personal_adv_injury_limit",
+        "general_aggregate_limit", "products_comp_op_aggregate_limit", "additional_insured", "subrogation",
+    ],
+    "automobile_liability": [
+        "name", "policy_number", "insurer_name", "coverage_type", "effective_date",
+        "combined_single_limit", "additional_insured", "subrogation",
+    ],
+    "umbrella_liability": [
+        "name", "policy_number", "insurer_name", "claims_basis", "effective_date",
+        "each_occurrence_limit", "aggregate_limit", "retention_amount",
+    ],
+    "workers_compensation": [
+        "name", "policy_number", "insurer_name", "effective_date",
+        "each_accident_limit", "disease_policy_limit", "disease_each_employee_limit", "compliance", "exclusion",
+    ],
+    "property_insurance": [
+        "policy_number", "insurer", "effective_date", "limit", "additional_insured", "subrogation",
+    ],
+    "description_of_operations": ["full_text", "entitlement", "addresses"],
+    "notice_of_cancellation": None,
+}
+
+DATE_RANGE_FIELDS = {"effective_date"}
+# Fields holding a dollar amount, normalised to numbers for analytics
+MONEY_FIELDS = {
+    "each_occurrence", "damage_to_rented_premises", "med_expense_limit", "personal_adv_injury_limit",
+    "general_aggregate_limit", "products_comp_op_aggregate_limit", "combined_single_limit",
+    "each_occurrence_limit", "aggregate_limit", "retention_amount", "each_accident_limit",
+    "disease_policy_limit", "disease_each_employee_limit", "limit",
+}
+
+PROMPT_HEADER = (
+    "You are an insurance coverage field extractor.\n"
+    "\n"
+    "You will receive OCR output from a Certificate of Insurance in markdown format.\n"
+    "You will also receive a list of field-specific questions. Use them to locate and extract matching values from the document.\n"
+    "\n"
+    "Return the result as a JSON object using this format (include all fields, use empty string \"\" if not found):\n"
+    "\n"
+)
+
+PROMPT_FOOTER = (
+    "\n"
+    "Only extract values exactly as they appear. Do not guess.\n"
+    "If you cannot find a value, use an empty string. Never return null or fabricated values."
+)
+
+
+def render_schema(sections=None) -> str:
+    """Render the JSON template for `sections` (all of COI_SCHEMA by default)."""
+    sections = [name for name in COI_SCHEMA if sections is None or name in sections]
+    lines = ["{"]
+    for i, section in enumerate(sections):
+        comma = "," if i < len(sections) - 1 else ""
+        fields = COI_SCHEMA[section]
+        if fields is None:
+            lines.append(f"  \"{section}\": \"...\"{comma}")
+            continue
+        lines.append(f"  \"{section}\": {{")
+        for j, field in enumerate(fields):
+            field_comma = "," if j < len(fields) - 1 else ""
+            if field in DATE_RANGE_FIELDS:
+                lines.append(f"    \"{field}\": {{ \"start\": \"...\", \"end\": \"...\" }}{field_comma}")
+            else:
+                lines.append(f"    \"{field}\": \"...\"{field_comma}")
+        lines.append(f"  }}{comma}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def build_prompt(sections=None, questions=None) -> str:
+    """
+    Return the system prompt for OpenAI extraction.
+
+    `sections` limits the schema to a subset of COI_SCHEMA; `questions` is an
+    optional block of field questions appended after the schema.
+    """
+    prompt = PROMPT_HEADER + render_schema(sections)
+    if questions:
+        prompt += "\nField-specific questions:\n" + questions + "\n"
+    return prompt + PROMPT_FOOTER
+
+
+def empty_record(sections=None) -> dict:
+    """A COI record with every field of `sections` set to an empty string."""
+    record = {}
+    for section, fields in COI_SCHEMA.items():
+        if sections is not None and section not in sections:
+            continue
+        if fields is None:
+            record[section] = ""
+        else:
+            record[section] = {
+                field: {"start": "", "end": ""} if field in DATE_RANGE_FIELDS else "" for field in fields
+            }
+    return record
+
+
+def validate_record(data: dict, sections=None):
+    """
+    Check an extracted record against COI_SCHEMA and return `(record, errors)`.
+
+    The record has every field of `sections` (all by default): missing fields
+    and nulls become empty strings, as the prompt asks, and numbers become
+    strings. `errors` lists structural problems the model made, such as a
+    section that is not an object or a value that is a list.
+    """
+    record, errors = empty_record(sections), []
+    for section, template in record.items():
+        value = data.get(section)
+        if value is None:
+            continue
+        if not isinstance(template, dict):
+            if _is_scalar(value):
+                record[section] = str(value)
+            else:
+                errors.append(f"{section}: expected a string")
+            continue
+        if not isinstance(value, dict):
+            errors.append(f"{section}: expected an object")
+            continue
+        for field, default in template.items():
+            field_value = value.get(field)
+            if field_value is None:
+                continue
+            if isinstance(default, dict):
+                if not isinstance(field_value, dict):
+                    errors.append(f"{section}.{field}: expected an object with start and end")
+                    continue
+                for part in default:
+                    part_value = field_value.get(part)
+                    if _is_scalar(part_value):
+                        record[section][field][part] = str(part_value)
+                    elif part_value is not None:
+                        errors.append(f"{section}.{field}.{part}: expected a string")
+            elif _is_scalar(field_value):
+                record[section][field] = str(field_value)
+            else:
+                errors.append(f"{section}.{field}: expected a string")
+    return record, errors
+
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
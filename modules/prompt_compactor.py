@@ -0,0 +1,165 @@
+import logging
+import re
+import threading
+from collections import Counter
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+PAGE_HEADER = re.compile(r"^### Page \d+\n", re.MULTILINE)
+SCHEMA_KEY = re.compile(r'"(\w+)"\s*:')
+
+# Standard ACORD 25 legal text that carries nothing the extractor needs. The cancellation
+# clause is deliberately absent: it is extracted as notice_of_cancellation.
+_BOILERPLATE_PHRASES = [
+    r"THIS CERTIFICATE IS ISSUED AS A MATTER OF INFORMATION ONLY .{0,600}? PRODUCER, AND THE CERTIFICATE HOLDER\.",
+    r"IMPORTANT: If the certificate holder is an ADDITIONAL INSURED, .{0,600}? endorsement\(s\)\.",
+    r"THIS IS TO CERTIFY THAT THE POLICIES OF INSURANCE LISTED BELOW .{0,800}? REDUCED BY PAID CLAIMS\.",
+    r"©\s*\d{4}(?:-\d{4})? ACORD CORPORATION\. All rights reserved\.",
+    r"The ACORD name and logo are registered marks of ACORD",
+]
+BOILERPLATE = [
+    re.compile(phrase.replace(" ", r"\s+"), re.IGNORECASE | re.DOTALL) for phrase in _BOILERPLATE_PHRASES
+]
+
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_EMPTY_TABLE_ROW = re.compile(r"^\|(?:\s*\|)+\s*$\n?", re.MULTILINE)
+_TABLE_RULE = re.compile(r"^[|\-:\s]+$")
+_STOPWORDS = {'name', 'start', 'end', 'full', 'text', 'type', 'amount', 'limit', 'each'}
+
+# Tokenizer per model name, loaded on first use; None when it could not be loaded
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Token count with the model's tokenizer when tiktoken can load it, else ~4 chars/token."""
+    encoding = _encoding_for(model) if tiktoken is not None else None
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+
+def _encoding_for(model):
+    if model in _encodings:
+        return _encodings[model]
+    # Locked so concurrent first prompts load (or download) the vocabulary once
+    with _encodings_lock:
+        if model not in _encodings:
+            _encodings[model] = _load_encoding(model)
+        return _encodings[model]
+
+
+def _load_encoding(model):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # A model tiktoken does not know yet; current OpenAI chat models share cl100k_base
+            logger.warning("No tokenizer known for %s; counting with cl100k_base", model)
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabulary on first use unless TIKTOKEN_CACHE_DIR already has it
+        logger.warning("Could not load the %s tokenizer, estimating tokens instead: %s", model, e)
+        return None
+
+
+def schema_keywords(system_prompt: str) -> set:
+    """Words from the JSON keys in the prompt's schema, used to score pages."""
+    words = set()
+    for key in SCHEMA_KEY.findall(system_prompt):
+        words.update(word for word in key.lower().split("_") if len(word) > 2 and word not in _STOPWORDS)
+    return words
+
+
+def split_pages(markdown: str):
+    """Split run_ocr output into per-page markdown, each keeping its `### Page N` header."""
+    starts = [m.start() for m in PAGE_HEADER.finditer(markdown)]
+    if not starts:
+        return [markdown]
+    return [markdown[start:end] for start, end in zip(starts, starts[1:] + [len(markdown)])]
+
+
+def clean_page(page: str) -> str:
+    for pattern in BOILERPLATE:
+        page = pattern.sub("", page)
+    page = "\n".join(_SPACES.sub(" ", line).strip() for line in page.split("\n"))
+    page = _EMPTY_TABLE_ROW.sub("", page)
+    return _BLANK_LINES.sub("\n\n", page)
+
+
+def drop_repeated_lines(pages):
+    """Remove lines (running headers, form titles) that repeat on later pages, keeping the first."""
+    if len(pages) < 2:
+        return pages
+    seen_on = Counter()
+    for page in pages:
+        seen_on.update({line for line in page.split("\n")[1:] if len(line) >= 8 and not _TABLE_RULE.match(line)})
+    threshold = max(2, len(pages) // 2)
+    repeated = {line for line, count in seen_on.items() if count >= threshold}
+
+    kept, seen = [], set()
+    for page in pages:
+        lines = page.split("\n")
+        body = []
+        for line in lines[1:]:
+            if line in repeated:
+                if line in seen:
+                    continue
+                seen.add(line)
+            body.append(line)
+        kept.append("\n".join([lines[0]] + body))
+    return kept
+
+
+def compact_markdown(markdown: str, system_prompt: str, token_budget: int, model: str = "gpt-4"):
+    """
+    Shrink OCR markdown to at most `token_budget` tokens before extraction.
+
+    Boilerplate and repeated lines are removed first. If that is not enough,
+    pages are ranked by how many schema keywords they mention (the first page,
+    the ACORD form face, always ranks first) and kept in rank order until the
+    budget runs out; kept pages are emitted in their original order. Returns
+    `(markdown, stats)`.
+    """
+    tokens_before = count_tokens(markdown, model)
+    pages = drop_repeated_lines([clean_page(page) for page in split_pages(markdown)])
+    page_tokens = [count_tokens(page, model) for page in pages]
+
+    if sum(page_tokens) > token_budget:
+        keywords = schema_keywords(system_prompt)
+        scores = [len(keywords.intersection(re.findall(r"[a-z]+", page.lower()))) for page in pages]
+        ranked = sorted(range(len(pages)), key=lambda i: (i != 0, -scores[i], i))
+
+        keep, remaining = {}, token_budget
+        for i in ranked:
+            if page_tokens[i] <= remaining:
+                keep[i] = pages[i]
+                remaining -= page_tokens[i]
+            elif remaining > 0 and i == ranked[0]:
+                keep[i] = _truncate(pages[i], remaining, model)
+                remaining = 0
+        pages = [keep[i] for i in sorted(keep)]
+
+    compacted = "".join(page if page.endswith("\n") else page + "\n" for page in pages)
+    stats = {'tokens_before': tokens_before, 'tokens_after': count_tokens(compacted, model),
+             'pages_before': len(page_tokens), 'pages_after': len(pages)}
+    logger.info("Compacted OCR markdown from %(tokens_before)d to %(tokens_after)d tokens "
+                "(%(pages_after)d of %(pages_before)d pages kept)", stats)
+    return compacted, stats
+
+
+def _truncate(page, budget, model):
+    lines, used = [], 0
+    for line in page.split("\n"):
+        cost = count_tokens(line + "\n", model)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
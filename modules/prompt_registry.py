@@ -0,0 +1,132 @@
+import glob
+import hashlib
+import os
+import threading
+import time
+
+from modules.prompt_builder import COI_SCHEMA, build_prompt
+from modules.question_loader import load_questions
+
+# Sections every document type keeps: the parties, the description and the cancellation notice
+_COMMON_SECTIONS = ["producer", "insured", "certificate_holder", "description_of_operations", "notice_of_cancellation"]
+
+PROFILES = {
+    "full": list(COI_SCHEMA),
+    "cgl": _COMMON_SECTIONS + ["commercial_general_liability"],
+    "auto": _COMMON_SECTIONS + ["automobile_liability"],
+    "umbrella": _COMMON_SECTIONS + ["umbrella_liability"],
+    "wc": _COMMON_SECTIONS + ["workers_compensation"],
+    "property": _COMMON_SECTIONS + ["property_insurance"],
+}
+
+# v1: the schema alone (the original prompt). v2: schema plus the field questions for its sections.
+VERSIONS = ("v1", "v2")
+
+
+class Prompt:
+    def __init__(self, version, profile, sections, text):
+        self.version = version
+        self.profile = profile
+        self.sections = sections
+        self.text = text
+        self.hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def to_dict(self):
+        return {'version': self.version, 'profile': self.profile, 'sections': self.sections,
+                'hash': self.hash, 'length': len(self.text)}
+
+
+class PromptRegistry:
+    """
+    Versioned system prompts built from `field_questions/*.txt`.
+
+    Question files are parsed once into a `{section: {field: question}}` map
+    and prompts are compiled on first use and memoised. The files' mtimes are
+    checked at most every `reload_interval` seconds and everything is rebuilt
+    when one changes, so edits go live without a restart.
+    """
+
+    def __init__(self, questions_dir, reload_interval=5.0):
+        self.questions_dir = questions_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._checked_at = 0.0
+        self._questions = {}
+        self._prompts = {}
+
+    def get(self, version="v1", profile="full"):
+        if version not in VERSIONS:
+            raise ValueError(f"Unknown prompt version: {version}")
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown prompt profile: {profile}")
+        with self._lock:
+            self._reload_if_changed()
+            prompt = self._prompts.get((version, profile))
+            if prompt is None:
+                prompt = self._compile(version, profile, PROFILES[profile])
+                self._prompts[(version, profile)] = prompt
+            return prompt
+
+    def for_sections(self, version, sections):
+        """A prompt restricted to an arbitrary list of COI_SCHEMA sections."""
+        if version not in VERSIONS:
+            raise ValueError(f"Unknown prompt version: {version}")
+        key = (version, tuple(sections))
+        with self._lock:
+            self._reload_if_changed()
+            prompt = self._prompts.get(key)
+            if prompt is None:
+                prompt = self._compile(version, "custom", sections)
+                self._prompts[key] = prompt
+            return prompt
+
+    def field_map(self):
+        with self._lock:
+            self._reload_if_changed()
+            return {section: dict(fields) for section, fields in self._questions.items()}
+
+    def _compile(self, version, profile, sections):
+        sections = [section for section in COI_SCHEMA if section in sections]
+        questions = None
+        if version == "v2":
+            questions = "\n".join(
+                f"- {field}: {question}"
+                for section in sections
+                for field, question in self._questions.get(section, {}).items()
+            )
+        return Prompt(version, profile, sections, build_prompt(sections, questions))
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self._mtimes is not None and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        paths = sorted(glob.glob(os.path.join(self.questions_dir, "*.txt")))
+        mtimes = {path: os.path.getmtime(path) for path in paths}
+        if mtimes == self._mtimes:
+            return
+
+        questions = {}
+        for path in paths:
+            for key, question in parse_questions(load_questions(path)):
+                section = _section_for(key)
+                if section:
+                    questions.setdefault(section, {})[key] = question
+        self._questions = questions
+        self._prompts = {}
+        self._mtimes = mtimes
+
+
+def parse_questions(text):
+    """Yield `(field_key, question)` pairs from `key: question` lines."""
+    for line in text.splitlines():
+        key, sep, question = line.partition(":")
+        if sep and key.strip() and " " not in key.strip():
+            yield key.strip(), question.strip()
+
+
+def _section_for(key):
+    """The COI_SCHEMA section a flat question key such as `workers_compensation_exclusion` belongs to."""
+    matches = [section for section in COI_SCHEMA if key == section or key.startswith(section + "_")]
+    return max(matches, key=len) if matches else None
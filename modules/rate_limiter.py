@@ -0,0 +1,365 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, highest first. Interactive uploads are admitted before bulk (batch) work.
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+_lane = contextvars.ContextVar("upstream_lane", default=INTERACTIVE)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream API is throttling or failing; `retry_after` is a hint in seconds (or None)."""
+
+    def __init__(self, upstream, message, retry_after=None):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+@contextmanager
+def lane(name):
+    """Run the block's upstream calls in priority lane `name` (see LANES)."""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane: {name}")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header, given as delta-seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `per_minute` units a minute with bursts of up to `capacity` (a minute's worth by default)."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available; a request larger than the burst waits for a full bucket."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single probe through: its success
+    closes the breaker, its failure opens it again. Not thread-safe on its own;
+    the Scheduler calls it under its lock.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def blocked_for(self, now):
+        """Seconds a caller must wait before it may call, 0 when it may go ahead."""
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and self._probing:
+            return self.reset_timeout
+        return 0.0
+
+    def admitted(self):
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def released(self):
+        """An admitted call ended without an outcome (it was cancelled); let another probe through."""
+        self._probing = False
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning("Circuit opened after %d consecutive failure(s)", self.failures)
+            self.state = OPEN
+            self.opened_at = now
+            self._probing = False
+
+
+class Scheduler:
+    """
+    Admission control and retries for calls to one upstream API.
+
+    Callers queue by lane and arrival order and are admitted when the
+    requests-per-minute and tokens-per-minute buckets allow (a limit of 0
+    disables that bucket). Errors of the `retryable` types (or of the types
+    a `retryable()` callable returns on first use) are retried with jittered
+    exponential backoff, or after the delay `retry_after(exc)` returns, which
+    also holds back every other caller. Repeated failures open the circuit
+    breaker; calls then fail fast with UpstreamUnavailable, as do calls that
+    run out of retries.
+    """
+
+    def __init__(self, name, requests_per_minute=0, tokens_per_minute=0, retries=3, backoff=0.5,
+                 max_backoff=30.0, retryable=(), retry_after=None, breaker=None):
+        self.name = name
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.breaker = breaker or CircuitBreaker()
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._waiting = []
+        # (loop, asyncio.Event) of coroutines in _aadmit, woken whenever the condition is notified
+        self._async_waiters = set()
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._lanes = {name: {'queued': 0, 'admitted': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+                       for name in LANES}
+        self._counts = {'calls': 0, 'failures': 0, 'rejected': 0}
+
+    def call(self, fn, *args, tokens=0, **kwargs):
+        """Call `fn(*args, **kwargs)` once admitted, retrying transient errors."""
+        for attempt in range(self.retries + 1):
+            self._admit(tokens)
+            try:
+                result = fn(*args, **kwargs)
+            except self._retryable() as e:
+                delay = self.retry_after(e) if self.retry_after else None
+                self._failed(delay)
+                logger.warning("%s call failed (attempt %d): %s", self.name, attempt + 1, e)
+                if attempt == self.retries:
+                    raise UpstreamUnavailable(self.name, f"❌ {self.name} is unavailable: {e}",
+                                              retry_after=delay or self.backoff * 2 ** attempt) from e
+                if delay is None:
+                    delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                time.sleep(delay)
+            except Exception:
+                # The upstream answered; the request itself was bad
+                self._succeeded()
+                raise
+            else:
+                self._succeeded()
+                return result
+
+    async def acall(self, fn, *args, tokens=0, **kwargs):
+        """`call()` for a coroutine function: admission, retries and backoff without blocking the event loop."""
+        for attempt in range(self.retries + 1):
+            await self._aadmit(tokens)
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                with self._cond:
+                    self.breaker.released()
+                    self._notify()
+                raise
+            except self._retryable() as e:
+                delay = self.retry_after(e) if self.retry_after else None
+                self._failed(delay)
+                logger.warning("%s call failed (attempt %d): %s", self.name, attempt + 1, e)
+                if attempt == self.retries:
+                    raise UpstreamUnavailable(self.name, f"❌ {self.name} is unavailable: {e}",
+                                              retry_after=delay or self.backoff * 2 ** attempt) from e
+                if delay is None:
+                    delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                await asyncio.sleep(delay)
+            except Exception:
+                self._succeeded()
+                raise
+            else:
+                self._succeeded()
+                return result
+
+    def _retryable(self):
+        # A callable is resolved on the first call, so SDK exception types load with the SDK
+        if callable(self.retryable) and not isinstance(self.retryable, type):
+            self.retryable = tuple(self.retryable())
+        return self.retryable
+
+    def adjust_tokens(self, amount):
+        """Return `amount` over-reserved tokens (estimate minus actual usage) to the bucket."""
+        if self._tokens is not None and amount > 0:
+            with self._cond:
+                self._tokens.give_back(amount)
+                self._notify()
+
+    def stats(self):
+        with self._cond:
+            lanes = {}
+            for name, entry in self._lanes.items():
+                average = entry['wait_seconds'] / entry['admitted'] if entry['admitted'] else 0.0
+                lanes[name] = dict(entry, wait_seconds=round(entry['wait_seconds'], 3),
+                                   max_wait_seconds=round(entry['max_wait_seconds'], 3),
+                                   avg_wait_seconds=round(average, 3))
+            return dict(self._counts, queue_depth=len(self._waiting), lanes=lanes, breaker=self.breaker.state,
+                        paused_seconds=round(max(self._paused_until - time.monotonic(), 0.0), 3))
+
+    # --- internals ---
+    def _admit(self, tokens):
+        lane_name = current_lane()
+        ticket = (LANES.index(lane_name), next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            self._join(ticket, lane_name)
+            try:
+                while True:
+                    delay = self._admission_delay(ticket, tokens)
+                    if delay is not None and delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                self._take(tokens, lane_name, start)
+            finally:
+                self._leave(ticket, lane_name)
+
+    async def _aadmit(self, tokens):
+        # Same queue as _admit; a coroutine cannot wait on the condition, so it waits on an Event
+        lane_name = current_lane()
+        ticket = (LANES.index(lane_name), next(self._seq))
+        start = time.monotonic()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._join(ticket, lane_name)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._admission_delay(ticket, tokens)
+                    if delay is not None and delay <= 0:
+                        self._take(tokens, lane_name, start)
+                        return
+                    waiter[1].clear()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                self._leave(ticket, lane_name)
+
+    def _join(self, ticket, lane_name):
+        heapq.heappush(self._waiting, ticket)
+        self._lanes[lane_name]['queued'] += 1
+
+    def _admission_delay(self, ticket, tokens):
+        """Seconds until `ticket` may go (0 or less: now), None while others are ahead of it. Hold _cond."""
+        now = time.monotonic()
+        blocked = self.breaker.blocked_for(now)
+        if blocked:
+            self._counts['rejected'] += 1
+            raise UpstreamUnavailable(self.name, f"❌ {self.name} is unavailable (circuit open)",
+                                      retry_after=round(blocked, 1))
+        if self._waiting[0] != ticket:
+            return None
+        return max(self._paused_until - now,
+                   self._requests.wait_time(1, now) if self._requests else 0.0,
+                   self._tokens.wait_time(tokens, now) if self._tokens else 0.0)
+
+    def _take(self, tokens, lane_name, start):
+        now = time.monotonic()
+        if self._requests:
+            self._requests.take(1, now)
+        if self._tokens:
+            self._tokens.take(tokens, now)
+        self.breaker.admitted()
+        self._counts['calls'] += 1
+        waited = now - start
+        entry = self._lanes[lane_name]
+        entry['admitted'] += 1
+        entry['wait_seconds'] += waited
+        entry['max_wait_seconds'] = max(entry['max_wait_seconds'], waited)
+
+    def _leave(self, ticket, lane_name):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._lanes[lane_name]['queued'] -= 1
+        self._notify()
+
+    def _notify(self):
+        # Hold _cond. Threads wait on the condition, coroutines on an Event set on their own loop.
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _failed(self, retry_after):
+        with self._cond:
+            now = time.monotonic()
+            self._counts['failures'] += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self.breaker.record_failure(now)
+            self._notify()
+
+    def _succeeded(self):
+        with self._cond:
+            self.breaker.record_success()
+            self._notify()
+
+
+schedulers = {}
+
+
+def register(scheduler):
+    """Make a scheduler's metrics available through `all_stats()`."""
+    schedulers[scheduler.name] = scheduler
+    return scheduler
+
+
+def all_stats():
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}
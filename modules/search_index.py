@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from modules.prompt_builder import COI_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# One FTS column per extracted field ("<section>__<field>", or the section for
+# top-level strings) plus the OCR text, so field-scoped queries are column filters.
+FIELD_COLUMNS = [
+    section if fields is None else f"{section}__{field}"
+    for section, fields in COI_SCHEMA.items()
+    for field in (fields or [None])
+]
+OCR_COLUMN = "ocr"
+COLUMNS = FIELD_COLUMNS + [OCR_COLUMN]
+# bm25 column weights: a hit in an extracted field outranks one in the OCR text
+_BM25_WEIGHTS = ", ".join(["1.0"] * len(FIELD_COLUMNS) + ["0.3"])
+# Prefix indexes make term* queries of 2-4 characters an index lookup instead of a vocabulary scan
+_FTS_OPTIONS = "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'"
+# Stored in search_meta; a different value rebuilds the index
+_SCHEMA = ",".join(COLUMNS) + ";" + _FTS_OPTIONS
+
+# field:term, "quoted phrase", term* (prefix) and term~ (fuzzy)
+_TOKEN_RE = re.compile(r'(?:(?P<scope>[\w.]+):)?(?:"(?P<phrase>[^"]*)"|(?P<term>[^\s"]+))')
+_WORD_RE = re.compile(r"\w")
+
+
+def record_values(record):
+    """Map each FIELD_COLUMN to the text indexed for it in an extracted record."""
+    values = {}
+    for section, fields in COI_SCHEMA.items():
+        section_data = record.get(section)
+        if fields is None:
+            values[section] = section_data if isinstance(section_data, str) else ""
+            continue
+        section_data = section_data if isinstance(section_data, dict) else {}
+        for field in fields:
+            value = section_data.get(field)
+            if isinstance(value, dict):
+                value = " ".join(str(v) for v in value.values() if v)
+            values[f"{section}__{field}"] = value if isinstance(value, str) else ""
+    return values
+
+
+def scope_columns(scope):
+    """
+    Columns a `scope:` prefix searches: an exact column ("property_insurance__limit"
+    or "property_insurance.limit"), every field of a section, or every field whose
+    name is or starts with the scope, so `insurer:` covers insurer and insurer_name.
+    """
+    scope = scope.lower().replace(".", "__")
+    if scope in COLUMNS:
+        return [scope]
+    columns = [c for c in FIELD_COLUMNS if c.split("__")[0] == scope]
+    if not columns:
+        columns = [c for c in FIELD_COLUMNS
+                   if "__" in c and (c.split("__")[1] == scope or c.split("__")[1].startswith(scope + "_"))]
+    if not columns:
+        raise ValueError(f"Unknown search field: {scope}")
+    return columns
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of `a` and `b`, or `limit + 1` as soon as it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """
+    Full-text index of extracted certificates in SQLite FTS5.
+
+    Each document is one row holding its fields and OCR text; the index is
+    updated whenever a document's JSON is written or deleted. Query syntax:
+
+        travelers                   any field or the OCR text
+        insurer:travelers           field-scoped (see scope_columns)
+        "acme property"             phrase
+        trav*                       prefix
+        travelrs~                   fuzzy: terms within one or two edits
+    """
+
+    def __init__(self, path, rank_candidates=5000):
+        self.path = path
+        self.rank_candidates = rank_candidates
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM search_meta WHERE key = 'columns'").fetchone()
+            if row is not None and row[0] != _SCHEMA:
+                # The schema changed: start over, sync() re-indexes the files
+                logger.warning("Search index schema changed; rebuilding %s", path)
+                conn.execute("DROP TABLE IF EXISTS search_vocab")
+                conn.execute("DROP TABLE IF EXISTS search_entries")
+                conn.execute("DELETE FROM search_docs")
+            conn.execute("CREATE TABLE IF NOT EXISTS search_docs (id INTEGER PRIMARY KEY, filename TEXT UNIQUE NOT NULL)")
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS search_entries USING fts5({', '.join(COLUMNS)}, {_FTS_OPTIONS})")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_vocab USING fts5vocab(search_entries, 'row')")
+            conn.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('columns', ?)", (_SCHEMA,))
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, filename, record, ocr_text=None):
+        """(Re-)index a document. The stored OCR text is kept when `ocr_text` is None."""
+        values = record_values(record)
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO search_docs (filename) VALUES (?)", (filename,))
+            doc_id = conn.execute("SELECT id FROM search_docs WHERE filename = ?", (filename,)).fetchone()[0]
+            if ocr_text is None:
+                row = conn.execute(f"SELECT {OCR_COLUMN} FROM search_entries WHERE rowid = ?", (doc_id,)).fetchone()
+                ocr_text = row[0] if row else ""
+            conn.execute("DELETE FROM search_entries WHERE rowid = ?", (doc_id,))
+            conn.execute(
+                f"INSERT INTO search_entries (rowid, {', '.join(COLUMNS)}) VALUES (?{', ?' * len(COLUMNS)})",
+                [doc_id] + [values[c] for c in FIELD_COLUMNS] + [ocr_text],
+            )
+
+    def delete(self, filename):
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT id FROM search_docs WHERE filename = ?", (filename,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM search_entries WHERE rowid = ?", (row[0],))
+            conn.execute("DELETE FROM search_docs WHERE id = ?", (row[0],))
+        return True
+
+    def close(self):
+        """Close the calling thread's connection (see SQLiteDocumentStore.close)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def filenames(self):
+        return {row[0] for row in self._connect().execute("SELECT filename FROM search_docs")}
+
+    def sync(self, json_dir):
+        """Index files of `json_dir` missing from the index and drop entries whose file is gone."""
+        on_disk = {name for name in os.listdir(json_dir) if name.endswith(".json")}
+        indexed = self.filenames()
+        for name in sorted(on_disk - indexed):
+            try:
+                with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Not indexing unreadable file %s", name)
+                continue
+            if isinstance(record, dict):
+                self.update(name, record)
+        for name in indexed - on_disk:
+            self.delete(name)
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Documents matching `query`, best first: `[{filename, score, snippet}]`.
+
+        bm25 costs time per matching row, so when more than `rank_candidates`
+        documents match, only the most recently indexed `rank_candidates` of
+        them are ranked; the rowid bound is found from the doclist alone.
+        """
+        expression = self.compile(query)
+        conn = self._connect()
+        floor = conn.execute(
+            "SELECT rowid FROM search_entries WHERE search_entries MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (expression, self.rank_candidates - 1),
+        ).fetchone()
+        ranked = conn.execute(
+            f"SELECT rowid, bm25(search_entries, {_BM25_WEIGHTS}) AS score FROM search_entries "
+            "WHERE search_entries MATCH ? AND rowid >= ? ORDER BY score LIMIT ? OFFSET ?",
+            (expression, floor[0] if floor else 0, limit, offset),
+        ).fetchall()
+        if not ranked:
+            return []
+        # Filenames and snippets only for the page, not for every ranked row
+        ids = [row['rowid'] for row in ranked]
+        details = {row['id']: row for row in conn.execute(
+            "SELECT d.id, d.filename, snippet(search_entries, -1, '[', ']', '…', 12) AS snippet "
+            "FROM search_entries JOIN search_docs d ON d.id = search_entries.rowid "
+            f"WHERE search_entries MATCH ? AND search_entries.rowid IN ({', '.join('?' * len(ids))})",
+            [expression] + ids,
+        )}
+        return [{'filename': details[row['rowid']]['filename'], 'score': round(-row['score'], 4),
+                 'snippet': details[row['rowid']]['snippet']}
+                for row in ranked if row['rowid'] in details]
+
+    def compile(self, query):
+        """Translate the query syntax into an FTS5 MATCH expression; every term must match."""
+        clauses = []
+        for match in _TOKEN_RE.finditer(query or ""):
+            scope, phrase, term = match.group('scope'), match.group('phrase'), match.group('term')
+            # Punctuation and operators alone ("*", "~", "-", "()") have nothing to match
+            if not _WORD_RE.search(phrase if phrase is not None else term):
+                continue
+            if phrase is not None:
+                expression = _quote(phrase)
+            elif term.endswith("*") and _WORD_RE.search(term.rstrip("*")):
+                expression = _quote(term.rstrip("*")) + " *"
+            elif term.endswith("~") and _WORD_RE.search(term.rstrip("~")):
+                expression = self._fuzzy(term.rstrip("~"))
+            else:
+                expression = _quote(term.strip("*~"))
+            if scope:
+                expression = "{" + " ".join(scope_columns(scope)) + "} : (" + expression + ")"
+            clauses.append(expression)
+        if not clauses:
+            raise ValueError("Empty search query")
+        return " AND ".join(clauses)
+
+    def _fuzzy(self, term):
+        """
+        An OR of the indexed terms within one edit (two for terms over five
+        characters). Candidates share the term's first two characters, which
+        keeps the vocabulary scan to a narrow range.
+        """
+        term = term.lower()
+        limit = 1 if len(term) <= 5 else 2
+        prefix = term[:2]
+        rows = self._connect().execute(
+            "SELECT term FROM search_vocab WHERE term >= ? AND term < ?", (prefix, prefix + "￿"))
+        matches = [row[0] for row in rows if edit_distance(term, row[0], limit) <= limit]
+        # Parenthesised: FTS5 binds AND tighter than OR, and compile() ANDs the clauses
+        return "(" + " OR ".join(_quote(t) for t in matches or [term]) + ")"
@@ -0,0 +1,150 @@
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.openai_module import chat_completion
+from modules.prompt_builder import empty_record
+from modules.prompt_compactor import schema_keywords, split_pages
+from modules.rate_limiter import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Schema sections requested together in one call. Groups are small enough for short
+# prompts and replies but keep sections that share a table on the form together.
+SECTION_GROUPS = {
+    "parties": ["producer", "insured", "certificate_holder"],
+    "general_liability": ["commercial_general_liability"],
+    "auto_umbrella": ["automobile_liability", "umbrella_liability"],
+    "workers_compensation": ["workers_compensation"],
+    "property": ["property_insurance"],
+    "operations": ["description_of_operations", "notice_of_cancellation"],
+}
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_json_reply(content: str) -> dict:
+    """Parse a model reply as a JSON object, tolerating a ```json fence around it."""
+    data = json.loads(_CODE_FENCE.sub("", content.strip()))
+    if not isinstance(data, dict):
+        raise ValueError("Model reply is not a JSON object")
+    return data
+
+
+def relevant_pages(markdown: str, system_prompt: str) -> str:
+    """The first page plus every page that mentions one of the prompt's schema keywords."""
+    pages = split_pages(markdown)
+    keywords = schema_keywords(system_prompt)
+    kept = [page for i, page in enumerate(pages)
+            if i == 0 or keywords.intersection(re.findall(r"[a-z]+", page.lower()))]
+    return "".join(kept)
+
+
+def extract_sectioned(markdown, prompt_for, sections=None, max_workers=6, retries=2, complete=chat_completion):
+    """
+    Extract a COI record with one concurrent model call per section group.
+
+    `prompt_for(sections)` returns the system prompt for a list of schema
+    sections. Each group only sees the OCR pages relevant to it and is retried
+    on its own when the call fails or the reply is not valid JSON; a group that
+    still fails leaves its sections empty instead of failing the document.
+    Returns `(record, report)` where `report` maps group name to timing, token
+    usage, attempts and any error.
+    """
+    groups = _section_groups(sections)
+
+    def run_group(name, group):
+        system_prompt = prompt_for(group)
+        user_input = relevant_pages(markdown, system_prompt)
+        entry = {'sections': group, 'attempts': 0, 'usage': {}, 'error': None}
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            entry['attempts'] = attempt + 1
+            try:
+                content, usage = complete(system_prompt, user_input)
+                return _accept_reply(group, content, usage, entry, start)
+            except UpstreamUnavailable:
+                # Already retried by the scheduler; fail the document rather than leave sections empty
+                raise
+            except Exception as e:
+                entry['error'] = str(e)
+                logger.warning("Section group %s failed (attempt %d): %s", name, attempt + 1, e)
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        return {}, entry
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="section") as pool:
+        futures = {name: pool.submit(contextvars.copy_context().run, run_group, name, group)
+                   for name, group in groups.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    return _merge(sections, results)
+
+
+async def aextract_sectioned(markdown, prompt_for, complete, sections=None, retries=2):
+    """extract_sectioned with a coroutine `complete`: the groups run as tasks on the caller's loop."""
+    groups = _section_groups(sections)
+
+    async def run_group(name, group):
+        system_prompt = prompt_for(group)
+        user_input = relevant_pages(markdown, system_prompt)
+        entry = {'sections': group, 'attempts': 0, 'usage': {}, 'error': None}
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            entry['attempts'] = attempt + 1
+            try:
+                content, usage = await complete(system_prompt, user_input)
+                return _accept_reply(group, content, usage, entry, start)
+            except (UpstreamUnavailable, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                entry['error'] = str(e)
+                logger.warning("Section group %s failed (attempt %d): %s", name, attempt + 1, e)
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        return {}, entry
+
+    tasks = {name: asyncio.ensure_future(run_group(name, group)) for name, group in groups.items()}
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        # One group hit an unavailable upstream or the document was cancelled: stop the others too
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return _merge(sections, {name: task.result() for name, task in tasks.items()})
+
+
+def _section_groups(sections):
+    groups = {
+        name: [section for section in group if sections is None or section in sections]
+        for name, group in SECTION_GROUPS.items()
+    }
+    return {name: group for name, group in groups.items() if group}
+
+
+def _accept_reply(group, content, usage, entry, start):
+    """The group's sections from a reply, recording its usage in `entry`; raises if the reply is not JSON."""
+    for key, value in usage.items():
+        entry['usage'][key] = entry['usage'].get(key, 0) + value
+    data = parse_json_reply(content)
+    entry['error'] = None
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return {section: data[section] for section in group if section in data}, entry
+
+
+def _merge(sections, results):
+    """Combine the `(partial, entry)` of each group into `(record, report)`."""
+    record = empty_record(sections)
+    report = {}
+    for name, (partial, entry) in results.items():
+        for section, value in partial.items():
+            if isinstance(record[section], dict) and isinstance(value, dict):
+                record[section].update(value)
+            else:
+                record[section] = value
+        report[name] = entry
+
+    logger.info("Sectioned extraction: %s", json.dumps(report))
+    return record, report
@@ -108,26 +108,37 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    async function loadDocuments() {
-        try {
-            const response = await fetch('/get_documents');
-            const documents = await response.json();
-            documentsTableBody.innerHTML = '';
-            document.getElementById('total-docs').textContent = documents.length; // Update total documents count
-
-            const finishedDocuments = documents.filter(doc => doc.status === 'verified');
-            document.getElementById('finished-docs').textContent = finishedDocuments.length; // Update finished documents count
-
-            const uploadedDocuments = documents.filter(doc => doc.status === 'uploaded');
-            document.getElementById('awaiting-verification').textContent = uploadedDocuments.length; // Update awaiting verification count
+    const DOCUMENTS_PAGE_SIZE = 50;
+    let nextDocumentsCursor = null;
 
-            const inProgressDocuments = documents.filter(doc => doc.status === 'in_progress');
-            document.getElementById('being-analyzed').textContent = inProgressDocuments.length; // Update being analyzed count
-
-            if (documents.error) {
-                throw new Error(documents.error);
+    async function loadDocuments(append = false) {
+        try {
+            const params = new URLSearchParams({ limit: DOCUMENTS_PAGE_SIZE });
+            if (append && nextDocumentsCursor) {
+                params.set('cursor', nextDocumentsCursor);
             }
-            if (documents.length === 0) {
+            const response = await fetch(`/get_documents?${params}`);
+            const page = await response.json();
+            if (page.error) {
+                throw new Error(page.error);
+            }
+            const documents = page.documents;
+            nextDocumentsCursor = page.next_cursor;
+
+            // Counts come from the server so they cover every page, not just the loaded ones
+            const counts = page.status_counts || {};
+            const total = Object.values(counts).reduce((sum, count) => sum + count, 0);
+            document.getElementById('total-docs').textContent = total; // Update total documents count
+            document.getElementById('finished-docs').textContent = counts.verified || 0; // Update finished documents count
+            document.getElementById('awaiting-verification').textContent = counts.uploaded || 0; // Update awaiting verification count
+            document.getElementById('being-analyzed').textContent = counts.in_progress || 0; // Update being analyzed count
+
+            if (!append) {
+                documentsTableBody.innerHTML = '';
+            }
+            documentsTableBody.querySelector('.load-more-row')?.remove();
+
+            if (documents.length === 0 && !append) {
                 documentsTableBody.innerHTML = '<tr><td colspan="8" class="text-center">No documents found.</td></tr>';
             } else {
                 documents.forEach(doc => {
@@ -168,6 +179,14 @@ document.addEventListener('DOMContentLoaded', function () {
                     }
                 });
             }
+
+            if (nextDocumentsCursor) {
+                const loadMoreRow = document.createElement('tr');
+                loadMoreRow.className = 'load-more-row';
+                loadMoreRow.innerHTML = '<td colspan="8" class="text-center"><button class="action-btn">Load more</button></td>';
+                loadMoreRow.querySelector('button').addEventListener('click', () => loadDocuments(true));
+                documentsTableBody.appendChild(loadMoreRow);
+            }
         } catch (error) {
             console.error('Failed to load documents:', error);
             documentsTableBody.innerHTML = '<tr><td colspan="8" class="text-center">Failed to load documents.</td></tr>';
@@ -436,6 +455,27 @@ document.addEventListener('DOMContentLoaded', function () {
         return json;
     }
 
+    // Merge patch (RFC 7396) with the fields of `after` that differ from `before`.
+    // The form never removes fields, so no deletions (nulls) are emitted.
+    function mergePatchDiff(before, after) {
+        const patch = {};
+        for (const [key, value] of Object.entries(after)) {
+            const old = before ? before[key] : undefined;
+            const isObject = v => v !== null && typeof v === 'object' && !Array.isArray(v);
+            if (isObject(value) && isObject(old)) {
+                const nested = mergePatchDiff(old, value);
+                if (Object.keys(nested).length) patch[key] = nested;
+            } else if (JSON.stringify(value) !== JSON.stringify(old)) {
+                patch[key] = value;
+            }
+        }
+        return patch;
+    }
+
+    // The JSON as loaded or last saved, and its version (ETag) for If-Match
+    let loadedJson = null;
+    let loadedVersion = null;
+
     // --- EVENT LISTENERS ---
     backToLibraryLink?.addEventListener('click', (e) => {
         e.preventDefault();
@@ -455,7 +495,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         const submitBtn = document.getElementById('upload-submit-btn');
         const originalBtnContent = submitBtn.innerHTML;
-        let response; // Declare response here to make it accessible in finally block
+        let processed = false; // Set once the job is done, so the finally block knows whether to re-enable
 
         // Disable button and show spinner
         submitBtn.disabled = true;
@@ -473,6 +513,9 @@ document.addEventListener('DOMContentLoaded', function () {
             const response = await fetch('/upload', { method: 'POST', body: formData });
             const data = await response.json();
             if (data.error) throw new Error(data.error);
+            submitBtn.querySelector('span').textContent = 'Processing...';
+            await waitForJob(data.job_id);
+            processed = true;
             alert('File uploaded and processed successfully!');
             resetUploadForm();
             loadDocuments();
@@ -484,13 +527,25 @@ document.addEventListener('DOMContentLoaded', function () {
             // Restore original button content
             submitBtn.innerHTML = originalBtnContent;
             // The resetUploadForm function will handle re-disabling the button on success.
-            // If the upload failed (response is falsy or not ok), re-enable the button.
-            if (!response || !response.ok) {
-                 submitBtn.disabled = false;
+            // If the upload or its job failed, re-enable the button so the file can be retried.
+            if (!processed) {
+                submitBtn.disabled = false;
             }
         }
     });
 
+    // Poll a background extraction job until it finishes
+    async function waitForJob(jobId, intervalMs = 2000) {
+        while (true) {
+            const response = await fetch(`/jobs/${jobId}`);
+            const job = await response.json();
+            if (job.error && job.status !== 'failed') throw new Error(job.error);
+            if (job.status === 'done') return job;
+            if (job.status === 'failed') throw new Error(job.error || 'Processing failed');
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+
     processedFilesDropdown?.addEventListener('change', async () => {
         const selectedFile = processedFilesDropdown.value;
 
@@ -502,6 +557,8 @@ document.addEventListener('DOMContentLoaded', function () {
                 const response = await fetch(`/get_json/${selectedFile}`);
                 const data = await response.json();
                 if (data.error) throw new Error(data.error);
+                loadedJson = data;
+                loadedVersion = response.headers.get('ETag');
                 jsonFormContainer.innerHTML = ''; // Clear loading message
                 buildForm(data, jsonFormContainer);
             } catch (error) {
@@ -524,16 +581,23 @@ document.addEventListener('DOMContentLoaded', function () {
             try {
                 // Assuming you have the current JSON data from the form
                 const currentJsonData = getJsonFromForm(jsonFormContainer); // You might need to adjust this based on your form structure
-                console.log('JSON data to be sent:', currentJsonData);
-
-                const response = await fetch(`/save_json/${currentFilename}`, {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify(currentJsonData)
+                const changes = mergePatchDiff(loadedJson, currentJsonData);
+                console.log('JSON changes to be sent:', changes);
+
+                const headers = {'Content-Type': 'application/merge-patch+json'};
+                if (loadedVersion) headers['If-Match'] = loadedVersion;
+                const response = await fetch(`/patch_json/${currentFilename}`, {
+                    method: 'PATCH',
+                    headers,
+                    body: JSON.stringify(changes)
                 });
                 if (response.ok) {
+                    loadedJson = currentJsonData;
+                    loadedVersion = response.headers.get('ETag');
                     console.log('Document status updated to in_progress');
                     loadDocuments(); // Refresh table
+                } else if (response.status === 412) {
+                    alert('This document was changed elsewhere since you opened it. Reload it before saving again.');
                 } else {
                     console.error('Failed to update status:', await response.text());
                 }
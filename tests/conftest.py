@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# The app imports its helpers as `modules.*` from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """
+    The Flask app module with its stores, cache and folders under `tmp_path`,
+    which is also the working directory. Stores open on first use as in
+    production; they are closed and forgotten after the test.
+    """
+    monkeypatch.chdir(tmp_path)
+    # Read once, by whichever test imports the app first: no background threads, no journal
+    monkeypatch.setenv("APP_PRELOAD", "1")
+    monkeypatch.setenv("JOB_JOURNAL", "")
+    import app
+
+    monkeypatch.setattr(app, "DOCUMENT_STORE", f"sqlite:///{tmp_path / 'documents.db'}")
+    monkeypatch.setattr(app, "DOCUMENTS_DB", str(tmp_path / "documents.json"))
+    monkeypatch.setattr(app, "SEARCH_INDEX", str(tmp_path / "search.db"))
+    monkeypatch.setattr(app, "CACHE_DIR", str(tmp_path / "cache"))
+    for name in ("_document_store", "_search_index", "_extraction_cache", "_pdf_exporter"):
+        monkeypatch.setattr(app, name, None)
+    os.makedirs(app.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(app.OUTPUT_JSON_DIR, exist_ok=True)
+    yield app
+    for store in (app._document_store, app._search_index):
+        if store is not None:
+            store.close()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
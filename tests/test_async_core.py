@@ -0,0 +1,150 @@
+import asyncio
+import threading
+
+import pytest
+
+from modules import async_core, metrics, ocr_module, openai_module
+from modules.async_core import AsyncCore
+from modules.rate_limiter import UpstreamUnavailable
+
+
+class FakeVision:
+    """
+    Stands in for the Vision call: a document of `total_pages` pages, served
+    `latency` seconds after each request. Requests that include `fail_page`
+    fail at once. Records the page lists, the cancelled requests and the most
+    requests in flight.
+    """
+
+    def __init__(self, total_pages, latency=0.01, fail_page=None):
+        self.total_pages = total_pages
+        self.latency = latency
+        self.fail_page = fail_page
+        self.calls = []
+        self.cancelled = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, pages):
+        self.calls.append(pages)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            if pages and self.fail_page in pages:
+                raise ValueError(f"unreadable page {self.fail_page}")
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        pages = pages or range(1, min(self.total_pages, 5) + 1)
+        return self.total_pages, [{'text': f"text of page {n}"} for n in pages]
+
+
+@pytest.fixture
+def core():
+    core = AsyncCore(vision_concurrency=2, openai_concurrency=2)
+    yield core
+    core.close()
+
+
+@pytest.fixture
+def vision(core, monkeypatch):
+    vision = FakeVision(total_pages=12)
+    # The request is just the page list; the fake's response is already (total_pages, annotations)
+    monkeypatch.setattr(ocr_module, "annotate_request", lambda pdf_content, pages: pages)
+    monkeypatch.setattr(ocr_module, "file_annotations", lambda response: response)
+    monkeypatch.setattr(ocr_module, "OCR_CHUNK_PAGES", 2)
+    monkeypatch.setattr(core, "_batch_annotate", lambda pages: vision(pages))
+    return vision
+
+
+def test_submit_and_run_use_the_core_loop_thread(core):
+    async def where():
+        return threading.current_thread().name
+
+    assert core.run(where()) == "async-core"
+    assert core.submit(where()).result() == "async-core"
+
+
+def test_to_thread_keeps_the_callers_trace_id(core):
+    async def traced():
+        with metrics.trace("abc"):
+            return await core.to_thread(metrics.current_trace_id)
+
+    assert core.run(traced()) == "abc"
+
+
+def test_ocr_returns_every_page_in_order(core, vision):
+    markdown = core.run(core.ocr(b"%PDF"))
+
+    positions = [markdown.index(f"### Page {n}\n") for n in range(1, 13)]
+    assert positions == sorted(positions)
+    assert vision.calls[0] is None
+    assert sorted(vision.calls[1:]) == [[6, 7], [8, 9], [10, 11], [12]]
+
+
+def test_vision_requests_in_flight_are_capped(core, vision):
+    documents = [core.submit(core.ocr(b"%PDF")) for _ in range(3)]
+    for document in documents:
+        document.result()
+
+    assert vision.peak == 2
+
+
+def test_a_failed_chunk_cancels_the_others(core, vision):
+    vision.fail_page = 6
+    vision.latency = 0.5
+
+    with pytest.raises(ValueError, match="unreadable page 6"):
+        core.run(core.ocr(b"%PDF"))
+    # Apart from the opening request and the failed chunk, every request that started was cut short
+    assert vision.cancelled == len(vision.calls) - 2
+
+
+def test_ocr_stage_timeout_raises_upstream_unavailable(core, vision, monkeypatch):
+    monkeypatch.setattr(async_core, "OCR_STAGE_TIMEOUT", 0.02)
+    vision.latency = 1
+
+    with pytest.raises(UpstreamUnavailable, match="did not finish") as raised:
+        core.run(core.ocr(b"%PDF"))
+    assert raised.value.upstream == "vision"
+    assert vision.cancelled == 1
+
+
+def test_complete_returns_content_and_usage(core, monkeypatch):
+    in_flight, peak = 0, 0
+
+    async def acreate(system_prompt, user_input):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {'choices': [{'message': {'content': user_input}}],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': 2, 'total_tokens': 12}}
+
+    monkeypatch.setattr(openai_module, "estimate_tokens", lambda system_prompt, user_input: 100)
+    monkeypatch.setattr(core, "_acreate", acreate)
+
+    async def many():
+        return await asyncio.gather(*(core.complete("system", f"doc {n}") for n in range(5)))
+
+    results = core.run(many())
+    assert [content for content, _ in results] == [f"doc {n}" for n in range(5)]
+    assert results[0][1]['total_tokens'] == 12
+    assert peak == 2
+
+
+def test_close_stops_the_loop_and_a_new_call_starts_another(core):
+    async def running_loop():
+        return asyncio.get_running_loop()
+
+    first = core.run(running_loop())
+    thread = core._thread
+    core.close()
+
+    assert not thread.is_alive()
+    assert first.is_closed()
+    assert core.run(running_loop()) is not first
@@ -0,0 +1,157 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+from modules.coverage_facts import coverage_facts, days_until, parse_date, parse_money
+from modules.document_store import SQLiteDocumentStore
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("$1,000,000", 1_000_000),
+    ("1000000.00", 1_000_000),
+    ("$1M", 1_000_000),
+    ("$1.5M", 1_500_000),
+    ("2 MILLION", 2_000_000),
+    ("$500K", 500_000),
+    ("$2,000,000 / $4,000,000", 2_000_000),
+    ("Statutory", None),
+    ("N/A", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_money(text, amount):
+    assert parse_money(text) == amount
+
+
+@pytest.mark.parametrize("text, day", [
+    ("01/15/2026", date(2026, 1, 15)),
+    ("1/5/26", date(2026, 1, 5)),
+    ("2026-03-01", date(2026, 3, 1)),
+    ("03-01-2026", date(2026, 3, 1)),
+    ("03.01.2026", date(2026, 3, 1)),
+    ("March 1, 2026", date(2026, 3, 1)),
+    ("Mar. 1, 2026", date(2026, 3, 1)),
+    ("1 March 2026", date(2026, 3, 1)),
+    ("From 01/01/2026 to 01/01/2027", date(2026, 1, 1)),
+    ("13/45/2026", None),
+    ("TBD", None),
+    (None, None),
+])
+def test_parse_date_normalises_certificate_layouts(text, day):
+    assert parse_date(text) == day
+
+
+def record(end, occurrence="$1,000,000", auto_end=None):
+    return {
+        'insured': {'name': "Acme"},
+        'commercial_general_liability': {
+            'policy_number': " GL-1 ", 'insurer_name': "Travelers",
+            'effective_date': {'start': "01/01/2026", 'end': end},
+            'each_occurrence': occurrence, 'general_aggregate_limit': "Included",
+        },
+        'automobile_liability': {'insurer_name': "Hartford", 'effective_date': {'start': "", 'end': auto_end or ""}},
+        'umbrella_liability': {'policy_number': "", 'insurer_name': ""},
+    }
+
+
+def test_coverage_facts_keeps_only_values_that_parse():
+    coverages, limits = coverage_facts(record("01/01/2027"))
+
+    assert coverages == [
+        {'section': 'commercial_general_liability', 'policy_number': "GL-1", 'insurer': "Travelers",
+         'start_date': "2026-01-01", 'end_date': "2027-01-01"},
+        {'section': 'automobile_liability', 'policy_number': "", 'insurer': "Hartford",
+         'start_date': None, 'end_date': None},
+    ]
+    assert limits == [{'section': 'commercial_general_liability', 'field': 'each_occurrence', 'amount': 1_000_000}]
+
+
+def test_days_until():
+    assert days_until("2026-02-01", as_of=date(2026, 1, 1)) == 31
+    assert days_until("2025-12-31", as_of=date(2026, 1, 1)) == -1
+
+
+# --- analytics queries ---
+GL = 'commercial_general_liability'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / "documents.db"))
+    for filename, rec in [
+        ("expired.json", record("12/15/2025", occurrence="$2M")),
+        ("soon.json", record("01/20/2026", occurrence="$500,000", auto_end="03/01/2026")),
+        ("later.json", record("06/01/2026", occurrence="$1M")),
+        ("unknown.json", record("TBD", occurrence="see attached")),
+    ]:
+        store.add({'filename': filename, 'upload_date': "2026-01-01T00:00:00", 'status': 'uploaded'})
+        store.set_coverage(filename, *coverage_facts(rec))
+    yield store
+    store.close()
+
+
+def test_expiring_is_soonest_first_within_the_range(store):
+    policies = store.expiring("2026-01-01", "2026-03-31")
+    assert [(p['filename'], p['section']) for p in policies] == [
+        ("soon.json", GL), ("soon.json", 'automobile_liability')]
+    assert policies[0]['status'] == 'uploaded'
+
+    assert [p['filename'] for p in store.expiring(None, "2026-03-31", section=GL)] == ["expired.json", "soon.json"]
+
+
+def test_below_limit_lowest_first_optionally_with_unknown_limits(store):
+    assert [(p['filename'], p['amount']) for p in store.below_limit(GL, 'each_occurrence', 1_500_000)] == [
+        ("soon.json", 500_000), ("later.json", 1_000_000)]
+    with_missing = store.below_limit(GL, 'each_occurrence', 1_000_000, include_missing=True)
+    assert [(p['filename'], p['amount']) for p in with_missing] == [("unknown.json", None), ("soon.json", 500_000)]
+
+
+def test_coverage_summary_counts_per_window(store):
+    sections = {s['section']: s for s in store.coverage_summary("2026-01-01", [30, 180])}
+
+    assert sections[GL] == {'section': GL, 'policies': 4, 'expired': 1, 'expiring_30': 1, 'expiring_180': 2,
+                            'no_end_date': 1}
+    assert sections['automobile_liability']['no_end_date'] == 3
+    with pytest.raises(ValueError, match="whole numbers of days"):
+        store.coverage_summary("2026-01-01", [-1])
+
+
+def test_set_coverage_replaces_a_documents_facts(store):
+    store.set_coverage("soon.json", *coverage_facts(record("01/01/2030", occurrence="$5M")))
+
+    assert [p['filename'] for p in store.expiring("2026-01-01", "2026-03-31", section=GL)] == []
+    assert store.below_limit(GL, 'each_occurrence', 600_000) == []
+
+
+# --- /analytics routes ---
+def write_document(app_module, filename, rec):
+    with open(os.path.join(app_module.OUTPUT_JSON_DIR, filename), 'w', encoding='utf-8') as f:
+        json.dump(rec, f)
+
+
+def test_analytics_routes_read_facts_of_the_extracted_files(app_module, client):
+    write_document(app_module, "soon.json", record("01/20/2026", occurrence="$500,000"))
+    write_document(app_module, "later.json", record("06/01/2026", occurrence="$1M"))
+
+    expiring = client.get(f'/analytics/expiring?as_of=2026-01-01&days=30&section={GL}').get_json()
+    assert [(p['filename'], p['days_left']) for p in expiring['policies']] == [("soon.json", 19)]
+    assert expiring['until'] == "2026-01-31"
+
+    below = client.get(f'/analytics/below_limit?section={GL}&field=each_occurrence&threshold=$1M').get_json()
+    assert below['threshold'] == 1_000_000
+    assert [p['filename'] for p in below['policies']] == ["soon.json"]
+
+    summary = client.get('/analytics/summary?as_of=2026-01-01&windows=30').get_json()
+    assert {s['section']: s['expiring_30'] for s in summary['sections']}[GL] == 1
+
+
+@pytest.mark.parametrize("url", [
+    '/analytics/expiring?as_of=01/01/2026',
+    f'/analytics/below_limit?section={GL}&field=policy_number&threshold=1',
+    f'/analytics/below_limit?section={GL}&field=each_occurrence&threshold=lots',
+    '/analytics/summary?windows=30,soon',
+])
+def test_analytics_routes_reject_bad_parameters(client, url):
+    assert client.get(url).status_code == 400
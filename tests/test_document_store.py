@@ -0,0 +1,177 @@
+import json
+import os
+
+import pytest
+
+from modules.document_store import (SQLiteDocumentStore, migrate_json_db, open_document_store, open_sqlite_store,
+                                    reconcile_with_directory)
+
+
+def doc(filename, upload_date="2026-01-01T00:00:00", status='uploaded', **fields):
+    return dict(filename=filename, upload_date=upload_date, status=status, **fields)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / "documents.db"))
+    yield store
+    store.close()
+
+
+def test_add_replaces_a_record_with_the_same_filename(store):
+    store.add(doc("a.json", tenant_code="T1"))
+    store.add(doc("a.json", tenant_code="T2"))
+
+    assert store.get("a.json")['tenant_code'] == "T2"
+    assert store.filenames() == {"a.json"}
+    assert store.get("missing.json") is None
+
+
+def test_update_status_and_delete_report_missing_documents(store):
+    store.add(doc("a.json"))
+
+    assert store.update_status("a.json", 'processed')
+    assert store.get("a.json")['status'] == 'processed'
+    assert not store.update_status("missing.json", 'processed')
+    assert store.delete("a.json")
+    assert not store.delete("a.json")
+    assert store.status_counts() == {}
+
+
+def test_migrate_imports_the_json_list_once(tmp_path, store):
+    json_path = tmp_path / "documents.json"
+    json_path.write_text(json.dumps([doc("a.json"), doc("b.json", status='processed'), {'custom_name': "no file"}]))
+
+    assert migrate_json_db(str(json_path), store) == 3
+    assert store.filenames() == {"a.json", "b.json"}
+    assert store.get("b.json")['status'] == 'processed'
+    assert not json_path.exists()
+    assert (tmp_path / "documents.json.migrated").exists()
+    assert migrate_json_db(str(json_path), store) == 0
+
+
+@pytest.mark.parametrize("content", ["{not json", '{"filename": "a.json"}', '["a.json"]'])
+def test_migrate_leaves_an_unreadable_file_in_place(tmp_path, store, content):
+    json_path = tmp_path / "documents.json"
+    json_path.write_text(content)
+
+    assert migrate_json_db(str(json_path), store) == 0
+    assert json_path.exists()
+    assert store.filenames() == set()
+
+
+def test_reconcile_registers_new_files_and_drops_missing_ones(tmp_path, store):
+    json_dir = tmp_path / "extracted_json"
+    json_dir.mkdir()
+    (json_dir / "on_disk.json").write_text("{}")
+    (json_dir / "notes.txt").write_text("not a document")
+    store.add(doc("gone.json"))
+
+    assert reconcile_with_directory(store, str(json_dir)) == (["on_disk.json"], ["gone.json"])
+    assert store.get("on_disk.json")['status'] == 'uploaded'
+    assert store.coverage_filenames() == {"on_disk.json"}
+    assert reconcile_with_directory(store, str(json_dir)) == ([], [])
+
+
+def test_open_document_store_url(tmp_path):
+    store = open_document_store(f"sqlite:///{tmp_path / 'documents.db'}")
+    assert isinstance(store, SQLiteDocumentStore)
+    store.close()
+    with pytest.raises(ValueError, match="Unsupported document store"):
+        open_document_store("postgresql://localhost/coi")
+
+
+def test_corrupt_store_is_restored_from_its_snapshot(tmp_path):
+    path = str(tmp_path / "documents.db")
+    store = SQLiteDocumentStore(path)
+    store.add(doc("a.json"))
+    store.snapshot()
+    store.close()
+    with open(path, 'r+b') as f:
+        f.write(b"this is not a SQLite database" * 100)
+
+    restored = open_sqlite_store(path)
+    assert restored.filenames() == {"a.json"}
+    assert os.path.exists(path + ".corrupt")
+    restored.close()
+
+
+# --- keyset pagination (query) and the /get_documents ETag ---
+@pytest.fixture
+def page_store(store):
+    store.add_many([doc(f"{n:02d}.json", upload_date=f"2026-01-{n:02d}T12:00:00",
+                        tenant_code="T1" if n % 2 else "T2") for n in range(1, 8)])
+    # Same upload time: the filename breaks the tie
+    store.add(doc("07b.json", upload_date="2026-01-07T12:00:00"))
+    return store
+
+
+def test_query_pages_newest_first_without_gaps_or_repeats(page_store):
+    seen, cursor = [], None
+    while True:
+        documents, cursor = page_store.query(limit=3, cursor=cursor, fields=['filename'])
+        seen.extend(d['filename'] for d in documents)
+        if cursor is None:
+            break
+
+    assert seen == ["07b.json", "07.json", "06.json", "05.json", "04.json", "03.json", "02.json", "01.json"]
+
+
+def test_query_filters_dates_and_fields(page_store):
+    documents, cursor = page_store.query({'tenant_code': "T2"}, fields=['filename', 'status'])
+    assert documents == [{'filename': f, 'status': 'uploaded'} for f in ("06.json", "04.json", "02.json")]
+    assert cursor is None
+
+    # A bare date_to includes that whole day
+    documents, _ = page_store.query(date_from="2026-01-02", date_to="2026-01-03", fields=['filename'])
+    assert [d['filename'] for d in documents] == ["03.json", "02.json"]
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({'filters': {'custom_name': "x"}}, "Cannot filter on custom_name"),
+    ({'fields': ['filename', 'secret']}, "Unknown field"),
+    ({'cursor': "not-a-cursor"}, "Invalid cursor"),
+    ({'date_to': "2026-13-01"}, "date_to must be"),
+])
+def test_query_rejects_bad_arguments(page_store, kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        page_store.query(**kwargs)
+
+
+def test_revision_changes_on_every_write(store):
+    revisions = [store.revision()]
+    store.add(doc("a.json"))
+    revisions.append(store.revision())
+    store.update_status("a.json", 'processed')
+    revisions.append(store.revision())
+    store.delete("a.json")
+    revisions.append(store.revision())
+
+    assert len(set(revisions)) == 4
+
+
+def test_get_documents_pages_and_answers_304_until_a_write(app_module, client):
+    app_module.get_document_store().add_many([doc(f"{n}.json", upload_date=f"2026-01-0{n}T00:00:00")
+                                              for n in range(1, 4)])
+
+    first = client.get('/get_documents?limit=2&fields=filename')
+    assert first.status_code == 200
+    assert [d['filename'] for d in first.get_json()['documents']] == ["3.json", "2.json"]
+    assert first.get_json()['status_counts'] == {'uploaded': 3}
+    second = client.get(f"/get_documents?limit=2&fields=filename&cursor={first.get_json()['next_cursor']}")
+    assert [d['filename'] for d in second.get_json()['documents']] == ["1.json"]
+    assert second.get_json()['next_cursor'] is None
+
+    etag = first.headers['ETag']
+    assert client.get('/get_documents?limit=2&fields=filename', headers={'If-None-Match': etag}).status_code == 304
+    # Another query string is another response
+    assert client.get('/get_documents?limit=3', headers={'If-None-Match': etag}).status_code == 200
+
+    app_module.get_document_store().update_status("1.json", 'processed')
+    assert client.get('/get_documents?limit=2&fields=filename', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_get_documents_bad_cursor_is_a_400(client):
+    response = client.get('/get_documents?limit=2&cursor=not-a-cursor')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid cursor"}
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+
+from modules import extraction_cache
+from modules.extraction_cache import JSON_TIER, OCR_TIER, PDF_TIER, ExtractionCache, json_key, sha256_hex
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(str(tmp_path / "cache"), max_bytes=100)
+
+
+def counters(cache, tier):
+    return cache.stats()['tiers'][tier]
+
+
+def test_hit_returns_what_was_put(cache):
+    cache.put(OCR_TIER, "k", "### Page 1\nmarkdown")
+    cache.put_bytes(PDF_TIER, "k", b"%PDF-1.4")
+
+    assert cache.get(OCR_TIER, "k") == "### Page 1\nmarkdown"
+    assert cache.get_bytes(PDF_TIER, "k") == b"%PDF-1.4"
+    assert counters(cache, OCR_TIER) == {'hits': 1, 'misses': 0, 'writes': 1, 'evictions': 0}
+
+
+def test_tiers_are_separate_namespaces(cache):
+    cache.put(OCR_TIER, "k", "ocr")
+
+    assert cache.get(JSON_TIER, "k") is None
+    assert counters(cache, JSON_TIER)['misses'] == 1
+
+
+def test_miss_when_the_file_was_removed_behind_the_index(cache):
+    cache.put(JSON_TIER, "k", "{}")
+    os.remove(os.path.join(cache.root, JSON_TIER, "k"))
+
+    assert cache.get(JSON_TIER, "k") is None
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['bytes'] == 0
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes(cache):
+    cache.put(OCR_TIER, "a", "x" * 40)
+    cache.put(OCR_TIER, "b", "x" * 40)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get(OCR_TIER, "a") is not None
+    cache.put(OCR_TIER, "c", "x" * 40)
+
+    assert cache.get(OCR_TIER, "b") is None
+    assert cache.get(OCR_TIER, "a") is not None
+    assert cache.get(OCR_TIER, "c") is not None
+    assert cache.stats()['bytes'] == 80
+    assert counters(cache, OCR_TIER)['evictions'] == 1
+    assert not os.path.exists(os.path.join(cache.root, OCR_TIER, "b"))
+
+
+def test_rewriting_a_key_replaces_its_size(cache):
+    cache.put(OCR_TIER, "a", "x" * 60)
+    cache.put(OCR_TIER, "a", "x" * 10)
+
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 10
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = ExtractionCache(str(tmp_path / "cache"), max_age=60)
+    cache.put(JSON_TIER, "k", "{}")
+    now = time.time()
+    monkeypatch.setattr(extraction_cache.time, "time", lambda: now + 61)
+
+    assert cache.get(JSON_TIER, "k") is None
+    assert counters(cache, JSON_TIER)['evictions'] == 1
+
+
+def test_delete(cache):
+    cache.put(PDF_TIER, "k", "pdf")
+    cache.delete(PDF_TIER, "k")
+    cache.delete(PDF_TIER, "never-written")
+
+    assert cache.get(PDF_TIER, "k") is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_index_is_rebuilt_from_disk_oldest_first(tmp_path):
+    root = str(tmp_path / "cache")
+    first = ExtractionCache(root, max_bytes=100)
+    first.put(OCR_TIER, "old", "x" * 40)
+    first.put(JSON_TIER, "new", "x" * 40)
+    os.utime(os.path.join(root, OCR_TIER, "old"), (1, 1))
+    # A temp file left by a crash mid-write is not an entry
+    with open(os.path.join(root, OCR_TIER, "k.123.tmp"), 'w') as f:
+        f.write("partial")
+
+    reopened = ExtractionCache(root, max_bytes=100)
+    assert reopened.stats()['entries'] == 2
+    assert reopened.stats()['bytes'] == 80
+    reopened.put(PDF_TIER, "newest", "x" * 40)
+    assert reopened.get(OCR_TIER, "old") is None
+    assert reopened.get(JSON_TIER, "new") == "x" * 40
+
+
+def test_json_key_depends_on_pdf_prompt_and_model():
+    pdf_hash = sha256_hex(b"%PDF")
+    key = json_key(pdf_hash, "prompt", "gpt-4")
+
+    assert key == json_key(pdf_hash, "prompt", "gpt-4")
+    assert key != json_key(pdf_hash, "prompt v2", "gpt-4")
+    assert key != json_key(pdf_hash, "prompt", "gpt-4o")
+    assert key != json_key(sha256_hex(b"%PDF-2"), "prompt", "gpt-4")
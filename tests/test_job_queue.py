@@ -0,0 +1,184 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from modules.async_core import AsyncCore
+from modules.job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue, QueueFull
+
+
+def wait_for(job, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while job.status not in (DONE, FAILED):
+        if time.perf_counter() > deadline:
+            raise AssertionError(f"job {job.id} still {job.status}")
+        time.sleep(0.005)
+    return job
+
+
+def journal_entries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class Gate:
+    """A handler that blocks until opened, recording the payloads it ran."""
+
+    def __init__(self):
+        self.opened = threading.Event()
+        self.started = threading.Event()
+        self.ran = []
+
+    def __call__(self, job):
+        self.started.set()
+        self.opened.wait(5)
+        self.ran.append(job.payload)
+        return job.payload
+
+
+def test_handler_result_becomes_the_job_result():
+    queue = JobQueue(lambda job: job.payload['n'] * 2, max_workers=2)
+    job = wait_for(queue.submit({'n': 21}))
+    queue.shutdown()
+
+    assert job.status == DONE
+    assert job.result == 42
+    assert queue.get(job.id) is job
+    assert queue.stats()['pending'] == 0
+
+
+def test_failed_job_keeps_its_error_and_can_be_retried():
+    attempts = []
+
+    def handler(job):
+        attempts.append(job.id)
+        if len(attempts) == 1:
+            raise ConnectionError("upstream down")
+        return "ok"
+
+    queue = JobQueue(handler)
+    job = wait_for(queue.submit({}))
+    assert job.status == FAILED
+    assert job.error == "upstream down"
+
+    assert queue.retry(job.id) is job
+    assert wait_for(job).status == DONE
+    assert job.result == "ok" and job.error is None
+    # Only failed jobs are retried
+    assert queue.retry(job.id) is None
+    queue.shutdown()
+
+
+def test_submit_past_max_pending_raises_queue_full():
+    gate = Gate()
+    queue = JobQueue(gate, max_workers=1, max_pending=2)
+    queue.submit(1)
+    queue.submit(2)
+
+    with pytest.raises(QueueFull, match="2 pending jobs"):
+        queue.submit(3)
+    gate.opened.set()
+    queue.shutdown()
+    assert gate.ran == [1, 2]
+
+
+def test_journal_records_every_state_change(tmp_path):
+    path = str(tmp_path / "jobs.journal")
+    queue = JobQueue(lambda job: "done", journal_path=path)
+    job = wait_for(queue.submit({'file': "a.pdf"}))
+    queue.shutdown()
+
+    assert [entry['event'] for entry in journal_entries(path)] == [QUEUED, RUNNING, DONE]
+    assert journal_entries(path)[0]['payload'] == {'file': "a.pdf"}
+    assert journal_entries(path)[-1]['result'] == "done"
+    assert job.status == DONE
+
+
+def test_recover_requeues_unfinished_jobs_and_restores_finished_ones(tmp_path):
+    path = tmp_path / "jobs.journal"
+    lines = [
+        {'event': QUEUED, 'id': "finished", 'payload': 1, 'created_at': "2026-01-01T00:00:00"},
+        {'event': DONE, 'id': "finished", 'at': "2026-01-01T00:00:01", 'result': "one", 'timings': {}},
+        {'event': QUEUED, 'id': "interrupted", 'payload': 2, 'created_at': "2026-01-01T00:00:02"},
+        {'event': RUNNING, 'id': "interrupted", 'at': "2026-01-01T00:00:03"},
+        {'event': QUEUED, 'id': "waiting", 'payload': 3, 'created_at': "2026-01-01T00:00:04"},
+    ]
+    # A crash mid-append leaves a torn last line, which is skipped
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines) + '{"event": "do', encoding='utf-8')
+
+    ran = []
+    queue = JobQueue(lambda job: ran.append(job.payload) or job.payload, max_workers=1, journal_path=str(path))
+    assert queue.recover() == 2
+
+    assert queue.get("finished").result == "one"
+    assert wait_for(queue.get("interrupted")).result == 2
+    assert wait_for(queue.get("waiting")).result == 3
+    queue.shutdown()
+    assert ran == [2, 3]
+
+
+def test_recover_without_a_journal_does_nothing(tmp_path):
+    queue = JobQueue(lambda job: None, journal_path=str(tmp_path / "missing.journal"))
+    assert queue.recover() == 0
+    queue.shutdown()
+
+
+def test_journal_is_compacted_to_the_jobs_still_tracked(tmp_path):
+    path = str(tmp_path / "jobs.journal")
+    queue = JobQueue(lambda job: job.payload, max_workers=1, journal_path=path, keep_finished=2, compact_every=6)
+    for n in range(10):
+        wait_for(queue.submit(n))
+    queue.shutdown()
+
+    entries = journal_entries(path)
+    # Three entries per job would be 30 without compaction
+    assert len(entries) < 12
+
+    recovered = JobQueue(lambda job: None, journal_path=path, keep_finished=2)
+    assert recovered.recover() == 0
+    assert sorted(job.result for job in recovered._jobs.values()) == [8, 9]
+    recovered.shutdown()
+
+
+def test_drain_leaves_unstarted_jobs_for_the_next_start(tmp_path):
+    path = str(tmp_path / "jobs.journal")
+    gate = Gate()
+    queue = JobQueue(gate, max_workers=1, journal_path=path)
+    running = queue.submit("running")
+    gate.started.wait(5)
+    waiting = queue.submit("waiting")
+
+    threading.Timer(0.05, gate.opened.set).start()
+    assert queue.drain(timeout=5) == 1
+    assert running.status == DONE
+    assert waiting.status == QUEUED
+    with pytest.raises(QueueFull, match="shutting down"):
+        queue.submit("late")
+
+    restarted = JobQueue(lambda job: job.payload, journal_path=path)
+    assert restarted.recover() == 1
+    assert wait_for(restarted.get(waiting.id)).result == "waiting"
+    restarted.shutdown()
+
+
+def test_coroutine_handlers_run_on_the_runner_loop():
+    core = AsyncCore()
+    running, peak = 0, 0
+
+    async def handler(job):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return job.payload
+
+    queue = JobQueue(handler, max_workers=2, runner=core)
+    jobs = [queue.submit(n) for n in range(6)]
+    try:
+        assert [wait_for(job).result for job in jobs] == list(range(6))
+        assert peak == 2
+    finally:
+        core.close()
@@ -0,0 +1,125 @@
+import json
+import os
+
+import pytest
+
+from modules.json_patch import JSON_PATCH, MERGE_PATCH, PatchError, apply_json_patch, apply_merge_patch, merge_diff
+
+DOCUMENT = {'insured': {'name': "Acme", 'address': "1 Main St"}, 'tags': ["a", "b"], 'a/b': 1, 'm~n': 2}
+
+
+def test_merge_patch_sets_nested_keys_and_removes_nulls():
+    patched = apply_merge_patch(DOCUMENT, {'insured': {'name': "Acme LLC", 'address': None}, 'tags': ["c"]})
+
+    assert patched['insured'] == {'name': "Acme LLC"}
+    assert patched['tags'] == ["c"]
+    # The target is not modified
+    assert DOCUMENT['insured']['name'] == "Acme"
+
+
+def test_merge_diff_round_trips():
+    after = {'insured': {'name': "Acme LLC", 'address': "1 Main St"}, 'tags': ["a", "b"], 'new': True}
+    patch = merge_diff(DOCUMENT, after)
+
+    assert patch == {'insured': {'name': "Acme LLC"}, 'new': True, 'a/b': None, 'm~n': None}
+    assert apply_merge_patch(DOCUMENT, patch) == after
+    assert merge_diff(DOCUMENT, DOCUMENT) == {}
+
+
+@pytest.mark.parametrize("operation, expected", [
+    ({'op': 'add', 'path': "/tags/1", 'value': "x"}, ["a", "x", "b"]),
+    ({'op': 'add', 'path': "/tags/-", 'value': "x"}, ["a", "b", "x"]),
+    ({'op': 'remove', 'path': "/tags/0"}, ["b"]),
+    ({'op': 'replace', 'path': "/tags/1", 'value': "x"}, ["a", "x"]),
+])
+def test_json_patch_array_operations(operation, expected):
+    assert apply_json_patch(DOCUMENT, [operation])['tags'] == expected
+
+
+def test_json_patch_move_copy_and_escaped_pointers():
+    patched = apply_json_patch(DOCUMENT, [
+        {'op': 'test', 'path': "/a~1b", 'value': 1},
+        {'op': 'copy', 'from': "/m~0n", 'path': "/insured/code"},
+        {'op': 'move', 'from': "/insured/address", 'path': "/address"},
+    ])
+
+    assert patched['insured'] == {'name': "Acme", 'code': 2}
+    assert patched['address'] == "1 Main St"
+
+
+@pytest.mark.parametrize("operations, message", [
+    ({'op': 'add'}, "must be an array"),
+    ([{'path': "/x"}], "needs 'op' and 'path'"),
+    ([{'op': 'replace', 'path': "/x"}], "needs 'value'"),
+    ([{'op': 'remove', 'path': "/missing"}], "Path not found"),
+    ([{'op': 'add', 'path': "/tags/5", 'value': 1}], "out of range"),
+    ([{'op': 'add', 'path': "/tags/01", 'value': 1}], "Invalid array index"),
+    ([{'op': 'add', 'path': "tags", 'value': 1}], "Invalid JSON Pointer"),
+    ([{'op': 'move', 'from': "/insured", 'path': "/insured/name"}], "into itself"),
+    ([{'op': 'frobnicate', 'path': "/x"}], "Unknown operation"),
+])
+def test_json_patch_errors(operations, message):
+    with pytest.raises(PatchError, match=message):
+        apply_json_patch(DOCUMENT, operations)
+
+
+def test_failed_test_operation_applies_nothing():
+    document = {'status': "draft"}
+    with pytest.raises(PatchError, match="Test failed"):
+        apply_json_patch(document, [{'op': 'replace', 'path': "/status", 'value': "final"},
+                                    {'op': 'test', 'path': "/status", 'value': "draft"}])
+    assert document == {'status': "draft"}
+
+
+# --- /patch_json ---
+@pytest.fixture
+def document(app_module):
+    with open(os.path.join(app_module.OUTPUT_JSON_DIR, "coi.json"), 'w', encoding='utf-8') as f:
+        json.dump({'insured': {'name': "Acme", 'address': "1 Main St"}}, f)
+    app_module.get_document_store()
+    return "coi.json"
+
+
+def patch(client, filename, body, content_type=MERGE_PATCH, if_match=None):
+    headers = {'If-Match': if_match} if if_match else {}
+    return client.patch(f'/patch_json/{filename}', data=json.dumps(body), content_type=content_type, headers=headers)
+
+
+def test_patch_with_the_current_etag_applies_and_records_the_edit(app_module, client, document):
+    etag = client.get(f'/get_json/{document}').headers['ETag'].strip('"')
+
+    response = patch(client, document, [{'op': 'replace', 'path': "/insured/name", 'value': "Acme LLC"}],
+                     content_type=JSON_PATCH, if_match=f'"{etag}"')
+
+    assert response.status_code == 200
+    assert response.get_json()['changed'] is True
+    new_etag = response.headers['ETag'].strip('"')
+    assert new_etag != etag
+    assert client.get(f'/get_json/{document}').get_json()['insured']['name'] == "Acme LLC"
+    history = client.get(f'/edit_history/{document}').get_json()
+    assert history[0]['version_from'] == etag and history[0]['version_to'] == new_etag
+    assert history[0]['patch'] == {'insured': {'name': "Acme LLC"}}
+
+
+def test_patch_with_a_stale_etag_is_a_412_and_changes_nothing(client, document):
+    etag = client.get(f'/get_json/{document}').headers['ETag']
+    assert patch(client, document, {'insured': {'name': "First"}}, if_match=etag).status_code == 200
+
+    response = patch(client, document, {'insured': {'name': "Second"}}, if_match=etag)
+
+    assert response.status_code == 412
+    current = client.get(f'/get_json/{document}')
+    assert response.get_json()['version'] == current.headers['ETag'].strip('"')
+    assert response.headers['ETag'] == current.headers['ETag']
+    assert current.get_json()['insured']['name'] == "First"
+
+
+def test_patch_that_does_not_apply_is_a_422(client, document):
+    response = patch(client, document, [{'op': 'remove', 'path': "/missing"}], content_type=JSON_PATCH)
+
+    assert response.status_code == 422
+    assert "Path not found" in response.get_json()['error']
+
+
+def test_patch_of_a_missing_document_is_a_404(client, document):
+    assert patch(client, "missing.json", {'insured': None}).status_code == 404
@@ -0,0 +1,120 @@
+import json
+import logging
+import re
+
+import pytest
+
+from modules import metrics
+from modules.metrics import Counter, Gauge, Histogram, JsonFormatter, Registry, StageTimer
+
+# A sample line of the Prometheus text format: name, optional labels, value
+_SAMPLE_RE = re.compile(r'^[a-zA-Z_:][\w:]*(\{([a-zA-Z_]\w*="(\\.|[^"\\])*",?)*\})? (\+Inf|-?[\d.e+-]+)$')
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter_exposition(registry):
+    requests = registry.register(Counter("coi_test_total", "Test requests", ["tier", "result"]))
+    requests.inc(tier="ocr", result="hit")
+    requests.inc(2, tier="ocr", result="hit")
+    requests.inc(tier="json", result="miss")
+
+    assert registry.render() == (
+        "# HELP coi_test_total Test requests\n"
+        "# TYPE coi_test_total counter\n"
+        'coi_test_total{tier="json",result="miss"} 1\n'
+        'coi_test_total{tier="ocr",result="hit"} 3\n'
+    )
+
+
+def test_gauge_without_labels(registry):
+    depth = registry.register(Gauge("coi_test_depth", "Queue depth"))
+    depth.set(4)
+    depth.set(2.5)
+
+    assert registry.render().splitlines()[-1] == "coi_test_depth 2.5"
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count(registry):
+    seconds = registry.register(Histogram("coi_test_seconds", "Durations", ["op"], buckets=(1, 0.1)))
+    for value in (0.05, 0.1, 0.5, 3):
+        seconds.observe(value, op="add")
+
+    assert registry.render().splitlines()[2:] == [
+        'coi_test_seconds_bucket{op="add",le="0.1"} 2',
+        'coi_test_seconds_bucket{op="add",le="1"} 3',
+        'coi_test_seconds_bucket{op="add",le="+Inf"} 4',
+        'coi_test_seconds_sum{op="add"} 3.65',
+        'coi_test_seconds_count{op="add"} 4',
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    errors = registry.register(Counter("coi_test_errors_total", "Errors", ["endpoint"]))
+    errors.inc(endpoint='say "hi"\\\n')
+
+    assert registry.render().splitlines()[-1] == r'coi_test_errors_total{endpoint="say \"hi\"\\\n"} 1'
+
+
+def test_wrong_labels_and_duplicate_names_are_rejected(registry):
+    requests = registry.register(Counter("coi_test_total", "Test requests", ["tier"]))
+    with pytest.raises(ValueError, match="takes labels"):
+        requests.inc(kind="ocr")
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register(Gauge("coi_test_total", "Again"))
+
+
+def test_collectors_run_at_scrape_time_and_failures_are_logged(registry, caplog):
+    depth = registry.register(Gauge("coi_test_depth", "Queue depth"))
+    live = {'depth': 1}
+    registry.add_collector(lambda: depth.set(live['depth']))
+    registry.add_collector(lambda: 1 / 0)
+
+    live['depth'] = 7
+    with caplog.at_level(logging.ERROR):
+        assert "coi_test_depth 7\n" in registry.render()
+    assert "collector" in caplog.text
+
+
+def test_stage_timer_records_timings_and_the_stage_histogram():
+    timer = StageTimer()
+    with pytest.raises(RuntimeError):
+        with timer.stage("test-stage"):
+            raise RuntimeError("still timed")
+
+    assert "test-stage" in timer.timings
+    assert 'coi_stage_seconds_count{stage="test-stage"} 1' in metrics.REGISTRY.render().splitlines()
+
+
+def test_app_metrics_endpoint_is_valid_exposition(client):
+    client.get('/healthz')
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+    lines = response.get_data(as_text=True).splitlines()
+    assert "# TYPE coi_http_request_seconds histogram" in lines
+    for line in lines:
+        assert line.startswith("# HELP ") or line.startswith("# TYPE ") or _SAMPLE_RE.match(line), line
+
+
+def test_trace_ids():
+    assert metrics.start_trace("abc-123") == "abc-123"
+    # Client-supplied IDs that are too long or carry odd characters are replaced
+    assert metrics.start_trace("x" * 65) != "x" * 65
+    assert metrics.start_trace("bad id\n") != "bad id\n"
+    with metrics.trace("outer") as trace_id:
+        assert metrics.current_trace_id() == trace_id == "outer"
+
+
+def test_json_log_lines_carry_the_trace_id():
+    record = logging.LogRecord("coi", logging.WARNING, __file__, 1, "slow %s", ("ocr",), None)
+    record.trace_id = "abc"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == "slow ocr"
+    assert entry['trace_id'] == "abc"
+    assert entry['level'] == "WARNING"
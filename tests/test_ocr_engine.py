@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+from modules import ocr_module
+from modules.ocr_engine import LocalBackend, OcrEngine, page_chunks
+
+
+def pages(count):
+    return [f"text of page {number}" for number in range(1, count + 1)]
+
+
+def use_engine(monkeypatch, backend, chunk_size=5, retries=3):
+    engine = OcrEngine(backend, chunk_size=chunk_size, max_workers=4, retries=retries, backoff=0)
+    monkeypatch.setattr(ocr_module, "_engine", engine)
+    return engine
+
+
+class FailingBackend(LocalBackend):
+    """Serves canned pages, but raises `error` for any request that includes `fail_page`."""
+
+    def __init__(self, page_texts, fail_page, error):
+        super().__init__(page_texts)
+        self.fail_page = fail_page
+        self.error = error
+
+    def annotate(self, pdf_content, pages):
+        if pages and self.fail_page in pages:
+            with self._lock:
+                self.requests += 1
+            raise self.error
+        return super().annotate(pdf_content, pages)
+
+
+class RecordingBackend(LocalBackend):
+    """Records the page list of every request."""
+
+    def __init__(self, page_texts, latency=0.0):
+        super().__init__(page_texts, latency=latency)
+        self.calls = []
+        self._calls_lock = threading.Lock()
+
+    def annotate(self, pdf_content, pages):
+        with self._calls_lock:
+            self.calls.append(pages)
+        return super().annotate(pdf_content, pages)
+
+
+def test_page_chunks():
+    assert page_chunks(5, 12, 5) == [[6, 7, 8, 9, 10], [11, 12]]
+    assert page_chunks(5, 9, 2) == [[6, 7], [8, 9]]
+    assert page_chunks(3, 3, 5) == []
+
+
+def test_run_ocr_returns_every_page_in_order(monkeypatch):
+    backend = RecordingBackend(pages(12), latency=0.01)
+    use_engine(monkeypatch, backend, chunk_size=2)
+
+    markdown = ocr_module.run_ocr(b"%PDF")
+
+    positions = [markdown.index(f"### Page {number}\n") for number in range(1, 13)]
+    assert positions == sorted(positions)
+    for number in range(1, 13):
+        assert f"text of page {number}\n" in markdown
+    # One request for the opening pages, then the rest two pages at a time
+    assert backend.calls[0] is None
+    assert sorted(backend.calls[1:]) == [[6, 7], [8, 9], [10, 11], [12]]
+
+
+def test_run_ocr_short_document_needs_one_request(monkeypatch):
+    backend = LocalBackend(pages(3))
+    use_engine(monkeypatch, backend)
+
+    markdown = ocr_module.run_ocr(b"%PDF")
+
+    assert markdown.count("### Page") == 3
+    assert backend.requests == 1
+
+
+def test_chunk_size_is_capped_at_the_vision_limit():
+    assert OcrEngine(LocalBackend([]), chunk_size=50).chunk_size == 5
+    assert OcrEngine(LocalBackend([]), chunk_size=0).chunk_size == 1
+
+
+def test_run_ocr_retries_transient_errors(monkeypatch):
+    backend = LocalBackend(pages(7), failures=2)
+    use_engine(monkeypatch, backend, retries=3)
+
+    markdown = ocr_module.run_ocr(b"%PDF")
+
+    assert markdown.count("### Page") == 7
+    # Two failed attempts, then the opening request and one chunk
+    assert backend.requests == 4
+
+
+def test_run_ocr_gives_up_after_the_last_retry(monkeypatch):
+    backend = LocalBackend(pages(3), failures=3)
+    use_engine(monkeypatch, backend, retries=2)
+
+    with pytest.raises(ConnectionError):
+        ocr_module.run_ocr(b"%PDF")
+    assert backend.requests == 3
+
+
+def test_run_ocr_does_not_retry_other_errors(monkeypatch):
+    backend = FailingBackend(pages(12), fail_page=8, error=ValueError("unreadable page"))
+    use_engine(monkeypatch, backend, chunk_size=5, retries=3)
+
+    with pytest.raises(ValueError, match="unreadable page"):
+        ocr_module.run_ocr(b"%PDF")
+    # The opening request, the failing chunk once, and at most the other chunk
+    assert backend.requests <= 3
+
+
+def test_stream_ocr_yields_pages_before_a_later_chunk_fails(monkeypatch):
+    backend = FailingBackend(pages(12), fail_page=12, error=ConnectionError("gone"))
+    use_engine(monkeypatch, backend, chunk_size=5, retries=1)
+
+    stream = ocr_module.stream_ocr(b"%PDF")
+    first_pages = [next(stream) for _ in range(5)]
+
+    assert [page.splitlines()[0] for page in first_pages] == [f"### Page {n}" for n in range(1, 6)]
+    with pytest.raises(ConnectionError):
+        list(stream)
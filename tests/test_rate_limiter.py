@@ -0,0 +1,231 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from modules import rate_limiter
+from modules.rate_limiter import (BULK, CLOSED, HALF_OPEN, INTERACTIVE, OPEN, CircuitBreaker, Scheduler,
+                                  TokenBucket, UpstreamUnavailable, lane)
+
+
+class FakeClock:
+    """Stands in for time.monotonic and time.sleep; sleeping advances the clock instantly."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+class Flaky:
+    """Raises ConnectionError for the first `failures` calls, then returns "ok"."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("upstream hiccup")
+        return "ok"
+
+
+def wait_until(condition, timeout=5.0):
+    # time.sleep is the fake clock's while the `clock` fixture is active
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise AssertionError("condition not reached")
+        threading.Event().wait(0.005)
+
+
+# --- TokenBucket ---
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(60, capacity=2)
+    bucket.take(2, now=bucket.updated)
+    start = bucket.updated
+
+    assert bucket.wait_time(1, start) == pytest.approx(1.0)
+    assert bucket.wait_time(1, start + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, start + 1.0) == 0.0
+
+
+def test_token_bucket_never_exceeds_its_capacity():
+    bucket = TokenBucket(60, capacity=2)
+    start = bucket.updated
+    bucket.wait_time(1, start + 3600)
+    assert bucket.level == 2
+
+    bucket.take(1, start + 3600)
+    bucket.give_back(5)
+    assert bucket.level == 2
+
+
+def test_token_bucket_request_over_capacity_waits_for_a_full_bucket():
+    bucket = TokenBucket(60, capacity=10)
+    start = bucket.updated
+    bucket.take(4, start)
+
+    assert bucket.wait_time(50, start) == pytest.approx(4.0)
+
+
+# --- CircuitBreaker ---
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure(100)
+    assert breaker.state == CLOSED
+    breaker.record_success()
+    breaker.record_failure(101)
+    assert breaker.state == CLOSED
+    breaker.record_failure(102)
+
+    assert breaker.state == OPEN
+    assert breaker.blocked_for(107) == pytest.approx(5)
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure(100)
+
+    assert breaker.blocked_for(110) == 0
+    assert breaker.state == HALF_OPEN
+    breaker.admitted()
+    # Others wait while the probe is out; a cancelled probe lets the next caller try
+    assert breaker.blocked_for(110) == 10
+    breaker.released()
+    assert breaker.blocked_for(110) == 0
+
+
+def test_breaker_probe_outcome_closes_or_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure(100)
+    breaker.blocked_for(110)
+    breaker.admitted()
+    breaker.record_failure(111)
+    assert breaker.state == OPEN
+    assert breaker.blocked_for(115) == pytest.approx(6)
+
+    breaker.blocked_for(121)
+    breaker.admitted()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+# --- Scheduler ---
+def test_scheduler_retries_with_backoff(clock):
+    scheduler = Scheduler("test", retries=3, backoff=1.0, retryable=(ConnectionError,))
+    fn = Flaky(failures=2)
+
+    assert scheduler.call(fn) == "ok"
+    assert fn.calls == 3
+    assert len(clock.sleeps) == 2
+    # Jittered exponential backoff: 1s then 2s, each within ±50%
+    assert 0.5 <= clock.sleeps[0] <= 1.5
+    assert 1.0 <= clock.sleeps[1] <= 3.0
+    assert scheduler.stats()['failures'] == 2
+
+
+def test_scheduler_out_of_retries_raises_upstream_unavailable(clock):
+    scheduler = Scheduler("test", retries=1, backoff=1.0, retryable=(ConnectionError,))
+
+    with pytest.raises(UpstreamUnavailable) as raised:
+        scheduler.call(Flaky(failures=5))
+    assert raised.value.upstream == "test"
+    assert raised.value.retry_after == 2.0
+
+
+def test_scheduler_does_not_retry_other_errors(clock):
+    scheduler = Scheduler("test", retries=3, retryable=(ConnectionError,))
+
+    def bad_request():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(bad_request)
+    assert clock.sleeps == []
+    assert scheduler.breaker.failures == 0
+
+
+def test_scheduler_retry_after_pauses_every_caller(clock):
+    scheduler = Scheduler("test", retries=1, retryable=(ConnectionError,), retry_after=lambda e: 7.0)
+
+    assert scheduler.call(Flaky(failures=1)) == "ok"
+    assert clock.sleeps == [7.0]
+
+
+def test_scheduler_fails_fast_while_the_circuit_is_open(clock):
+    scheduler = Scheduler("test", retries=0, retryable=(ConnectionError,),
+                          breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            scheduler.call(Flaky(failures=1))
+
+    fn = Flaky(failures=0)
+    with pytest.raises(UpstreamUnavailable, match="circuit open") as raised:
+        scheduler.call(fn)
+    assert fn.calls == 0
+    assert raised.value.retry_after == 30
+    assert scheduler.stats()['rejected'] == 1
+
+    clock.now += 30
+    assert scheduler.call(fn) == "ok"
+    assert scheduler.stats()['breaker'] == CLOSED
+
+
+def test_scheduler_admits_interactive_before_bulk(clock):
+    # One request a minute: every call after the first waits for the fake clock to move
+    scheduler = Scheduler("test", requests_per_minute=1)
+    scheduler.call(lambda: None)
+    admitted = []
+
+    def caller(lane_name, label):
+        with lane(lane_name):
+            scheduler.call(admitted.append, label)
+
+    threads = []
+    for lane_name, label in ((BULK, "bulk 1"), (BULK, "bulk 2"), (INTERACTIVE, "interactive")):
+        thread = threading.Thread(target=caller, args=(lane_name, label))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.stats()['queue_depth'] == len(threads))
+
+    for count in range(1, 4):
+        clock.now += 60
+        with scheduler._cond:
+            scheduler._notify()
+        wait_until(lambda: len(admitted) == count)
+    for thread in threads:
+        thread.join()
+
+    assert admitted == ["interactive", "bulk 1", "bulk 2"]
+    lanes = scheduler.stats()['lanes']
+    assert lanes[INTERACTIVE]['admitted'] == 2
+    assert lanes[BULK]['admitted'] == 2
+
+
+def test_acall_retries_without_blocking_the_loop():
+    scheduler = Scheduler("test", retries=2, backoff=0, retryable=(ConnectionError,))
+    flaky = Flaky(failures=1)
+
+    async def fn():
+        return flaky()
+
+    assert asyncio.run(scheduler.acall(fn)) == "ok"
+    assert flaky.calls == 2
@@ -0,0 +1,123 @@
+import pytest
+
+from modules.search_index import SearchIndex, edit_distance, scope_columns
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"))
+    index.update("travelers.json", {
+        'producer': {'name': "Marsh Brokerage"},
+        'commercial_general_liability': {'insurer_name': "Travelers Casualty", 'policy_number': "GL-1234"},
+        'property_insurance': {'insurer': "Acme Property Mutual"},
+    }, ocr_text="certificate of liability insurance, not a binder")
+    index.update("hartford.json", {
+        'producer': {'name': "Lockton"},
+        'automobile_liability': {'insurer_name': "Hartford Fire"},
+    }, ocr_text="certificate of liability insurance")
+    yield index
+    index.close()
+
+
+def filenames(results):
+    return sorted(result['filename'] for result in results)
+
+
+def test_plain_terms_are_quoted_and_all_must_match(index):
+    assert index.compile("travelers casualty") == '"travelers" AND "casualty"'
+    assert filenames(index.search("certificate travelers")) == ["travelers.json"]
+
+
+def test_phrase(index):
+    assert index.compile('"acme property"') == '"acme property"'
+    assert filenames(index.search('"property acme"')) == []
+
+
+def test_prefix(index):
+    assert index.compile("trav*") == '"trav" *'
+    assert filenames(index.search("hart*")) == ["hartford.json"]
+
+
+def test_field_prefix_scopes_to_columns(index):
+    assert index.compile("producer.name:marsh") == '{producer__name} : ("marsh")'
+    assert index.compile("producer__name:marsh") == '{producer__name} : ("marsh")'
+    # A field name covers every section's field of that name, and insurer: also insurer_name
+    assert "commercial_general_liability__insurer_name" in index.compile("insurer:travelers")
+    assert "property_insurance__insurer" in index.compile("insurer:travelers")
+    assert filenames(index.search("insurer:hartford")) == ["hartford.json"]
+    # "liability" is only in the OCR text of travelers.json, not in a producer field
+    assert filenames(index.search("producer:liability")) == []
+
+
+def test_scope_columns():
+    assert scope_columns("ocr") == ["ocr"]
+    assert scope_columns("producer") == ["producer__name", "producer__address"]
+    with pytest.raises(ValueError, match="Unknown search field"):
+        scope_columns("nonsense")
+
+
+def test_fuzzy_expands_to_indexed_terms(index):
+    assert index.compile("travelrs~") == '("travelers")'
+    assert index.compile("hartfrod~") == '("hartford")'
+    assert filenames(index.search("lockten~")) == ["hartford.json"]
+
+
+def test_fuzzy_term_and_another_term_must_both_match(index):
+    index.update("travelars.json", {'producer': {'name': "Travelars Inc"}})
+
+    assert index.compile("travelers~ acme") == '("travelars" OR "travelers") AND "acme"'
+    # Without the parentheses FTS5 reads travelars OR (travelers AND acme)
+    assert filenames(index.search("travelers~ acme")) == ["travelers.json"]
+    assert filenames(index.search("travelers~")) == ["travelars.json", "travelers.json"]
+
+
+def test_fuzzy_without_candidates_searches_the_term(index):
+    assert index.compile("zzzz~") == '("zzzz")'
+    assert index.search("zzzz~") == []
+
+
+def test_edit_distance_stops_past_the_limit():
+    assert edit_distance("marsh", "marshes", 1) == 2
+    assert edit_distance("casualty", "casulaty", 2) == 2
+    assert edit_distance("acme", "zzzz", 1) == 2
+
+
+@pytest.mark.parametrize("query, expression", [
+    ("AND", '"AND"'),
+    ("NEAR", '"NEAR"'),
+    ("a OR b", '"a" AND "OR" AND "b"'),
+])
+def test_operator_words_are_literal_terms(index, query, expression):
+    # Quoted, FTS5 operators are matched as words instead of breaking the expression
+    assert index.compile(query) == expression
+    assert index.search(query) == []
+
+
+def test_not_is_searched_as_a_word(index):
+    assert filenames(index.search("NOT binder")) == ["travelers.json"]
+
+
+@pytest.mark.parametrize("query", ["", "   ", "*", "~", "*~", '""', '"  "', "-", "( )", "^", "{ } :"])
+def test_queries_of_only_operators_are_rejected(index, query):
+    with pytest.raises(ValueError, match="Empty search query"):
+        index.compile(query)
+
+
+def test_operators_next_to_terms_are_dropped(index):
+    assert index.compile("travelers -") == '"travelers"'
+    assert index.compile("** travelers ~") == '"travelers"'
+
+
+def test_unknown_field_is_rejected(index):
+    with pytest.raises(ValueError, match="Unknown search field: carrier"):
+        index.compile("carrier:acme")
+
+
+def test_large_match_sets_rank_only_the_newest_candidates(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"), rank_candidates=2)
+    for name in ("old.json", "middle.json", "new.json"):
+        index.update(name, {'producer': {'name': "Marsh"}}, ocr_text="certificate")
+
+    assert filenames(index.search("certificate")) == ["middle.json", "new.json"]
+    assert filenames(index.search("certificate", offset=1)) in (["middle.json"], ["new.json"])
+    index.close()
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from modules import storage
+from modules.storage import PeriodicTask, atomic_write, file_lock
+
+
+def test_atomic_write_replaces_the_file_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "record.json"
+    path.write_bytes(b"old")
+
+    atomic_write(str(path), b"new")
+
+    assert path.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["record.json"]
+
+
+def test_failed_atomic_write_keeps_the_old_content(tmp_path, monkeypatch):
+    path = tmp_path / "record.json"
+    path.write_bytes(b"old")
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage.os, "replace", failing_replace)
+    with pytest.raises(OSError, match="disk full"):
+        atomic_write(str(path), b"new")
+
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["record.json"]
+
+
+def test_file_lock_serialises_threads(tmp_path):
+    lock_path = str(tmp_path / "locks" / "record.lock")
+    inside, overlaps = [], []
+
+    def worker():
+        for _ in range(20):
+            with file_lock(lock_path):
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                time.sleep(0.0005)
+                inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == []
+    assert os.path.exists(lock_path)
+
+
+@pytest.mark.skipif(storage.fcntl is None, reason="flock is not available")
+def test_file_lock_excludes_other_processes(tmp_path):
+    lock_path = str(tmp_path / "record.lock")
+    probe = ("import fcntl, sys\n"
+             "f = open(sys.argv[1], 'a')\n"
+             "try:\n"
+             "    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)\n"
+             "except BlockingIOError:\n"
+             "    sys.exit(1)\n")
+
+    with file_lock(lock_path):
+        assert subprocess.run([sys.executable, "-c", probe, lock_path]).returncode == 1
+    assert subprocess.run([sys.executable, "-c", probe, lock_path]).returncode == 0
+
+
+def test_periodic_task_runs_and_survives_errors():
+    calls = []
+    done = threading.Event()
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        done.set()
+
+    task = PeriodicTask("test", 0.01, fn).start()
+    assert done.wait(5)
+    task.stop()
+    assert len(calls) >= 2
+
+
+def test_periodic_task_with_no_interval_does_not_start():
+    task = PeriodicTask("test", 0, lambda: None).start()
+    assert task._thread is None